@@ -0,0 +1,55 @@
+""" Benchmark of the ADC sensor reads of the plant and security subsystems: single-shot reads against scans of every channel with oversampling.
+
+Run from the Hardware directory:
+    python -m Benchmarks.adc_benchmark --rounds 200 --oversampling 1 4 8
+"""
+import argparse
+import time
+from statistics import pstdev
+from bus_manager import ADC_BUS, BusManager
+from PlantSubsystem.plant_subsystem import PlantSubsystem
+from SecuritySubsystem.security_subsystem import NOISE_PIN
+from Simulation.simulated_backend import SimulatedBackend
+
+
+def run_benchmark(rounds, oversampling=None, filter='mean', latency_scale=1.0, seed=None):
+    """ Reads the moisture, water level and noise sensors the given number of rounds, single-shot without oversampling, else from scans. Returns (seconds per round, bus transactions per round, standard deviation of the readings of each channel). """
+    bus = BusManager(SimulatedBackend(latency_scale=latency_scale, seed=seed))
+    adc = bus.adc()
+    channels = (PlantSubsystem.MOISTURE_CHANNEL, NOISE_PIN, PlantSubsystem.WATER_LEVEL_CHANNEL)
+    if oversampling is None:
+        read = adc.read
+    else:
+        read = bus.adc_scanner(channels, oversampling, filter).read
+    readings = {channel: [] for channel in channels}
+    start = time.perf_counter()
+    for _ in range(rounds):
+        for channel in channels:
+            readings[channel].append(read(channel))
+    elapsed = time.perf_counter() - start
+    transactions = bus.stats()[ADC_BUS]['transactions']
+    return elapsed / rounds, transactions / rounds, {channel: pstdev(values) for channel, values in readings.items()}
+
+
+def report(name, seconds, transactions, deviations):
+    print(f"{name}: {seconds * 1000:.3f} ms/round, {transactions:.1f} transactions/round, stddev " + ", ".join(f"ch{channel} {deviation:.2f}" for channel, deviation in deviations.items()))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark single-shot ADC reads against oversampled channel scans.")
+    parser.add_argument("--rounds", type=int, default=200, help="Reads of the three ADC sensors")
+    parser.add_argument("--oversampling", type=int, nargs='+', default=[1, 4, 8], help="Oversampling factors of the scans")
+    parser.add_argument("--latency-scale", type=float, default=1.0, help="Scale of the simulated ADC latency")
+    parser.add_argument("--seed", type=int, default=None, help="Seed of the simulated ADC noise")
+    args = parser.parse_args()
+
+    report("single-shot", *run_benchmark(args.rounds, latency_scale=args.latency_scale, seed=args.seed))
+    for oversampling in args.oversampling:
+        for filter in ('mean', 'median'):
+            if oversampling == 1 and filter == 'median':
+                continue
+            report(f"scan x{oversampling} {filter}", *run_benchmark(args.rounds, oversampling, filter, args.latency_scale, args.seed))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,95 @@
+""" Benchmark of the door and motion event capture: cost of recording and reading the event ring, transitions seen by polling the door once per tick against the events captured, and the time from a door opening to its event reaching the hub.
+
+Run from the Hardware directory:
+    python -m Benchmarks.events_benchmark --openings 50 --interval 1
+"""
+import argparse
+import contextlib
+import io
+import json
+import threading
+import time
+from events import EventRing
+from station import Station
+from Simulation.simulated_backend import SimulatedBackend
+from transport import LoopbackHub
+
+
+def measure_ring(events):
+    """ Returns the time (s) to record an event and to read one back. """
+    ring = EventRing(events)
+    cursor = ring.cursor()
+    start = time.perf_counter()
+    for _ in range(events):
+        ring.record('DoorOpened')
+    recorded = time.perf_counter() - start
+    start = time.perf_counter()
+    cursor.read()
+    read = time.perf_counter() - start
+    return recorded / events, read / events
+
+
+def run_station(openings, interval, event_min_interval):
+    """ Opens and closes the door of a simulated station the given number of times while it uploads every interval seconds with the events uploaded as they happen. Returns (openings seen by polling the door at each tick, openings counted in the telemetry, seconds from each opening to the first message reporting it). """
+    hub = LoopbackHub()
+    client = hub.client()
+    station = Station(None, backend=SimulatedBackend(latency_scale=0, motion_interval=0), client=client, upload_events=True, event_min_interval=event_min_interval)
+    station.interval = interval
+    door = station.security.door
+    opened_at = []
+    ticks = int(openings * 2 * event_min_interval / interval) + 2
+
+    def open_and_close():
+        time.sleep(interval / 2)
+        for _ in range(openings):
+            opened_at.append(time.time())
+            door.release()
+            time.sleep(event_min_interval)
+            door.press()
+            time.sleep(event_min_interval)
+
+    thread = threading.Thread(target=open_and_close)
+    with contextlib.redirect_stdout(io.StringIO()):
+        thread.start()
+        try:
+            station.run(ticks=ticks)
+        finally:
+            thread.join()
+            station.shutdown()
+
+    # Converts the perf_counter receive times of the hub to wall clock times
+    offset = time.time() - time.perf_counter()
+    polled = 0
+    counted = 0
+    reported = []
+    for message in hub.messages:
+        values = json.loads(message.payload)
+        opened = (values.get('Events') or {}).get('DoorOpened')
+        if 'Temperature' in values:
+            polled += not values['Door']
+            counted += opened['Count'] if opened else 0
+        elif opened:
+            reported.append(message.received_at + offset)
+    delays = [next((at - opening for at in reported if at >= opening), None) for opening in opened_at]
+    return polled, counted, [delay for delay in delays if delay is not None]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the capture and upload of the door and motion events.")
+    parser.add_argument("--events", type=int, default=100000, help="Events recorded in the ring benchmark")
+    parser.add_argument("--openings", type=int, default=20, help="Door openings on the simulated station")
+    parser.add_argument("--interval", type=float, default=1.0, help="Telemetry interval of the simulated station (s)")
+    parser.add_argument("--event-min-interval", type=float, default=0.1, help="Minimum seconds between event messages, the door stays open and closed that long")
+    args = parser.parse_args()
+
+    record, read = measure_ring(args.events)
+    print(f"Event ring: record {record * 1e6:.2f} us/event, read {read * 1e6:.2f} us/event")
+    polled, counted, delays = run_station(args.openings, args.interval, args.event_min_interval)
+    print(f"Door openings: {args.openings}, seen open when polled at a tick {polled}, counted in the telemetry {counted}")
+    if delays:
+        delays.sort()
+        print(f"Opening to event message: p50 {delays[len(delays) // 2] * 1000:.2f} ms, max {delays[-1] * 1000:.2f} ms ({len(delays)} reported)")
+
+
+if __name__ == '__main__':
+    main()
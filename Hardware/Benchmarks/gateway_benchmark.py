@@ -0,0 +1,79 @@
+""" Benchmark of the Gateway hosting many simulated farms over one loopback upstream IoT Hub connection.
+
+Run from the Hardware directory:
+    python -m Benchmarks.gateway_benchmark --stations 24 --ticks 20 --interval 1
+"""
+import argparse
+import asyncio
+import contextlib
+import io
+import threading
+import time
+from gateway import Gateway
+from Simulation.simulated_backend import SimulatedBackend
+from transport import LoopbackHub
+from Benchmarks.station_benchmark import percentile
+
+
+async def run_gateway(gateway, ticks):
+    try:
+        await gateway.run(ticks)
+    finally:
+        await gateway.shutdown()
+
+
+def busiest_window(hub, window):
+    """ Returns the largest number of messages received by the hub within any window (s), a measure of how bursty the upload is. """
+    times = [message.received_at for message in hub.messages]
+    busiest = 0
+    first = 0
+    for last, received_at in enumerate(times):
+        while received_at - times[first] > window:
+            first += 1
+        busiest = max(busiest, last - first + 1)
+    return busiest
+
+
+def run_benchmark(stations, ticks, interval, latency_scale, send_latency, max_workers, stagger, seed):
+    """ Runs the gateway until every station sent the given number of ticks and returns (gateway, hub, cpu, threads). """
+    hub = LoopbackHub(latency=send_latency)
+    gateway = Gateway(hub.client('gateway', asynchronous=True), max_workers=max_workers, stagger=stagger)
+    for i in range(stations):
+        station = gateway.add_station(f"farm-{i + 1}", backend=SimulatedBackend(latency_scale=latency_scale, seed=None if seed is None else seed + i))
+        station.interval = interval
+    threads = threading.active_count()
+    start_cpu = time.process_time()
+    with contextlib.redirect_stdout(io.StringIO()):
+        asyncio.run(run_gateway(gateway, ticks))
+    return gateway, hub, time.process_time() - start_cpu, threads
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark a gateway hosting many simulated farms.")
+    parser.add_argument("--stations", type=int, default=24, help="Number of simulated farms")
+    parser.add_argument("--ticks", type=int, default=20, help="Messages sent by each farm")
+    parser.add_argument("--interval", type=float, default=1.0, help="Telemetry interval (s) of every farm")
+    parser.add_argument("--latency-scale", type=float, default=1.0, help="Scale of the simulated device latencies")
+    parser.add_argument("--send-latency", type=float, default=0.0, help="Latency (s) of each message sent to the loopback hub")
+    parser.add_argument("--max-workers", type=int, default=Gateway.DEFAULT_MAX_WORKERS, help="Threads of the shared hardware worker pool")
+    parser.add_argument("--no-stagger", action='store_true', help="Start every farm at the same time")
+    parser.add_argument("--seed", type=int, default=None, help="Seed of the simulated sensor values")
+    args = parser.parse_args()
+
+    gateway, hub, cpu, threads = run_benchmark(args.stations, args.ticks, args.interval, args.latency_scale, args.send_latency, args.max_workers, not args.no_stagger, args.seed)
+    stats = gateway.stats()
+    total = stats.pop('total')
+    elapsed = gateway.stopped_at - gateway.started_at
+    rates = [station['messagesPerSecond'] for station in stats.values()]
+    jitters = [job['maxJitter'] for station in gateway.stations.values() for job in station.scheduler_stats().values()]
+    missed = sum(job['missed'] for station in gateway.stations.values() for job in station.scheduler_stats().values())
+
+    print(f"Gateway ({args.stations} stations, {'not ' if args.no_stagger else ''}staggered): {total['messages']} messages, {total['bytes']} bytes in {elapsed:.3f}s ({total['messagesPerSecond']:.1f} msg/s)")
+    print(f"\tper station: min {min(rates):.2f} msg/s, max {max(rates):.2f} msg/s")
+    print(f"\tmissed deadlines: {missed}, max jitter p50 {percentile(jitters, 50) * 1000:.1f} ms, max {max(jitters) * 1000:.1f} ms")
+    print(f"\tbusiest 100 ms: {busiest_window(hub, 0.1)} messages")
+    print(f"\tCPU: {cpu / elapsed * 100:.1f}%, threads: {threads}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,69 @@
+""" Benchmark of the on-device history: append cost, and time and memory of range queries and downsampling over a long history.
+
+Run from the Hardware directory:
+    python -m Benchmarks.history_benchmark --days 30 --interval 10
+"""
+import argparse
+import random
+import tempfile
+import time
+import tracemalloc
+from history import HistoryStore
+from TelemetryHelper import Telemetry
+
+
+def sample(rng):
+    values = {field: rng.random() for field in Telemetry.FIELDS}
+    values.update(Temperature=rng.gauss(22.0, 0.5), Humidity=rng.gauss(55.0, 2.0), Door=rng.random() < 0.5, Vibration=None)
+    return values
+
+
+def measure(function):
+    """ Returns (result, seconds, peak bytes allocated) of a call. The time and the memory are measured on separate calls, since tracing the allocations slows the call down. """
+    start = time.perf_counter()
+    result = function()
+    elapsed = time.perf_counter() - start
+    tracemalloc.start()
+    function()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return result, elapsed, peak
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the on-device telemetry history.")
+    parser.add_argument("--days", type=float, default=30, help="Days of history to write")
+    parser.add_argument("--interval", type=float, default=10, help="Seconds between samples")
+    parser.add_argument("--seed", type=int, default=1, help="Seed of the sample values")
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    rows = int(args.days * 86400 / args.interval)
+    with tempfile.TemporaryDirectory() as directory:
+        history = HistoryStore(directory, max_bytes=None, max_age=None)
+        end = time.time()
+        first = end - rows * args.interval
+        samples = [sample(rng) for _ in range(min(rows, 1000))]
+        start = time.perf_counter()
+        for i in range(rows):
+            history.append(samples[i % len(samples)], timestamp=first + i * args.interval)
+        elapsed = time.perf_counter() - start
+        history.close()
+        stats = history.stats()
+        print(f"History: {rows} samples ({args.days:g} days every {args.interval:g}s) in {stats['segments']} segments, {stats['bytes'] / 1024 / 1024:.1f} MiB")
+        print(f"\tappend: {elapsed / rows * 1e6:.1f} us/sample")
+
+        fields = ['Temperature', 'Humidity']
+        for name, function in (
+                ("query last hour", lambda: history.query(fields, end - 3600)),
+                ("query last day", lambda: history.query(fields, end - 86400)),
+                ("downsample all to 1 h", lambda: history.downsample(fields, 3600)),
+                ("downsample last day to 5 min", lambda: history.downsample(fields, 300, end - 86400)),
+                ("latest", lambda: history.latest(fields))):
+            result, seconds, peak = measure(function)
+            count = len(result['Timestamp']) if name != "latest" else 1
+            print(f"\t{name}: {seconds * 1000:.2f} ms, {count} rows, peak {peak / 1024:.0f} KiB allocated")
+
+
+if __name__ == '__main__':
+    main()
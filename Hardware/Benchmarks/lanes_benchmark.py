@@ -0,0 +1,115 @@
+""" Benchmark of the message lanes: delivery latency of the door alarms against the routine telemetry, with slow sends, back-to-back ticks and a link outage leaving a store-and-forward backlog. The alarms are sent on their own lane, or on the telemetry path as before the lanes (--single-lane).
+
+Run from the Hardware directory:
+    python -m Benchmarks.lanes_benchmark --duration 20 --send-latency 0.1
+    python -m Benchmarks.lanes_benchmark --duration 20 --send-latency 0.1 --single-lane
+"""
+import argparse
+import contextlib
+import io
+import json
+import os
+import random
+import tempfile
+import threading
+import time
+from datetime import datetime
+from station import Station
+from Benchmarks.station_benchmark import percentile
+from Simulation.simulated_backend import SimulatedBackend
+from transport import LoopbackHub
+
+
+def run_benchmark(duration, interval, send_latency, alarm_interval, outage_start, outage_duration, drain_rate, single_lane=False, seed=None):
+    """ Runs a station sending telemetry every interval seconds for duration seconds while the door opens and closes every alarm_interval seconds on average, with the link down from outage_start for outage_duration seconds. Returns (delivery latencies (s) of the door alarms raised while the link was up, and of those raised during the outage, lane statistics of the station, messages left in the queue). """
+    rng = random.Random(seed)
+    hub = LoopbackHub(latency=send_latency)
+    client = hub.client()
+    with tempfile.TemporaryDirectory() as directory:
+        station = Station(None, backend=SimulatedBackend(latency_scale=0, motion_interval=0, seed=seed), client=client, queue_path=os.path.join(directory, 'queue.db'),
+                          drain_rate=drain_rate, upload_events=True, event_min_interval=0)
+        station.interval = interval
+        if single_lane:
+            station.submit_alarm = lambda payload, raised_at=None: station.send_payload(payload)
+        stop = threading.Event()
+        # Wall clock times the link went down and came back
+        outage = [None, None]
+
+        def disturb():
+            start = time.monotonic()
+            down = False
+            while not stop.wait(rng.expovariate(1 / alarm_interval)):
+                elapsed = time.monotonic() - start
+                if not down and outage[0] is None and outage_start <= elapsed:
+                    hub.outage()
+                    outage[0] = time.time()
+                    down = True
+                elif down and elapsed >= outage_start + outage_duration:
+                    hub.restore()
+                    outage[1] = time.time()
+                    down = False
+                door = station.security.door
+                if door.is_pressed:
+                    door.release()
+                else:
+                    door.press()
+            if down:
+                hub.restore()
+                outage[1] = time.time()
+
+        def stop_after():
+            time.sleep(duration)
+            station.scheduler.stop()
+
+        threads = [threading.Thread(target=disturb), threading.Thread(target=stop_after)]
+        with contextlib.redirect_stdout(io.StringIO()):
+            for thread in threads:
+                thread.start()
+            try:
+                station.run()
+            finally:
+                stop.set()
+                for thread in threads:
+                    thread.join()
+                backlog = station.queue.depth
+                station.shutdown()
+
+    # Converts the perf_counter receive times of the hub to wall clock times
+    offset = time.time() - time.perf_counter()
+    latencies = ([], [])
+    for message in hub.messages:
+        if message.payload.startswith('['):
+            continue
+        values = json.loads(message.payload)
+        if 'Temperature' not in values and values.get('Events'):
+            first = min(datetime.fromisoformat(entry['First']).timestamp() for entry in values['Events'].values() if isinstance(entry, dict))
+            during_outage = outage[0] is not None and outage[0] <= first < (outage[1] or float('inf'))
+            latencies[during_outage].append(message.received_at + offset - first)
+    return latencies[0], latencies[1], station.lane_stats(), backlog
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the delivery latency of the alarms against the routine telemetry under load.")
+    parser.add_argument("--duration", type=float, default=10, help="Seconds the station runs")
+    parser.add_argument("--interval", type=float, default=0.25, help="Telemetry interval in seconds")
+    parser.add_argument("--send-latency", type=float, default=0.1, help="Seconds each send takes")
+    parser.add_argument("--alarm-interval", type=float, default=0.5, help="Mean seconds between door transitions")
+    parser.add_argument("--outage-start", type=float, default=2, help="Seconds into the run the link goes down")
+    parser.add_argument("--outage-duration", type=float, default=2, help="Seconds the link stays down")
+    parser.add_argument("--drain-rate", type=float, default=10, help="Messages/s replayed from the store-and-forward queue")
+    parser.add_argument("--single-lane", const=True, default=False, nargs='?', help="Send the alarms on the telemetry path, without the alarm lane")
+    parser.add_argument("--seed", type=int, default=1, help="Seed of the door transitions")
+    args = parser.parse_args()
+
+    latencies, outage_latencies, lanes, backlog = run_benchmark(args.duration, args.interval, args.send_latency, args.alarm_interval, args.outage_start, args.outage_duration, args.drain_rate, args.single_lane, args.seed)
+    print(f"{'single lane' if args.single_lane else 'alarm lane'}: {len(latencies) + len(outage_latencies)} door alarms delivered, {backlog} messages left in the queue")
+    for name, values in (("link up", latencies), ("during the outage", outage_latencies)):
+        if values:
+            print(f"\talarms raised {name}: {len(values)}, delivery p50 {percentile(values, 50) * 1000:.1f} ms, p99 {percentile(values, 99) * 1000:.1f} ms, max {max(values) * 1000:.1f} ms")
+    for lane, stats in lanes.items():
+        if stats['sent']:
+            print(f"\t{lane} lane: {stats['sent']} sent, {stats['failed']} failed, p50 {stats['p50'] * 1000:.1f} ms, p99 {stats['p99'] * 1000:.1f} ms, max {stats['maxLatency'] * 1000:.1f} ms")
+
+
+if __name__ == '__main__':
+    main()
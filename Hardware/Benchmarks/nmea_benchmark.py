@@ -0,0 +1,161 @@
+""" Benchmark of the GPS reader: parsing throughput over recorded NMEA logs, comparing the original pynmea2 line reader with NmeaStreamParser, and the CPU used while the serial port is unavailable.
+
+Run from the Hardware directory:
+    python -m Benchmarks.nmea_benchmark --log gps.nmea
+Without --log, a log of simulated fixes with a few corrupted sentences is used.
+"""
+import argparse
+import contextlib
+import io
+import random
+import threading
+import time
+import pynmea2
+from GeoLocationSubsystem.geo_location_subsystem import GeoLocationSubSystem
+from GeoLocationSubsystem.nmea_stream import NmeaStreamParser
+from Simulation.simulated_backend import SimulatedSerial
+
+# Bytes per second of the GPS serial link (9600 baud, 10 bits per byte)
+LINK_BYTES_PER_SECOND = 960
+
+
+def legacy_parse_gps_data(line):
+    """ Copy of the original GeoLocationSubSystem.__parse_gps_data, kept as the baseline of the benchmark. """
+    try:
+        gps_data = pynmea2.parse(line.rstrip())
+        return gps_data.lon, gps_data.lat
+    except Exception:
+        pass
+
+
+def legacy_read(lines):
+    """ Original reader loop body for each line: decode the line and parse it twice. """
+    for raw in lines:
+        try:
+            line = raw.decode('utf-8')
+            if legacy_parse_gps_data(line) is not None:
+                longitude, latitude = legacy_parse_gps_data(line)
+        except UnicodeDecodeError:
+            pass
+
+
+def stream_read(lines, chunk_size):
+    """ New reader: the stream is fed in chunks of the size the serial port typically returns. """
+    parser = NmeaStreamParser()
+    data = b''.join(lines)
+    for i in range(0, len(data), chunk_size):
+        parser.feed(data[i:i + chunk_size])
+    return parser
+
+
+def simulated_log(fixes, corrupt_ratio, seed):
+    """ Returns the lines of a log of simulated fixes, with a ratio of sentences corrupted by a flipped character. """
+    rng = random.Random(seed)
+    serial = SimulatedSerial('/dev/null')
+    lines = []
+    for _ in range(fixes):
+        for sentence in serial._fix_sentences():
+            line = sentence.encode('ascii')
+            if rng.random() < corrupt_ratio:
+                i = rng.randrange(1, len(line) - 5)
+                line = line[:i] + bytes([line[i] ^ 0x01]) + line[i + 1:]
+            lines.append(line)
+    return lines
+
+
+def measure(name, read, lines, rounds=3):
+    """ Prints the lines parsed per second, the CPU time per line and the CPU share of the reader at the line rate of the serial link. """
+    wall = cpu = float('inf')
+    for _ in range(rounds):
+        start, start_cpu = time.perf_counter(), time.process_time()
+        read(lines)
+        wall = min(wall, time.perf_counter() - start)
+        cpu = min(cpu, time.process_time() - start_cpu)
+    link_lines_per_second = LINK_BYTES_PER_SECOND / (sum(len(line) for line in lines) / len(lines))
+    print(f"{name}: {len(lines) / wall:.0f} lines/s, {cpu / len(lines) * 1e6:.1f} us CPU/line, "
+          f"{cpu / len(lines) * link_lines_per_second * 100:.3f}% CPU at 9600 baud")
+    return wall
+
+
+class UnavailableSerial:
+    """ Serial port that fails every read like a port that was unplugged. Reads raise SystemExit once stopped, which ends the reader thread. """
+    def __init__(self):
+        self.stopped = False
+        self.in_waiting = 0
+
+    def __fail(self):
+        if self.stopped:
+            raise SystemExit
+        raise OSError("Resource temporarily unavailable")
+
+    def read(self, size=1):
+        self.__fail()
+
+    def readline(self):
+        self.__fail()
+
+
+def legacy_outage_loop(serial):
+    # Original reader loop: every failed read is retried immediately
+    while True:
+        try:
+            serial.readline()
+        except UnicodeDecodeError:
+            pass
+        except Exception:
+            pass
+
+
+def stream_outage_loop(serial):
+    subsystem = GeoLocationSubSystem.__new__(GeoLocationSubSystem)
+    subsystem.serial = serial
+    subsystem.gps_parser = NmeaStreamParser()
+    subsystem._GeoLocationSubSystem__read_raw_gps_data()
+
+
+def measure_outage(name, loop, duration):
+    """ Prints the CPU share used by a reader thread while the serial port is unavailable. """
+    serial = UnavailableSerial()
+    # The new reader logs each retry
+    with contextlib.redirect_stdout(io.StringIO()):
+        start_cpu = time.process_time()
+        thread = threading.Thread(target=loop, args=(serial,), daemon=True)
+        thread.start()
+        time.sleep(duration)
+        cpu = time.process_time() - start_cpu
+        serial.stopped = True
+        thread.join()
+    print(f"{name}: {cpu / duration * 100:.1f}% CPU while the serial port is unavailable")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark of the GPS NMEA reader.")
+    parser.add_argument("--log", action='append', default=[], help="Recorded NMEA log to parse (repeatable)")
+    parser.add_argument("--fixes", type=int, default=5000, help="Number of simulated fixes when no log is given")
+    parser.add_argument("--corrupt", type=float, default=0.01, help="Ratio of corrupted sentences in the simulated log")
+    parser.add_argument("--chunk-size", type=int, default=64, help="Bytes fed to the stream parser at a time")
+    parser.add_argument("--outage", type=float, default=1.0, help="Seconds of serial port outage to measure (0 to skip)")
+    parser.add_argument("--seed", type=int, default=0, help="Seed of the simulated log")
+    args = parser.parse_args()
+
+    if args.log:
+        lines = []
+        for path in args.log:
+            with open(path, 'rb') as log:
+                lines.extend(line for line in log if line.strip())
+    else:
+        lines = simulated_log(args.fixes, args.corrupt, args.seed)
+    print(f"{len(lines)} lines, {sum(len(line) for line in lines)} bytes")
+
+    before = measure("before (pynmea2, parsed twice)", legacy_read, lines)
+    after = measure("after (NmeaStreamParser)", lambda lines: stream_read(lines, args.chunk_size), lines)
+    print(f"speedup: {before / after:.1f}x")
+    print(f"parser: {stream_read(lines, args.chunk_size).stats()}")
+
+    if args.outage > 0:
+        measure_outage("before (retry at once)", legacy_outage_loop, args.outage)
+        measure_outage("after (backoff)", stream_outage_loop, args.outage)
+
+
+if __name__ == '__main__':
+    main()
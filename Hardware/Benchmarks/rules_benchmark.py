@@ -0,0 +1,137 @@
+""" Benchmark of the on-device rules engine: cost of evaluating the compiled rules against a sample, against interpreting the rule dictionaries on every tick, and the time from a sample crossing a threshold to the actuator being set.
+
+Run from the Hardware directory:
+    python -m Benchmarks.rules_benchmark --rules 1 10 100
+"""
+import argparse
+import contextlib
+import io
+import random
+import time
+from rules import RulesEngine, parse_time_of_day
+from station import Station
+from Simulation.simulated_backend import SimulatedBackend
+from transport import LoopbackHub
+
+NUMERIC_FIELDS = ('Temperature', 'Humidity', 'WaterLevel', 'Moisture', 'Luminosity', 'Noise', 'Pitch', 'Roll')
+
+
+def generate_rules(count, rng):
+    """ Returns count rules over the numeric fields and the Door, a quarter of them with a schedule. """
+    rules = {}
+    for i in range(count):
+        actuator = Station.ACTUATOR_PROPERTIES[i % len(Station.ACTUATOR_PROPERTIES)]
+        active, inactive = Station.ACTUATOR_STATES[actuator]
+        rule = {'actuator': actuator, 'active': active, 'inactive': inactive}
+        if i % 8 == 7:
+            rule.update(field='Door', equals=False)
+        else:
+            rule.update({'field': NUMERIC_FIELDS[i % len(NUMERIC_FIELDS)], rng.choice(('above', 'below')): rng.uniform(0, 100), 'hysteresis': rng.uniform(0, 5)})
+        if i % 4 == 3:
+            rule['schedule'] = {'start': '06:00', 'end': '20:00'}
+        rules[f"rule{i:03d}"] = rule
+    return rules
+
+
+def sample(rng):
+    values = {field: rng.uniform(0, 100) for field in NUMERIC_FIELDS}
+    values['Door'] = rng.random() < 0.5
+    return values
+
+
+def interpret(rules, values, conditions, outputs):
+    """ Baseline evaluating the rule dictionaries as they are, parsing the thresholds and schedules on every tick. """
+    now = time.localtime()
+    seconds = now.tm_hour * 3600 + now.tm_min * 60 + now.tm_sec
+    active = {}
+    for name in sorted(rules):
+        rule = rules[name]
+        if 'field' in rule and values.get(rule['field']) is not None:
+            value, held = values[rule['field']], conditions.get(name, False)
+            if 'equals' in rule:
+                held = value == rule['equals']
+            elif 'above' in rule:
+                held = value > float(rule['above']) - (float(rule.get('hysteresis', 0)) if held else 0)
+            else:
+                held = value < float(rule['below']) + (float(rule.get('hysteresis', 0)) if held else 0)
+            conditions[name] = held
+        schedule = rule.get('schedule')
+        in_window = True
+        if schedule is not None:
+            start, end = parse_time_of_day(schedule['start']), parse_time_of_day(schedule['end'])
+            in_window = start <= seconds < end if start <= end else seconds >= start or seconds < end
+        if conditions.get(name, 'field' not in rule) and in_window:
+            active.setdefault(rule['actuator'], rule.get('active', 'on'))
+    commands = {}
+    for name in sorted(rules):
+        actuator = rules[name]['actuator']
+        if actuator not in commands:
+            commands[actuator] = active.get(actuator, rules[name].get('inactive', 'off'))
+    changed = {actuator: state for actuator, state in commands.items() if state is not None and outputs.get(actuator) != state}
+    outputs.update(changed)
+    return changed
+
+
+def measure_evaluation(count, ticks, seed):
+    """ Returns the mean time (s) per tick of the compiled and the interpreted evaluation of count rules. """
+    rng = random.Random(seed)
+    rules = generate_rules(count, rng)
+    samples = [sample(rng) for _ in range(ticks)]
+    engine = RulesEngine(Station.ACTUATOR_STATES, rules)
+    start = time.perf_counter()
+    for values in samples:
+        engine.evaluate(values)
+    compiled = (time.perf_counter() - start) / ticks
+    conditions, outputs = {}, {}
+    start = time.perf_counter()
+    for values in samples:
+        interpret(rules, values, conditions, outputs)
+    interpreted = (time.perf_counter() - start) / ticks
+    return compiled, interpreted
+
+
+def measure_reaction(samples, seed):
+    """ Returns the times (s) from the start of a sample reading a luminosity under the threshold of a light rule to the lights being on, on simulated hardware. """
+    hub = LoopbackHub()
+    client = hub.client()
+    station = Station(None, backend=SimulatedBackend(latency_scale=0, seed=seed), client=client)
+    client.connect()
+    reactions = []
+    with contextlib.redirect_stdout(io.StringIO()):
+        try:
+            for _ in range(samples):
+                # Turns the lights off through the rule and waits for the command worker to report it, then moves the threshold over the luminosity the next sample reads
+                reported = len(hub.twin_traffic)
+                station.rules.set_rules({'growLights': {'field': 'Luminosity', 'below': -1, 'actuator': 'lightState'}})
+                station.apply_rules({'Luminosity': 0})
+                while len(hub.twin_traffic) == reported:
+                    time.sleep(0.0001)
+                station.rules.set_rules({'growLights': {'field': 'Luminosity', 'below': 100000, 'actuator': 'lightState'}})
+                start = time.perf_counter()
+                station.sample()
+                while not station.plant.read_light_state():
+                    time.sleep(0.0001)
+                reactions.append(time.perf_counter() - start)
+        finally:
+            station.shutdown()
+    return reactions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the evaluation cost and reaction time of the on-device rules.")
+    parser.add_argument("--rules", type=int, nargs='+', default=[1, 10, 100], help="Rule counts to evaluate")
+    parser.add_argument("--ticks", type=int, default=10000, help="Samples evaluated per rule count")
+    parser.add_argument("--reactions", type=int, default=50, help="Threshold crossings timed on the simulated station")
+    parser.add_argument("--seed", type=int, default=1, help="Seed of the rules and samples")
+    args = parser.parse_args()
+
+    print("Evaluation per tick:")
+    for count in args.rules:
+        compiled, interpreted = measure_evaluation(count, args.ticks, args.seed)
+        print(f"\t{count} rules: compiled {compiled * 1e6:.2f} us, interpreted {interpreted * 1e6:.2f} us ({interpreted / compiled:.1f}x)")
+    reactions = sorted(measure_reaction(args.reactions, args.seed))
+    print(f"Sample to lights on: p50 {reactions[len(reactions) // 2] * 1000:.3f} ms, max {reactions[-1] * 1000:.3f} ms")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,98 @@
+""" Micro-benchmark of the per-sample Telemetry serialization cost, comparing the original json.dumps(__dict__, sort_keys=True) path with TelemetryEncoder.
+
+Run from the Hardware directory:
+    python -m Benchmarks.serialization_benchmark --samples 100000
+
+Exits with an error when TelemetryEncoder is not faster than the baseline, so a change undoing the optimization fails the benchmark.
+"""
+import argparse
+import json
+import time
+import tracemalloc
+from TelemetryHelper import Telemetry, TelemetryEncoder, Vibration
+
+
+class LegacyTelemetry:
+    """ Copy of the original __dict__ based Telemetry record, kept as the baseline of the benchmark. """
+    def __init__(self, telemetry_data):
+        for field in Telemetry.FIELDS:
+            setattr(self, field, telemetry_data[field])
+
+    def toJSON(self):
+        return json.dumps(self, default=lambda o: o.__dict__, sort_keys=True)
+
+
+class LegacyVibration:
+    def __init__(self, vibration_data):
+        self.X = vibration_data['X']
+        self.Y = vibration_data['Y']
+        self.Z = vibration_data['Z']
+
+
+def sample_values(vibration_class):
+    """ Returns the values of a typical sample. """
+    return {
+        "Temperature": 22.418, "Humidity": 55.27, "WaterLevel": 501, "Moisture": 298,
+        "Longitude": -73.345678, "Latitude": 45.301234, "Pitch": 0.57, "Roll": -1.2,
+        "Vibration": vibration_class({"X": 0.0012, "Y": -0.0031, "Z": 0.0104}),
+        "BuzzerIsActive": False, "FanIsActive": True, "LightIsActive": True, "DoorIsLocked": True,
+        "Door": True, "Motion": False, "Luminosity": 182, "Noise": 117,
+    }
+
+
+def legacy_serialize(values):
+    # Original Station path: build the record, serialize it and wrap the result in str()
+    return str(LegacyTelemetry(values).toJSON())
+
+
+def best_times(candidates, samples, rounds=5):
+    """ Returns the best time (s) of each (serialize, values) candidate over the rounds. The rounds of the candidates alternate, so a busy spell of the device slows them alike. """
+    best = [float('inf')] * len(candidates)
+    for serialize, values in candidates:
+        serialize(values)
+    for _ in range(rounds):
+        for i, (serialize, values) in enumerate(candidates):
+            start = time.perf_counter()
+            for _ in range(samples):
+                serialize(values)
+            best[i] = min(best[i], time.perf_counter() - start)
+    return best
+
+
+def measure(name, serialize, values, elapsed, samples):
+    """ Prints the time (us) and the peak temporary memory (bytes) allocated per serialized sample. """
+    tracemalloc.start()
+    peak = 0
+    for _ in range(1000):
+        tracemalloc.reset_peak()
+        current, _ = tracemalloc.get_traced_memory()
+        serialize(values)
+        peak += tracemalloc.get_traced_memory()[1] - current
+    tracemalloc.stop()
+
+    print(f"{name}: {elapsed / samples * 1e6:.2f} us/sample, {samples / elapsed:.0f} samples/s, {peak / 1000:.0f} bytes peak/sample")
+    return elapsed / samples
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Micro-benchmark of the Telemetry serialization.")
+    parser.add_argument("--samples", type=int, default=100000, help="Number of samples to serialize")
+    args = parser.parse_args()
+
+    encoder = TelemetryEncoder()
+    legacy = legacy_serialize(sample_values(LegacyVibration))
+    current = encoder.encode(Telemetry(sample_values(Vibration)))
+    if legacy != current:
+        raise AssertionError(f"Payloads differ:\n{legacy}\n{current}")
+
+    candidates = [(legacy_serialize, sample_values(LegacyVibration)), (lambda values: encoder.encode(Telemetry(values)), sample_values(Vibration))]
+    before, after = best_times(candidates, args.samples)
+    before = measure("before (json.dumps)", *candidates[0], before, args.samples)
+    after = measure("after (TelemetryEncoder)", *candidates[1], after, args.samples)
+    print(f"speedup: {before / after:.2f}x")
+    if before / after < 1.0:
+        raise SystemExit(f"TelemetryEncoder is slower than the json.dumps baseline ({before / after:.2f}x)")
+
+
+if __name__ == '__main__':
+    main()
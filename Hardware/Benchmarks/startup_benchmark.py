@@ -0,0 +1,105 @@
+""" Benchmark of the station startup: time from the start of the interpreter to the first message reaching the hub, split into loading the station module, creating the station (client and subsystems) and sending the first sample, on simulated hardware that takes the time of the real drivers to open its devices. Every run starts a fresh interpreter, so the imports are paid like after a power cycle.
+
+Run from the Hardware directory:
+    python -m Benchmarks.startup_benchmark --runs 5
+    python -m Benchmarks.startup_benchmark --runs 5 --subsystems plant security
+"""
+import argparse
+import contextlib
+import io
+import json
+import os
+import subprocess
+import sys
+import time
+
+# Modules station.py imported when it was loaded, before the imports were deferred to their first use
+EAGER_MODULES = ('dotenv', 'numpy', 'http.server', 'transport', 'PlantSubsystem.plant_subsystem', 'SecuritySubsystem.security_subsystem', 'GeoLocationSubsystem.geo_location_subsystem')
+
+
+def child(eager, parallel, subsystems):
+    """ Runs in the benchmarked interpreter: loads the station, creates it and sends one sample, then prints the times (s) of each step and the modules loaded as JSON. """
+    start = time.perf_counter()
+    if eager:
+        import importlib
+        for module in EAGER_MODULES:
+            importlib.import_module(module)
+    from station import Station
+    from Simulation.simulated_backend import SimulatedBackend
+    from transport import LoopbackHub
+    loaded = time.perf_counter()
+    hub = LoopbackHub()
+    client = hub.client()
+    station = Station(None, backend=SimulatedBackend(open_latency_scale=1, motion_interval=0), client=client, subsystems=subsystems, parallel_init=parallel)
+    created = time.perf_counter()
+    try:
+        station.run(ticks=1)
+    finally:
+        station.shutdown()
+    first_message = hub.messages[0].received_at
+    return {
+        'import': loaded - start,
+        'init': created - loaded,
+        'send': first_message - created,
+        'total': first_message - start,
+        # Wall clock time of the first message, to add the start of the interpreter
+        'firstMessageAt': time.time() - (time.perf_counter() - first_message),
+        'startup': station.startup_times,
+        'modules': sorted(module for module in ('numpy', 'http.server', 'dotenv', 'sqlite3') + tuple(module for module, _ in Station.SUBSYSTEMS.values()) if module in sys.modules),
+    }
+
+
+def run_once(eager, parallel, subsystems):
+    """ Starts an interpreter running one startup and returns its measurements, with the time from the start of the interpreter to the first message under boot. """
+    command = [sys.executable, '-m', 'Benchmarks.startup_benchmark', '--child', '--parallel' if parallel else '--sequential']
+    if eager:
+        command.append('--eager')
+    if subsystems is not None:
+        command += ['--subsystems', *subsystems]
+    launched = time.time()
+    output = subprocess.run(command, capture_output=True, text=True, check=True, cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__)))).stdout
+    result = json.loads(output.strip().splitlines()[-1])
+    result['boot'] = result['firstMessageAt'] - launched
+    return result
+
+
+def median(values):
+    values = sorted(values)
+    return values[len(values) // 2]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the time from the start of the station to its first message.")
+    parser.add_argument("--runs", type=int, default=5, help="Startups measured per configuration")
+    parser.add_argument("--subsystems", nargs='*', default=None, help="Subsystems of the reduced configuration (defaults to plant and security)")
+    parser.add_argument("--child", action='store_true', help=argparse.SUPPRESS)
+    parser.add_argument("--eager", action='store_true', help=argparse.SUPPRESS)
+    parser.add_argument("--parallel", dest='parallel', action='store_true', default=True, help=argparse.SUPPRESS)
+    parser.add_argument("--sequential", dest='parallel', action='store_false', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        with contextlib.redirect_stdout(io.StringIO()):
+            result = child(args.eager, args.parallel, args.subsystems)
+        print(json.dumps(result))
+        return
+
+    reduced = args.subsystems if args.subsystems is not None else ['plant', 'security']
+    configurations = (
+        ("eager imports, sequential init", True, False, None),
+        ("lazy imports, sequential init", False, False, None),
+        ("lazy imports, parallel init", False, True, None),
+        (f"lazy imports, parallel init, {'+'.join(reduced) or 'no subsystem'}", False, True, reduced),
+    )
+    print(f"Median of {args.runs} startups (ms): interpreter start to first message (boot), and in the interpreter: loading the station, creating it, sending the first sample")
+    for name, eager, parallel, subsystems in configurations:
+        results = [run_once(eager, parallel, subsystems) for _ in range(args.runs)]
+        steps = {step: median([result[step] for result in results]) * 1000 for step in ('boot', 'total', 'import', 'init', 'send')}
+        startup = {part: median([result['startup'][part] for result in results]) * 1000 for part in results[0]['startup']}
+        print(f"{name}: boot {steps['boot']:.1f}, total {steps['total']:.1f} = import {steps['import']:.1f} + init {steps['init']:.1f} + first sample {steps['send']:.1f}")
+        print(f"\tinit: {', '.join(f'{part} {value:.1f}' for part, value in startup.items())}")
+        print(f"\tmodules loaded: {', '.join(results[0]['modules'])}")
+
+
+if __name__ == '__main__':
+    main()
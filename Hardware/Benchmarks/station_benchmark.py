@@ -0,0 +1,128 @@
+""" Benchmark harness that drives Station.run for a number of ticks against simulated hardware and an in-process loopback hub (see transport.LoopbackHub).
+
+Run from the Hardware directory:
+    python -m Benchmarks.station_benchmark --ticks 200 --latency-scale 1.0
+"""
+import argparse
+import asyncio
+import contextlib
+import io
+import time
+from station import Station
+from async_station import AsyncStation
+from Simulation.simulated_backend import SimulatedBackend
+from transport import LoopbackHub
+
+
+def percentile(values, percent):
+    """ Returns the given percentile (0-100) of the values using linear interpolation. """
+    ordered = sorted(values)
+    if not ordered:
+        return None
+    rank = (len(ordered) - 1) * percent / 100.0
+    lower = int(rank)
+    upper = min(lower + 1, len(ordered) - 1)
+    return ordered[lower] + (ordered[upper] - ordered[lower]) * (rank - lower)
+
+
+def tick_latencies(hub, client):
+    """ Returns the duration of every tick, measured between consecutive messages received by the hub (the first tick starts on connect). """
+    latencies = []
+    previous = client.connected_at
+    for message in hub.messages:
+        latencies.append(message.received_at - previous)
+        previous = message.received_at
+    return latencies
+
+
+def report(name, latencies, elapsed, message_count):
+    """ Prints the per-tick latency percentiles (ms) and the message rate. """
+    print(f"{name}: {message_count} messages in {elapsed:.3f}s ({message_count / elapsed:.1f} msg/s)")
+    if not latencies:
+        return
+    for percent in (50, 90, 99):
+        print(f"\tp{percent}: {percentile(latencies, percent) * 1000:.3f} ms")
+    print(f"\tmax: {max(latencies) * 1000:.3f} ms")
+
+
+def run_benchmark(ticks, latency_scale=1.0, send_latency=0.0, seed=None, quiet=True, sampling_mode='sequential', interval=0, sampling_intervals=None, batch_size=1, report_by_exception=False, aggregate=False, runtime='sync', metrics=False, cache_max_ages=None, adc_scan=False, adc_oversampling=1, adc_filter='mean'):
+    """ Runs the station for the given number of ticks and returns (latencies, elapsed, message_count, payload_bytes, scheduler_stats, cache_stats, bus_stats). With no telemetry interval the ticks run back to back. """
+    station_class = AsyncStation if runtime == 'async' else Station
+    hub = LoopbackHub(latency=send_latency)
+    client = hub.client(asynchronous=runtime == 'async')
+    station = station_class(None, backend=SimulatedBackend(latency_scale=latency_scale, seed=seed), client=client, sampling_mode=sampling_mode, sampling_intervals=sampling_intervals, batch_size=batch_size, report_by_exception=report_by_exception, aggregate=aggregate, metrics=metrics, cache_max_ages=cache_max_ages, adc_scan=adc_scan, adc_oversampling=adc_oversampling, adc_filter=adc_filter)
+    station.interval = interval
+
+    output = io.StringIO() if quiet else None
+    start = time.perf_counter()
+    with contextlib.redirect_stdout(output) if quiet else contextlib.nullcontext():
+        if runtime == 'async':
+            asyncio.run(run_async_station(station, ticks))
+        else:
+            try:
+                station.run(ticks=ticks)
+            finally:
+                station.shutdown()
+    elapsed = time.perf_counter() - start
+    stats = hub.stats()
+    return tick_latencies(hub, client), elapsed, stats['messages'], stats['bytes'], station.scheduler_stats(), station.cache_stats(), station.bus_stats()
+
+
+async def run_async_station(station, ticks):
+    try:
+        await station.run(ticks=ticks)
+    finally:
+        await station.shutdown()
+
+
+def report_scheduler(scheduler_stats):
+    """ Prints the missed deadlines and jitter (ms) of every scheduler job. """
+    for name, stats in scheduler_stats.items():
+        print(f"\t{name}: {stats['runs']} runs, {stats['missed']} missed, jitter mean {stats['meanJitter'] * 1000:.3f} ms, stddev {stats['stddevJitter'] * 1000:.3f} ms, max {stats['maxJitter'] * 1000:.3f} ms")
+
+
+def parse_sampling_intervals(values):
+    """ Parses name=seconds arguments into a sampling intervals dictionary. """
+    intervals = {}
+    for value in values or []:
+        name, interval = value.split('=')
+        intervals[name] = float(interval)
+    return intervals
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the Station telemetry loop on simulated hardware.")
+    parser.add_argument("--ticks", type=int, default=100, help="Number of telemetry ticks to run")
+    parser.add_argument("--latency-scale", type=float, default=1.0, help="Scale applied to the simulated device latencies (0 disables them)")
+    parser.add_argument("--send-latency", type=float, default=0.0, help="Simulated IoT Hub send latency in seconds")
+    parser.add_argument("--sampling", choices=Station.SAMPLING_MODES, default='sequential', help="Sampling mode of the station")
+    parser.add_argument("--interval", type=float, default=0, help="Telemetry interval in seconds (0 runs the ticks back to back)")
+    parser.add_argument("--sampling-interval", action='append', help="Sampling interval of a sensor as name=seconds (repeatable)")
+    parser.add_argument("--cache-max-age", action='append', help="Maximum age of the cached readings of a sensor as name=seconds (repeatable)")
+    parser.add_argument("--adc-scan", const=True, default=False, nargs='?', help="Read the ADC sensors from scans of their channels")
+    parser.add_argument("--adc-oversampling", type=int, default=1, help="Samples per ADC channel and scan")
+    parser.add_argument("--adc-filter", choices=('mean', 'median'), default='mean', help="Filter reducing the samples of an ADC channel")
+    parser.add_argument("--batch-size", type=int, default=1, help="Number of samples sent per message")
+    parser.add_argument("--report-by-exception", const=True, default=False, nargs='?', help="Only send the fields that changed")
+    parser.add_argument("--metrics", const=True, default=False, nargs='?', help="Enable the instrumentation (without the HTTP endpoint)")
+    parser.add_argument("--runtime", choices=('sync', 'async'), default='sync', help="Station runtime: threads and the blocking client, or asyncio and the aio client")
+    parser.add_argument("--aggregate", const=True, default=False, nargs='?', help="Upload the numeric fields as the statistics of the readings of each interval")
+    parser.add_argument("--seed", type=int, default=None, help="Seed of the simulated sensor values")
+    parser.add_argument("--verbose", const=True, default=False, nargs='?', help="Show the station output")
+    args = parser.parse_args()
+
+    latencies, elapsed, message_count, payload_bytes, scheduler_stats, cache_stats, bus_stats = run_benchmark(args.ticks, args.latency_scale, args.send_latency, args.seed, quiet=not args.verbose, sampling_mode=args.sampling, interval=args.interval, sampling_intervals=parse_sampling_intervals(args.sampling_interval), batch_size=args.batch_size, report_by_exception=args.report_by_exception, aggregate=args.aggregate, runtime=args.runtime, metrics=args.metrics, cache_max_ages=parse_sampling_intervals(args.cache_max_age), adc_scan=args.adc_scan, adc_oversampling=args.adc_oversampling, adc_filter=args.adc_filter)
+    report(f"Station.run ({args.runtime}, {args.sampling})", latencies, elapsed, message_count)
+    print(f"\tpayload: {payload_bytes} bytes ({payload_bytes / max(message_count, 1):.0f} bytes/message)")
+    print("Scheduler:")
+    report_scheduler(scheduler_stats)
+    print("Sensor cache:")
+    for name, stats in cache_stats.items():
+        print(f"\t{name}: {stats['misses']} reads, {stats['hits']} hits, {stats['shared']} shared")
+    print("Buses:")
+    for name, stats in bus_stats.items():
+        print(f"\t{name}: {stats['transactions']} transactions, utilization {stats['utilization'] * 100:.1f}%, {stats['contended']} waited (mean {stats['meanWait'] * 1000:.3f} ms, max {stats['maxWait'] * 1000:.3f} ms, at most {stats['maxQueued']} queued)")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,97 @@
+""" Benchmark of the station send path against a loopback hub injecting latency, drops and outages.
+
+Run from the Hardware directory:
+    python -m Benchmarks.transport_benchmark --ticks 200 --interval 0.05 --latency 0.02 --jitter 0.03 --drop-rate 0.02 --outage-every 2 --outage-duration 0.5
+"""
+import argparse
+import asyncio
+import contextlib
+import io
+import os
+import tempfile
+import threading
+import time
+from station import Station
+from async_station import AsyncStation
+from transport import LoopbackHub
+from Simulation.simulated_backend import SimulatedBackend
+from Benchmarks.station_benchmark import percentile, run_async_station
+
+
+def inject_outages(hub, period, duration, stopped):
+    """ Takes the link down for duration seconds every period seconds until stopped is set. """
+    while not stopped.wait(period):
+        hub.outage(duration)
+
+
+def run_benchmark(ticks, interval, latency, jitter, drop_rate, outage_every, outage_duration, runtime='sync', drain_rate=Station.DEFAULT_DRAIN_RATE, seed=None):
+    """ Runs the station for the given number of ticks and returns (hub, delivery latencies, elapsed, produced, still queued). The delivery latency of a message runs from its payload being prepared to its receipt by the hub, so it includes the time spent in the store-and-forward queue. """
+    hub = LoopbackHub(latency, jitter, drop_rate, seed)
+    station_class = AsyncStation if runtime == 'async' else Station
+    with tempfile.TemporaryDirectory() as directory:
+        station = station_class(None, backend=SimulatedBackend(latency_scale=0, seed=seed), client=hub.client(asynchronous=runtime == 'async'), queue_path=os.path.join(directory, 'queue.db'), drain_rate=drain_rate)
+        station.interval = interval
+
+        # Payloads are replayed from the queue as new strings, so they are matched by value
+        prepared = {}
+        prepare_payload = station.prepare_payload
+        def timed_prepare_payload(values):
+            payload = prepare_payload(values)
+            if payload is not None:
+                prepared[payload] = time.perf_counter()
+            return payload
+        station.prepare_payload = timed_prepare_payload
+
+        stopped = threading.Event()
+        injector = threading.Thread(target=inject_outages, args=(hub, outage_every, outage_duration, stopped), daemon=True) if outage_every else None
+        start = time.perf_counter()
+        with contextlib.redirect_stdout(io.StringIO()):
+            if injector is not None:
+                injector.start()
+            try:
+                if runtime == 'async':
+                    asyncio.run(run_async_station(station, ticks))
+                else:
+                    try:
+                        station.run(ticks=ticks)
+                    finally:
+                        station.shutdown()
+            finally:
+                stopped.set()
+        elapsed = time.perf_counter() - start
+        queued = station.queue_stats()['depth']
+    latencies = [message.received_at - prepared[message.payload] for message in hub.messages if message.payload in prepared]
+    return hub, latencies, elapsed, len(prepared), queued
+
+
+def report_latencies(name, latencies):
+    if not latencies:
+        print(f"\t{name}: no messages")
+        return
+    print(f"\t{name}: p50 {percentile(latencies, 50) * 1000:.1f} ms, p99 {percentile(latencies, 99) * 1000:.1f} ms, p99.9 {percentile(latencies, 99.9) * 1000:.1f} ms, max {max(latencies) * 1000:.1f} ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the station send path against a loopback hub with injected latency, drops and outages.")
+    parser.add_argument("--ticks", type=int, default=200, help="Number of telemetry ticks to run")
+    parser.add_argument("--interval", type=float, default=0.05, help="Telemetry interval in seconds")
+    parser.add_argument("--latency", type=float, default=0.0, help="Latency (s) of every send")
+    parser.add_argument("--jitter", type=float, default=0.0, help="Uniform random latency (s) added to every send")
+    parser.add_argument("--drop-rate", type=float, default=0.0, help="Fraction of the sends that fail")
+    parser.add_argument("--outage-every", type=float, default=0.0, help="Seconds between link outages (0 disables them)")
+    parser.add_argument("--outage-duration", type=float, default=0.5, help="Duration (s) of every outage")
+    parser.add_argument("--runtime", choices=('sync', 'async'), default='sync', help="Station runtime")
+    parser.add_argument("--drain-rate", type=float, default=Station.DEFAULT_DRAIN_RATE, help="Rate (msg/s) at which the store-and-forward queue is replayed")
+    parser.add_argument("--seed", type=int, default=None, help="Seed of the injected faults and simulated sensor values")
+    args = parser.parse_args()
+
+    hub, latencies, elapsed, produced, queued = run_benchmark(args.ticks, args.interval, args.latency, args.jitter, args.drop_rate, args.outage_every, args.outage_duration, args.runtime, args.drain_rate, args.seed)
+    stats = hub.stats()
+    print(f"Loopback transport ({args.runtime}): {stats['messages']}/{produced} messages delivered in {elapsed:.3f}s ({stats['messages'] / elapsed:.1f} msg/s), {stats['bytes']} bytes")
+    print(f"\tfailed sends: {stats['dropped']} dropped, {stats['rejected']} rejected during {stats['outages']} outage(s), {queued} still queued, {produced - stats['messages'] - queued} lost")
+    report_latencies("send latency", hub.latencies())
+    report_latencies("delivery latency", latencies)
+
+
+if __name__ == '__main__':
+    main()
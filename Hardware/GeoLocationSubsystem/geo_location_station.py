@@ -1,17 +1,19 @@
-import time
 import geo_location_subsystem as gls
-from azure.iot.device import IoTHubDeviceClient, Message
+from scheduler import FixedRateScheduler
+from azure.iot.device import Message
+from transport import create_transport
 from dotenv import dotenv_values
 
 class GeoLocationStation:
     """ This class is used to send the geo-location subsystem telemetry data to the IoT Hub. It also receives the desired properties and updates the reported properties of the device twin. """
     DEFAULT_INTERVAL = 10.0
 
-    def __init__(self, connection_string: str, interval: float = DEFAULT_INTERVAL):
-        """ Constructor that instantiates the GeoLocationStation class. It takes in the connection string (str) and the interval (float) as parameters. """
+    def __init__(self, connection_string: str, interval: float = DEFAULT_INTERVAL, client=None):
+        """ Constructor that instantiates the GeoLocationStation class. It takes in the connection string (str), the interval (float) and optionally the transport to use instead of the one selected by the connection string. """
         self.connection_string = connection_string
         self.interval = interval
-        self.client = self.create_client()
+        self.scheduler = FixedRateScheduler()
+        self.client = self.create_client(client)
         self.geo_location_subsystem = gls.GeoLocationSubSystem()
 
 
@@ -22,9 +24,10 @@ class GeoLocationStation:
         except ValueError:
             return None
 
-    def create_client(self):
-        """ Method that creates the client that will be used to send the telemetry data to the IoT Hub. """
-        client = IoTHubDeviceClient.create_from_connection_string(self.connection_string)
+    def create_client(self, client=None):
+        """ Method that creates the client that will be used to send the telemetry data to the IoT Hub (see transport.create_transport), or attaches the twin handler to the one provided. """
+        if client is None:
+            client = create_transport(self.connection_string)
 
         # Define behavior for receiviing twin desired property patches
         def twin_patch_handler(twin_patch):
@@ -37,6 +40,8 @@ class GeoLocationStation:
                     parsed_interval = self.__parse_float(twin_patch[property])
                     if parsed_interval is not None and parsed_interval > 0:
                         self.interval = parsed_interval
+                        if 'telemetry' in self.scheduler.jobs:
+                            self.scheduler.set_period('telemetry', self.interval)
                         print(f"Telemetry interval updated to -> {self.interval}")
 
         try:
@@ -52,22 +57,25 @@ class GeoLocationStation:
         """ Returns the values of the geo-location subsystem. """
         return self.geo_location_subsystem.longitude, self.geo_location_subsystem.latitude, self.geo_location_subsystem.pitch, self.geo_location_subsystem.roll, self.geo_location_subsystem.vibration, self.geo_location_subsystem.buzzer
 
-    def run(self):
-        """ Method used to collect and send telemetry data from the geo-location subsystem to the IoT Hub. """
+    def send_telemetry(self):
+        """ Method used to collect and send one telemetry message from the geo-location subsystem to the IoT Hub. """
         JSON_PAYLOAD = '{{"longitude": {longitude}, "latitude": {latitude}, "pitch": {pitch}, "roll": {roll}, vibration: {vibration}, "buzzer": {buzzer}}}'
+        longitude, latitude, pitch, roll, vibration, buzzer = self.read_values()
+        formatted_payload = JSON_PAYLOAD.format(longitude=longitude, latitude=latitude, pitch=pitch, roll=roll, vibration=vibration, buzzer=buzzer)
+        
+        # Create / Initialize the message with the formatted JSON payload.
+        message = Message(formatted_payload)
+
+        # Send the message to the IoT Hub.
+        print(f"Sending message: {message}")
+        self.client.send_message(message)
+
+    def run(self):
+        """ Method used to send telemetry data from the geo-location subsystem to the IoT Hub at a fixed rate. """
         self.client.connect()
 
-        while True:
-            longitude, latitude, pitch, roll, vibration, buzzer = self.read_values()
-            formatted_payload = JSON_PAYLOAD.format(longitude=longitude, latitude=latitude, pitch=pitch, roll=roll, vibration=vibration, buzzer=buzzer)
-            
-            # Create / Initialize the message with the formatted JSON payload.
-            message = Message(formatted_payload)
-
-            # Send the message to the IoT Hub.
-            print(f"Sending message: {message}")
-            self.client.send_message(message)
-            time.sleep(self.interval)
+        self.scheduler.add_job('telemetry', self.interval, self.send_telemetry)
+        self.scheduler.run()
 
 def main():
     connection_string = get_env_values()
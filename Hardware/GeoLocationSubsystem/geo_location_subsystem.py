@@ -2,31 +2,42 @@
 import sys
 sys.path.append("../")
 import time
-import serial
-import pynmea2
 import argparse
-import seeed_python_reterminal.core as rt
-import seeed_python_reterminal.acceleration as rt_accel
 import threading
 from math import atan2, pi, sqrt
 from TelemetryHelper import Vibration
+from hardware_backend import ReTerminalBackend
+from GeoLocationSubsystem.vibration_analysis import AccelerationRingBuffer, AccelerationSample, VibrationAnalyzer
+from GeoLocationSubsystem.nmea_stream import NmeaStreamParser
 
 class GeoLocationSubSystem:
-    def __init__(self):
-        """ Constructor that initializes the GPS module and the reTerminal built-in accelerometer """
+    # Delays (seconds) between retries while the GPS serial port is unavailable, doubled after each failure
+    GPS_RETRY_MIN_DELAY = 0.1
+    GPS_RETRY_MAX_DELAY = 5.0
+    # Delay (seconds) before reopening the accelerometer event stream after an error
+    ACCELERATION_RETRY_DELAY = 1.0
+
+    def __init__(self, backend=None, vibration_bands=VibrationAnalyzer.DEFAULT_BANDS, acceleration_buffer_size=4096):
+        """ Constructor that initializes the GPS module and the reTerminal built-in accelerometer. The hardware backend used to open the devices defaults to the reTerminal.
+        Accelerometer readings are kept in a ring buffer of acceleration_buffer_size readings (about 40 seconds at 100 Hz) analyzed by the vibration property, with band energies over the vibration_bands frequency bands (Hz). """
+        self.backend = backend if backend is not None else ReTerminalBackend()
+        self.rt = self.backend.reterminal()
         # Initializes the GPS module using the default serial port of the base hat (UART)
-        self.serial = serial.Serial('/dev/ttyAMA0', 9600, timeout=1)
-        self.device = rt.get_acceleration_device()
+        self.serial = self.backend.serial_port('/dev/ttyAMA0', 9600, timeout=1)
+        self.device = self.backend.acceleration_device()
         self._latitude = None 
         self._longitude = None
-        # Considering converting acceleration data (RAW/VIBRATION) to a dictionary/array.
-        self.x = None
-        self.y = None
-        self.z = None
-        # Added values for vibration levels
-        self.previous_x = None
-        self.previous_y = None
-        self.previous_z = None
+        self.gps_parser = NmeaStreamParser()
+        # Last two complete accelerometer readings (previous, latest) as AccelerationSample, published as one tuple by the reader thread.
+        # Replacing the tuple is atomic, so the getters read a coherent pair of readings without locking.
+        self._acceleration = (None, None)
+        # Readings since the previous vibration analysis are the buffer entries from _vibration_start on
+        self.acceleration_buffer = AccelerationRingBuffer(acceleration_buffer_size)
+        self.vibration_analyzer = VibrationAnalyzer(vibration_bands)
+        self._vibration_start = 0
+        # Reader threads, the parser, the buffer and the axis state are fed by one thread each
+        self.gps_thread = None
+        self.acceleration_thread = None
         # Added during milestone #3 since the subsystem module is instatiated in the geo_location_station.py without arguments. 
         self.read_gps_data()
         self.read_acceleration_data()
@@ -47,69 +58,113 @@ class GeoLocationSubSystem:
     def longitude(self, value):
         self._longitude = self.__check_negative_values(value)
 
+    @property
+    def fix_quality(self):
+        """ Returns the GGA fix quality of the GPS (0 = no fix, 1 = GPS fix, 2 = DGPS fix...) """
+        return self.gps_parser.fix.quality
+
+    @property
+    def satellites(self):
+        """ Returns the number of satellites used by the GPS fix """
+        return self.gps_parser.fix.satellites
+
+    @property
+    def hdop(self):
+        """ Returns the horizontal dilution of precision of the GPS fix """
+        return self.gps_parser.fix.hdop
+
+    @property
+    def fix_timestamp(self):
+        """ Returns the UTC datetime of the GPS fix """
+        return self.gps_parser.fix.timestamp
+
+    @property
+    def acceleration(self):
+        """ Returns the latest complete accelerometer reading as an AccelerationSample (x, y, z, timestamp), or None before the first reading """
+        return self._acceleration[1]
+
+    @property
+    def x(self):
+        sample = self._acceleration[1]
+        return sample.x if sample is not None else None
+
+    @property
+    def y(self):
+        sample = self._acceleration[1]
+        return sample.y if sample is not None else None
+
+    @property
+    def z(self):
+        sample = self._acceleration[1]
+        return sample.z if sample is not None else None
+
     @property
     def pitch(self):
-        if self.x is not None and self.y is not None and self.z is not None:
-            return 180 * atan2(self.x, sqrt(self.y**2 + self.z**2)) / pi
+        sample = self._acceleration[1]
+        if sample is not None:
+            return 180 * atan2(sample.x, sqrt(sample.y**2 + sample.z**2)) / pi
         else:
             return None
 
     @property
     def roll(self):
-        if self.x is not None and self.y is not None and self.z is not None:
-            return 180 * atan2(self.y, sqrt(self.x**2 + self.z**2)) / pi
+        sample = self._acceleration[1]
+        if sample is not None:
+            return 180 * atan2(sample.y, sqrt(sample.x**2 + sample.z**2)) / pi
         else:
             return None
         
     @property
     def buzzer(self):
         """ Returns the state of the buzzer """
-        return rt.buzzer
+        return self.rt.buzzer
 
     @buzzer.setter
     def buzzer(self, value):
         """ Sets the state of the buzzer (Values should be either ON or OFF) """
         # Ignores case sensitivity for input value
         if value.upper() == "ON":
-            rt.buzzer = True
+            self.rt.buzzer = True
         elif value.upper() == "OFF":
-            rt.buzzer = False
+            self.rt.buzzer = False
         else:
             print("Invalid buzzer state")
 
     @property
     def vibration(self):
-        if (
-            self.previous_x is not None and
-            self.previous_y is not None and
-            self.previous_z is not None and
-            self.x is not None and
-            self.y is not None and
-            self.z is not None
-        ):
-            return Vibration({"X": self.x - self.previous_x, "Y": self.y - self.previous_y, "Z": self.z - self.previous_z})
+        """ Returns the change between the last two readings of each axis, with the analysis (RMS, peak, crest factor and band energies per axis) of the readings received since the previous call, so shocks between two telemetry samples are not missed. """
+        previous, sample = self._acceleration
+        if previous is not None:
+            samples, timestamps, self._vibration_start = self.acceleration_buffer.since(self._vibration_start)
+            analysis = self.vibration_analyzer.analyze(samples, timestamps) or {}
+            return Vibration({"X": sample.x - previous.x, "Y": sample.y - previous.y, "Z": sample.z - previous.z, **analysis})
         else:
             return None;
 
     def read_gps_data(self):
-        """ Starts a thread that reads the GPS data and updates the longitude and latitude properties """
-        threading.Thread(target=self.__read_raw_gps_data, daemon=True).start()
+        """ Starts a thread that reads the GPS data and updates the longitude and latitude properties, unless it is already running """
+        if self.gps_thread is None or not self.gps_thread.is_alive():
+            self.gps_thread = threading.Thread(target=self.__read_raw_gps_data, daemon=True)
+            self.gps_thread.start()
 
     def __read_raw_gps_data(self):
-        """ Reads the raw GPS data and updates the longitude and latitude properties. Should be utilized in a seperate thread. """
+        """ Reads the raw GPS data and updates the longitude and latitude properties. Should be utilized in a seperate thread.
+        Reads everything the serial port received at once and feeds it to the stream parser, which only decodes the GGA and RMC sentences. """
+        delay = self.GPS_RETRY_MIN_DELAY
         while True:
             try:
-                line = self.serial.readline().decode('utf-8')
-                while len(line) > 0:
-                    if (self.__parse_gps_data(line) is not None):
-                        self.longitude, self.latitude = self.__parse_gps_data(line)
-                    break
-            except UnicodeDecodeError:
-                self.serial.reset_input_buffer()
-                self.serial.flush()
-            except Exception:
+                # Blocks until the first byte or the read timeout, then takes the rest of the received bytes
+                data = self.serial.read(max(1, self.serial.in_waiting))
+            except Exception as e:
                 # This exception is thrown when the resource is temporarily unavailable (BlockingIOError/SerialException)
-                pass
+                print(f"GPS serial port unavailable, retrying in {delay}s: {e}")
+                time.sleep(delay)
+                delay = min(delay * 2, self.GPS_RETRY_MAX_DELAY)
+                continue
+            delay = self.GPS_RETRY_MIN_DELAY
+            if data and self.gps_parser.feed(data):
+                fix = self.gps_parser.fix
+                self.longitude, self.latitude = fix.longitude, fix.latitude
 
     def __check_negative_values(self, value):
         """ Checks if the value is negative, parses to a negative value if it is and returns the propper value"""
@@ -120,37 +175,42 @@ class GeoLocationSubSystem:
         except Exception:
             return None
 
-    def __parse_gps_data(self, line):
-        """ Parses the GPS data and returns the longitude and latitude properties from the GPS payload """
-        try:
-            gps_data = pynmea2.parse(line.rstrip())
-            return gps_data.lon, gps_data.lat
-        except Exception:
-            pass
-
     def read_acceleration_data(self):
-        """ Starts a thread that reads the acceleration data and updates the x, y and z properties """
-        threading.Thread(target=self.__read_raw_acceleration_data, daemon=True).start()
+        """ Starts a thread that reads the acceleration data and updates the x, y and z properties, unless it is already running """
+        if self.acceleration_thread is None or not self.acceleration_thread.is_alive():
+            self.acceleration_thread = threading.Thread(target=self.__read_raw_acceleration_data, daemon=True)
+            self.acceleration_thread.start()
 
     def __read_raw_acceleration_data(self):
-        """ Reads the raw acceleration data and updates the x, y and z properties. Should be utilized in a seperate thread. """
+        """ Reads the raw acceleration data and publishes the complete readings. Should be utilized in a seperate thread.
+        Events are drained in batches, a reading is complete at the sync event of the device. The readings of a batch are added to the acceleration buffer at once, and the last two are published as one tuple. """
+        x = y = z = None
+        updated = False
         while True:
             try:
-                for event in self.device.read_loop():
-                    accelEvent = rt_accel.AccelerationEvent(event)
-                    if (accelEvent.name != None):
-                        if accelEvent.name == rt_accel.AccelerationName.X:
-                            self.previous_x = self.x
-                            self.x = accelEvent.value
-                        elif accelEvent.name == rt_accel.AccelerationName.Y:
-                            self.previous_y = self.y
-                            self.y = accelEvent.value
-                        elif accelEvent.name == rt_accel.AccelerationName.Z:
-                            self.previous_z = self.z
-                            self.z = accelEvent.value
+                for batch in self.backend.acceleration_batches(self.device):
+                    previous, sample = self._acceleration
+                    readings = []
+                    for axis, value, timestamp in batch:
+                        if axis == 'X':
+                            x = value
+                            updated = True
+                        elif axis == 'Y':
+                            y = value
+                            updated = True
+                        elif axis == 'Z':
+                            z = value
+                            updated = True
+                        elif updated and x is not None and y is not None and z is not None:
+                            previous, sample = sample, AccelerationSample(x, y, z, timestamp)
+                            readings.append(sample)
+                            updated = False
+                    if readings:
+                        self.acceleration_buffer.extend(readings)
+                        self._acceleration = (previous, sample)
             except Exception:
-                # This exception is thrown when the resource is temporarily unavailable (BlockingIOError/SerialException)
-                pass
+                # This exception is thrown when the resource is temporarily unavailable (BlockingIOError/OSError)
+                time.sleep(self.ACCELERATION_RETRY_DELAY)
 
 def main():
     parser = argparse.ArgumentParser()
@@ -165,15 +225,8 @@ def main():
     # Parse the arguments
     args = parser.parse_args()
 
-    # Initialize the geo location subsystem
+    # Initialize the geo location subsystem, which starts reading the GPS and the accelerometer
     geo_location_subsystem = GeoLocationSubSystem()
-    
-    # The following aren't in the main loop because they need to be initialized before the main loop.
-    if (args.gps):
-        geo_location_subsystem.read_gps_data()
-
-    if (args.angles or args.vibration):
-        geo_location_subsystem.read_acceleration_data()
 
     if (args.set_buzzer):
         geo_location_subsystem.buzzer = args.set_buzzer
@@ -189,7 +242,8 @@ def main():
                     print("\nWaiting for GPS data...")
                 else:
                     print("\nGPS Data:")
-                    print(f"\tLongitude: {geo_location_subsystem.longitude}, Latitude: {geo_location_subsystem.latitude}") 
+                    print(f"\tLongitude: {geo_location_subsystem.longitude}, Latitude: {geo_location_subsystem.latitude}")
+                    print(f"\tFix quality: {geo_location_subsystem.fix_quality}, Satellites: {geo_location_subsystem.satellites}, HDOP: {geo_location_subsystem.hdop}, Time: {geo_location_subsystem.fix_timestamp}")
             
             if (args.angles):
                 if (geo_location_subsystem.x is None and geo_location_subsystem.y is None and geo_location_subsystem.z is None):
@@ -205,10 +259,12 @@ def main():
 
             if (args.vibration):
                 print("\nVibration Data:")
-                if geo_location_subsystem.vibration is None:
+                # Each read analyzes the readings received since the previous one
+                vibration = geo_location_subsystem.vibration
+                if vibration is None:
                     print("\nWaiting for accelerometer/vibration data...")
                 else:
-                    print(f"\tVibration levels: {geo_location_subsystem.vibration.toJSON()}")
+                    print(f"\tVibration levels: {vibration.toJSON()}")
             
             time.sleep(1)
     except KeyboardInterrupt:
@@ -0,0 +1,110 @@
+import time
+from collections import namedtuple
+from datetime import datetime, timezone
+
+# Latest GPS fix. latitude and longitude are the raw ddmm.mmmm NMEA fields (as pynmea2 returns them) with their N/S and E/W directions, None without a fix.
+# quality is the GGA fix quality (0 = no fix, 1 = GPS, 2 = DGPS...), hdop the horizontal dilution of precision,
+# timestamp the UTC time of the fix (None until an RMC sentence gave the date) and received_at the time.monotonic() the fix was decoded.
+GpsFix = namedtuple('GpsFix', ['latitude', 'latitude_direction', 'longitude', 'longitude_direction', 'quality', 'satellites', 'hdop', 'timestamp', 'received_at'])
+
+NO_FIX = GpsFix(None, None, None, None, 0, 0, None, None, None)
+
+
+def nmea_checksum(body):
+    """ Returns the NMEA checksum (XOR of all bytes) of a sentence body. The bytes are folded as one integer, halving its width at each step, instead of being XORed one by one. """
+    value = int.from_bytes(body, 'little')
+    width = len(body)
+    while width > 1:
+        half = (width + 1) // 2
+        value = (value ^ (value >> (8 * half))) & ((1 << (8 * half)) - 1)
+        width = half
+    return value
+
+
+class NmeaStreamParser:
+    """ Incremental NMEA 0183 parser of the GPS serial stream. Bytes are fed as they arrive and split into sentences. Only the sentence types the station needs (GGA and RMC) have their checksum validated and their fields decoded, every other sentence is skipped after a look at its type. The decoded fix is published as an immutable GpsFix, so other threads always read a consistent fix. """
+    DECODED_TYPES = (b'GGA', b'RMC')
+    # Longest valid NMEA sentence is 82 characters, a longer partial line is garbage
+    MAX_SENTENCE_LENGTH = 82
+
+    def __init__(self):
+        self.fix = NO_FIX
+        self.date = None
+        self._partial = b''
+        self.sentences = 0
+        self.decoded = 0
+        self.skipped = 0
+        self.errors = 0
+
+    def feed(self, data):
+        """ Parses the complete sentences of the received bytes, keeping a trailing partial sentence for the next call. Returns the number of decoded sentences. """
+        lines = (self._partial + data).split(b'\n')
+        self._partial = lines.pop()
+        if len(self._partial) > self.MAX_SENTENCE_LENGTH:
+            self._partial = b''
+            self.errors += 1
+        decoded = 0
+        for line in lines:
+            decoded += self.parse_line(line)
+        return decoded
+
+    def parse_line(self, line):
+        """ Parses one sentence. Returns True if it was decoded and updated the fix. """
+        line = line.strip()
+        if not line:
+            return False
+        self.sentences += 1
+        # $ttSSS,...*hh where tt is the talker (GP, GN...) and SSS the sentence type
+        if line[:1] != b'$' or line[3:6] not in self.DECODED_TYPES:
+            self.skipped += 1
+            return False
+        star = line.rfind(b'*')
+        try:
+            if star < 0 or nmea_checksum(line[1:star]) != int(line[star + 1:star + 3], 16):
+                self.errors += 1
+                return False
+            fields = line[1:star].split(b',')
+            if line[3:6] == b'GGA':
+                self.__decode_gga(fields)
+            else:
+                self.__decode_rmc(fields)
+        except (ValueError, IndexError):
+            self.errors += 1
+            return False
+        self.decoded += 1
+        return True
+
+    def __decode_gga(self, fields):
+        # GGA: time, latitude, N/S, longitude, E/W, quality, satellites, HDOP, altitude...
+        quality = int(fields[6] or 0)
+        position = self.__position(fields[2:6]) if quality else (None, None, None, None)
+        self.fix = GpsFix(*position, quality, int(fields[7] or 0), float(fields[8]) if fields[8] else None, self.__timestamp(fields[1]), time.monotonic())
+
+    def __decode_rmc(self, fields):
+        # RMC: time, status (A = valid, V = void), latitude, N/S, longitude, E/W, speed, course, date...
+        if fields[9]:
+            self.date = fields[9]
+        if fields[2] == b'A':
+            latitude, latitude_direction, longitude, longitude_direction = self.__position(fields[3:7])
+            # RMC has no fix quality, a valid RMC received before any GGA counts as a GPS fix
+            self.fix = self.fix._replace(latitude=latitude, latitude_direction=latitude_direction, longitude=longitude, longitude_direction=longitude_direction,
+                                         quality=self.fix.quality or 1, timestamp=self.__timestamp(fields[1]), received_at=time.monotonic())
+        else:
+            self.fix = self.fix._replace(latitude=None, latitude_direction=None, longitude=None, longitude_direction=None, quality=0, received_at=time.monotonic())
+
+    @staticmethod
+    def __position(fields):
+        return tuple(field.decode('ascii') or None for field in fields)
+
+    def __timestamp(self, field):
+        """ Returns the UTC datetime of the hhmmss.ss time field on the last received date, or None without a date. """
+        if self.date is None or len(field) < 6:
+            return None
+        date = self.date.decode('ascii')
+        time_of_day = field.decode('ascii')
+        seconds = float(time_of_day[4:])
+        return datetime(2000 + int(date[4:6]), int(date[2:4]), int(date[0:2]), int(time_of_day[0:2]), int(time_of_day[2:4]), int(seconds), int(seconds % 1 * 1e6), tzinfo=timezone.utc)
+
+    def stats(self):
+        """ Returns the sentence counters of the parser. """
+        return {"sentences": self.sentences, "decoded": self.decoded, "skipped": self.skipped, "errors": self.errors}
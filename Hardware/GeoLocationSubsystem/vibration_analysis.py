@@ -0,0 +1,78 @@
+import threading
+import numpy as np
+from collections import namedtuple
+
+# Complete accelerometer reading of the three axes (g), with the time of the reading given by the device (seconds)
+AccelerationSample = namedtuple('AccelerationSample', ['x', 'y', 'z', 'timestamp'])
+
+
+class AccelerationRingBuffer:
+    """ Fixed-size ring buffer of accelerometer samples (x, y, z) and their timestamps, written by the accelerometer thread. When full, the oldest samples are overwritten. """
+    def __init__(self, capacity=4096):
+        self.capacity = capacity
+        self.samples = np.zeros((capacity, 3))
+        self.timestamps = np.zeros(capacity)
+        # Total number of samples ever written, the next sample goes to index count % capacity
+        self.count = 0
+        self._lock = threading.Lock()
+
+    def extend(self, readings):
+        """ Appends a batch of AccelerationSample readings with one vectorized write. """
+        readings = np.asarray(readings[-self.capacity:], dtype=float)
+        with self._lock:
+            indices = np.arange(self.count, self.count + len(readings)) % self.capacity
+            self.samples[indices] = readings[:, :3]
+            self.timestamps[indices] = readings[:, 3]
+            self.count += len(readings)
+
+    def since(self, start):
+        """ Returns (samples, timestamps, end) with a copy of the samples written since the given count, oldest first, and the count to pass next time. Samples already overwritten are skipped. """
+        with self._lock:
+            end = self.count
+            start = max(start, end - self.capacity)
+            indices = np.arange(start, end) % self.capacity
+            return self.samples[indices], self.timestamps[indices], end
+
+
+class VibrationAnalyzer:
+    """ Vectorized analysis of a window of accelerometer samples. For each axis it computes the RMS, peak and crest factor of the vibration (the signal without its mean, which holds gravity and tilt), and the energy of the vibration spectrum in each frequency band. """
+    # Frequency bands (Hz) of the band energies, suited to the accelerometer rate of about 100 Hz
+    DEFAULT_BANDS = ((0.5, 2.0), (2.0, 5.0), (5.0, 10.0), (10.0, 25.0), (25.0, 50.0))
+    AXES = ('X', 'Y', 'Z')
+
+    def __init__(self, bands=DEFAULT_BANDS):
+        self.bands = tuple(bands)
+
+    def analyze(self, samples, timestamps):
+        """ Returns a dictionary of the window statistics, or None if the window holds less than two samples. """
+        count = len(samples)
+        if count < 2:
+            return None
+        duration = timestamps[-1] - timestamps[0]
+        sample_rate = (count - 1) / duration if duration > 0 else 0.0
+
+        vibration = samples - samples.mean(axis=0)
+        rms = np.sqrt(np.mean(vibration ** 2, axis=0))
+        peak = np.abs(vibration).max(axis=0)
+        crest_factor = np.divide(peak, rms, out=np.zeros(3), where=rms > 0)
+
+        band_energy = []
+        if sample_rate > 0:
+            # Hann window to keep the energy of strong bands from leaking into their neighbours
+            spectrum = np.abs(np.fft.rfft(vibration * np.hanning(count)[:, None], axis=0)) ** 2 / count
+            frequencies = np.fft.rfftfreq(count, 1.0 / sample_rate)
+            for low, high in self.bands:
+                energy = spectrum[(frequencies >= low) & (frequencies < high)].sum(axis=0)
+                band_energy.append({"Low": low, "High": high, **self.per_axis(energy)})
+
+        return {
+            "RMS": self.per_axis(rms),
+            "Peak": self.per_axis(peak),
+            "CrestFactor": self.per_axis(crest_factor),
+            "BandEnergy": band_energy,
+            "Samples": count,
+            "SampleRate": float(sample_rate),
+        }
+
+    def per_axis(self, values):
+        return dict(zip(self.AXES, values.tolist()))
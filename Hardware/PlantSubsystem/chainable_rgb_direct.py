@@ -30,33 +30,45 @@ THE SOFTWARE.
 '''
 # Note: Connect the chainable LED to port RPISER on the GrovePi
 import time,sys
-import RPi.GPIO as GPIO
-import smbus
+
+# Byte value -> its 8 bits, most significant bit first
+BITS = tuple(tuple((byte >> (7 - i)) & 1 for i in range(8)) for byte in range(256))
 
 class rgb_led:
 	r_all=[]
 	g_all=[]
 	b_all=[]
+	# Number of frame bit streams kept, so switching between a few states (on/off) never re-encodes them
+	MAX_CACHED_STREAMS=8
 	
-	def __init__(self,led=1):
-		GPIO.setwarnings(False)
+	# gpio defaults to RPi.GPIO, a simulated GPIO module can be given instead
+	def __init__(self,led=1,gpio=None):
+		if gpio is None:
+			import RPi.GPIO as gpio
+		self.gpio=gpio
+		self.gpio.setwarnings(False)
 		self.num_led=led
 		self.r_all=[0] * self.num_led
 		self.g_all=[0] * self.num_led
 		self.b_all=[0] * self.num_led
+		# The state of the chain is unknown until the first frame is sent
+		self.dirty=True
+		self.frames_sent=0
+		self.frames_skipped=0
+		self.streams={}
 		             
-		GPIO.setmode(GPIO.BCM)  
+		self.gpio.setmode(self.gpio.BCM)  
 		self.clk_pin= 16 #RX pin BCM
 		self.data_pin= 17 # TX pin BCM 
 		self.tv_nsec= 100
-		GPIO.setup(self.clk_pin, GPIO.OUT)
-		GPIO.setup(self.data_pin, GPIO.OUT)
+		self.gpio.setup(self.clk_pin, self.gpio.OUT)
+		self.gpio.setup(self.data_pin, self.gpio.OUT)
 
 	def sendByte(self,b):
 		# print b
 		for loop in range(8):
 			# digitalWrite(CLKPIN, LOW);
-			GPIO.output(self.clk_pin,0)
+			self.gpio.output(self.clk_pin,0)
 			time.sleep(self.tv_nsec/1000000.0)
 			# nanosleep(&TIMCLOCKINTERVAL, NULL);
 			
@@ -65,13 +77,13 @@ class rgb_led:
 			
 			if (b & 0x80) != 0:
 				# digitalWrite(DATPIN, HIGH)
-				GPIO.output(self.data_pin,1)
+				self.gpio.output(self.data_pin,1)
 			else:
 				# digitalWrite(DATPIN, LOW):
-				GPIO.output(self.data_pin,0)
+				self.gpio.output(self.data_pin,0)
 			
 			# digitalWrite(CLKPIN, HIGH);
-			GPIO.output(self.clk_pin,1)
+			self.gpio.output(self.clk_pin,1)
 			# nanosleep(&TIMCLOCKINTERVAL, NULL);
 			time.sleep(self.tv_nsec/1000000.0)
 			# //usleep(CLOCKINTERVAL);
@@ -116,11 +128,71 @@ class rgb_led:
 				self.sendByte(0)
 	
 	def setOneLED(self,r,g,b,led_num):
-		self.r_all[led_num]=r
-		self.g_all[led_num]=g
-		self.b_all[led_num]=b
-		
-		self.setColorRGBs(self.r_all,self.g_all,self.b_all,self.num_led)
+		self.setPixel(led_num,r,g,b)
+		self.show()
+
+	# Frame buffer API: set any number of pixels, then send the whole chain once with show()
+	def setPixel(self,led_num,r,g,b):
+		if self.r_all[led_num]!=r or self.g_all[led_num]!=g or self.b_all[led_num]!=b:
+			self.r_all[led_num]=r
+			self.g_all[led_num]=g
+			self.b_all[led_num]=b
+			self.dirty=True
+
+	def fill(self,r,g,b):
+		for i in range(self.num_led):
+			self.setPixel(i,r,g,b)
+
+	def colorBytes(self,r,g,b):
+		# Same frame as sendColor: flag byte followed by blue, green and red
+		prefix = 0b11000000
+		if (b & 0x80) == 0:
+			prefix |= 0b00100000
+		if (b & 0x40) == 0:	
+			prefix |= 0b00010000
+		if (g & 0x80) == 0:	
+			prefix |= 0b00001000
+		if (g & 0x40) == 0:	
+			prefix |= 0b00000100
+		if (r & 0x80) == 0:	
+			prefix |= 0b00000010
+		if (r & 0x40) == 0:	
+			prefix |= 0b00000001
+		return (prefix,b,g,r)
+
+	def frameBits(self):
+		# Data bit of every clock of the frame: start frame, one color frame per LED and end frame
+		frame=tuple(zip(self.r_all,self.g_all,self.b_all))
+		bits=self.streams.get(frame)
+		if bits is None:
+			data=[0,0,0,0]
+			for r,g,b in frame:
+				data.extend(self.colorBytes(r,g,b))
+			data.extend((0,0,0,0))
+			bits=[bit for byte in data for bit in BITS[byte]]
+			if len(self.streams)>=self.MAX_CACHED_STREAMS:
+				self.streams.pop(next(iter(self.streams)))
+			self.streams[frame]=bits
+		return bits
+
+	# Sends the frame buffer to the chain in one pass, skipping the bus entirely if no pixel changed since the last frame.
+	# The GPIO calls are far slower than the 100 ns the P9813 needs per clock, so no sleep is needed between edges.
+	# Returns True if a frame was sent.
+	def show(self,force=False):
+		if not self.dirty and not force:
+			self.frames_skipped+=1
+			return False
+		output=self.gpio.output
+		clk_pin=self.clk_pin
+		pins=(self.clk_pin,self.data_pin)
+		# Clock low with the data bit set after the falling edge, then the rising edge latches the bit
+		levels=((0,0),(0,1))
+		for bit in self.frameBits():
+			output(pins,levels[bit])
+			output(clk_pin,1)
+		self.dirty=False
+		self.frames_sent+=1
+		return True
 		
 	
 if __name__ == "__main__":	
@@ -134,3 +206,7 @@ if __name__ == "__main__":
 	b=[255,0,0]
 	l.setColorRGBs(r,g,b,num_led)
 
+	for i in range(num_led):
+		l.setPixel(i,r[i],g[i],b[i])
+	l.show(force=True)
+
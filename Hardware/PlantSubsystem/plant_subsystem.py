@@ -1,7 +1,7 @@
-from grove.grove_temperature_humidity_aht20 import GroveTemperatureHumidityAHT20
-from gpiozero import LED
-from . import chainable_rgb_direct
-from grove.adc import ADC
+# __init__.py files weren't working for relative imports, so we had to import sys as a work around.
+import sys
+sys.path.append("../")
+from hardware_backend import ReTerminalBackend
 import argparse
 import time
 
@@ -9,24 +9,31 @@ import time
 This class is used to control the hardware related to the plat subsystem.
 '''
 class PlantSubsystem:
+    # ADC channels of the moisture and water level sensors
+    MOISTURE_CHANNEL=0
+    WATER_LEVEL_CHANNEL=5
     
     # Constructor initializes and stores the tempertaure sensor, 
-    # the fan, the adc device reader and the leds
-    def __init__(self):
+    # the fan, the adc device reader and the leds.
+    # Arguments: hardware backend used to open the devices (defaults to the reTerminal),
+    # and optionally an AdcScanner the moisture and water levels are read from instead of single ADC reads
+    def __init__(self,backend=None,adc_scanner=None):
+        self.backend=backend if backend is not None else ReTerminalBackend()
+        self.adc_scanner=adc_scanner
     
         pin=0x38
         bus=4
-        self.sensor=GroveTemperatureHumidityAHT20(pin,bus)
+        self.sensor=self.backend.temperature_humidity_sensor(pin,bus)
 
-        self.fan=LED(5)
-        self.adc = ADC()
+        self.fan=self.backend.output_device(5)
+        self.adc = self.backend.adc()
 
         self.num_led=2
-        self.leds=chainable_rgb_direct.rgb_led(self.num_led)
+        self.leds=self.backend.led_chain(self.num_led)
   
     # Reads and returns the temperature and humidity respectively.
     def read_temp_and_humi(self):
-        return GroveTemperatureHumidityAHT20.read(self.sensor) 
+        return self.sensor.read()
 
     # Reads and returns the fan state. 
     # Returns true is fan is on, false otherwise
@@ -50,23 +57,26 @@ class PlantSubsystem:
                 return False
         return True
 
-    # Sets the state of the light
+    # Sets the state of the light. Every LED is set in the frame buffer and the chain is updated once.
     # Arguments: string state ('on' or 'off')
     def set_light_state(self,state):
         if(state=='on'):
-            for x in range(self.num_led):
-                self.leds.setOneLED(127,127,127,x)
+            self.leds.fill(127,127,127)
         elif(state=='off'):
-            for x in range(self.num_led):
-                self.leds.setOneLED(0,0,0,x)
+            self.leds.fill(0,0,0)
+        self.leds.show()
 
-    # Reads and returns the moisture level.
+    # Reads and returns the moisture level (from the latest ADC scan when scanning).
     def read_moisture_level(self):
-        return self.adc.read(0)
+        if(self.adc_scanner is not None):
+            return self.adc_scanner.read(self.MOISTURE_CHANNEL)
+        return self.adc.read(self.MOISTURE_CHANNEL)
 
-    # Reads and returns the water level.
+    # Reads and returns the water level (from the latest ADC scan when scanning).
     def read_water_level(self):
-        return self.adc.read(5)
+        if(self.adc_scanner is not None):
+            return self.adc_scanner.read(self.WATER_LEVEL_CHANNEL)
+        return self.adc.read(self.WATER_LEVEL_CHANNEL)
 
 
 def main():
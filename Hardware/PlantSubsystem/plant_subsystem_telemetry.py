@@ -1,8 +1,9 @@
 #Brookelyn Palfy
 from dotenv import dotenv_values
-from azure.iot.device import IoTHubDeviceClient, Message
-import time
+from azure.iot.device import Message
 import plant_subsystem
+from scheduler import FixedRateScheduler
+from transport import create_transport
 
 '''
 This class is used to send the plant subsystem telemetry data to the 
@@ -18,6 +19,7 @@ class PlantStation:
     # and plant subsystem object.
     def __init__(self):
         self.interval=self.DEFAULT_INTERVAL
+        self.scheduler=FixedRateScheduler()
         self.plant=plant_subsystem.PlantSubsystem()
         self.check_env()        
 
@@ -31,27 +33,30 @@ class PlantStation:
         if(self.IOTHUB_DEVICE_CONNECTION_STRING is None):
             raise KeyError('Missing iot hub device connection string. Please see file .env.example.')
 
-    # Method used to collect and send telemetry data from the plant subsystem to the IoT Hub.
+    # Method used to collect and send one telemetry message from the plant subsystem to the IoT Hub.
+    def send_telemetry(self):
+        temperature,humidity=self.plant.read_temp_and_humi()
+        water=self.plant.read_water_level()
+        moisture=self.plant.read_moisture_level()    
+
+        message = Message(self.MSG_TXT.format(temperature="{:.2f}".format(temperature), humidity="{:.2f}".format(humidity),water=water,moisture=moisture))
+             
+        print("Sending message: {}".format(message))
+        self.client.send_message(message)
+        print("Message sent")
+
+    # Method used to send telemetry data from the plant subsystem to the IoT Hub at a fixed rate.
     def run_telemetry(self):
 
         self.client.connect()
 
-        while True:
-            temperature,humidity=self.plant.read_temp_and_humi()
-            water=self.plant.read_water_level()
-            moisture=self.plant.read_moisture_level()    
-
-            message = Message(self.MSG_TXT.format(temperature="{:.2f}".format(temperature), humidity="{:.2f}".format(humidity),water=water,moisture=moisture))
-                 
-            print("Sending message: {}".format(message))
-            self.client.send_message(message)
-            print("Message sent")
-            time.sleep(self.interval)
+        self.scheduler.add_job('telemetry',self.interval,self.send_telemetry)
+        self.scheduler.run()
 
-    # Method used to create an IoT Hub client
-    def create_client(self):
+    # Method used to create the transport selected by the connection string (an IoT Hub client unless it is a loopback:// hub), or to attach the twin handler to the one provided
+    def create_client(self, client=None):
         
-        self.client = IoTHubDeviceClient.create_from_connection_string(self.IOTHUB_DEVICE_CONNECTION_STRING)
+        self.client = client if client is not None else create_transport(self.IOTHUB_DEVICE_CONNECTION_STRING)
 
         # Patch repoted properties and update interval
         def twin_patch_handler(twin_patch):
@@ -61,6 +66,8 @@ class PlantStation:
                     if(str(key)[0]!='$'):
                         if(key=='telemetryInterval'):
                             self.interval=twin_patch[key]
+                            if('telemetry' in self.scheduler.jobs):
+                                self.scheduler.set_period('telemetry',self.interval)
                             self.client.patch_twin_reported_properties({key:twin_patch[key]})
                             print({key:twin_patch[key]})
                 
@@ -1,9 +1,9 @@
+# __init__.py files weren't working for relative imports, so we had to import sys as a work around.
+import sys
+sys.path.append("../")
 import argparse
-from grove.adc import ADC
-from gpiozero import Button,AngularServo
-import seeed_python_reterminal.core as rt
-from grove.grove_mini_pir_motion_sensor import GroveMiniPIRMotionSensor
-from gpiozero.pins.pigpio import PiGPIOFactory
+from hardware_backend import ReTerminalBackend
+from events import EventRing
 
 #Constants 
 DOOR_PIN = 22
@@ -12,6 +12,11 @@ LOCK_PIN = 12
 NOISE_PIN = 2
 OPEN_ANGLE = 0
 CLOSE_ANGLE = 180
+# Kinds of the events recorded in the event ring
+DOOR_OPENED = 'DoorOpened'
+DOOR_CLOSED = 'DoorClosed'
+MOTION_DETECTED = 'MotionDetected'
+MOTION_CLEARED = 'MotionCleared'
 
 class SecuritySubSystem:
     #Constructor that initializes and stores:
@@ -19,36 +24,49 @@ class SecuritySubSystem:
     # - Motion Sensor
     # - Door Sensor
     # - Door Lock (Servo)
-    def __init__(self):
+    # - reTerminal (Luminosity, Buzzer)
+    # The hardware backend used to open the devices defaults to the reTerminal.
+    # The noise level is read from the latest scan of the adc_scanner (AdcScanner) if one is given.
+    # Every transition of the motion and door sensors is recorded in the events ring (EventRing) by the device callbacks.
+    def __init__(self,backend=None,adc_scanner=None):
+        self.backend = backend if backend is not None else ReTerminalBackend()
+        self.adc_scanner = adc_scanner
+        self.events = EventRing()
         #Luminosity and Buzzer
-        self.adc = ADC()
+        self.adc = self.backend.adc()
+        self.rt = self.backend.reterminal()
         #Door Sensor 
-        self.door = Button(DOOR_PIN)
+        self.door = self.backend.button(DOOR_PIN)
+        # The magnets are linked (pressed) while the door is closed
+        self.door.when_pressed = lambda: self.events.record(DOOR_CLOSED)
+        self.door.when_released = lambda: self.events.record(DOOR_OPENED)
         #Motion Sensor
         self.motion_detected = None
-        self.motionSensor = GroveMiniPIRMotionSensor(MOTION_PIN)
+        self.motionSensor = self.backend.motion_sensor(MOTION_PIN)
         self.motionSensor.on_event = self._handle_event
         #Door Lock
-        self.lock = AngularServo(LOCK_PIN,0,OPEN_ANGLE,CLOSE_ANGLE,pin_factory= PiGPIOFactory())
+        self.lock = self.backend.servo(LOCK_PIN,0,OPEN_ANGLE,CLOSE_ANGLE)
     
     #Return value of the noise sensor 
     def read_noise_level(self):
+        if(self.adc_scanner is not None):
+            return self.adc_scanner.read(NOISE_PIN)
         return self.adc.read(NOISE_PIN)
     
     #Return value of the luminosity level
     def read_luminosity_level(self):
-        return round(rt.illuminance)
+        return round(self.rt.illuminance)
     
     #Checks the state of the buzzer on the reterminal (on/off)
     def read_buzzer_state(self):
-        return rt.buzzer
+        return self.rt.buzzer
     
     #Sets the buzzer state on the reterminal(on/off)
     def set_buzzer_state(self,state):
         if(state=='on'):
-            rt.buzzer = True
+            self.rt.buzzer = True
         elif(state=='off'):
-            rt.buzzer = False
+            self.rt.buzzer = False
     
     #Checks the state of the "door" by seeing if the magnet are linked, which imitates a closed door
     def read_door_state(self):
@@ -60,6 +78,7 @@ class SecuritySubSystem:
         
     def _handle_event(self, pin, value):
         self.motion_detected = True if value == 1 else False
+        self.events.record(MOTION_DETECTED if self.motion_detected else MOTION_CLEARED)
 
     #Sets the state of the door lock (servo motor), (Open/Closed)
     def set_door_lock_state(self,state):
@@ -1,7 +1,8 @@
 from dotenv import dotenv_values
-from azure.iot.device import IoTHubDeviceClient, Message
-import time
+from azure.iot.device import Message
 import security_subsystem
+from scheduler import FixedRateScheduler
+from transport import create_transport
 
 class SecurityStation:
     # Constants
@@ -12,6 +13,7 @@ class SecurityStation:
     # and security subsystem object.
     def __init__(self):
         self.interval=SecurityStation.DEFAULT_INTERVAL
+        self.scheduler=FixedRateScheduler()
         self.security=security_subsystem.SecuritySubSystem()
         self.check_env()    
     
@@ -25,29 +27,32 @@ class SecurityStation:
         if(self.IOTHUB_DEVICE_CONNECTION_STRING is None):
             raise KeyError('Missing iot hub device connection string. Please see file .env.example.')
     
-    #Collects and sends data from the security subsytem to the IoT Hub 
+    #Collects and sends one message from the security subsytem to the IoT Hub 
+    def send_telemetry(self,client):
+        noise=self.security.read_noise_level()
+        luminosity=self.security.read_luminosity_level()
+        motion=self.security.read_motion_state()
+        door=self.security.read_door_state()
+        message = Message(SecurityStation.MSG_TXT.format(noise=noise,luminosity=luminosity,motion=motion,door=door))
+
+        message.content_encoding = "UTF-8"
+        message.content_type = "application/json"
+        print("Sending message: {}".format(message))
+        client.send_message(message)
+        print("Message sent")
+
+    #Collects and sends data from the security subsytem to the IoT Hub at a fixed rate
     def run_telemetry(self,client):
         
         client.connect()
         
-        while True:
-            noise=self.security.read_noise_level()
-            luminosity=self.security.read_luminosity_level()
-            motion=self.security.read_motion_state()
-            door=self.security.read_door_state()
-            message = Message(SecurityStation.MSG_TXT.format(noise=noise,luminosity=luminosity,motion=motion,door=door))
-
-            message.content_encoding = "UTF-8"
-            message.content_type = "application/json"
-            print("Sending message: {}".format(message))
-            client.send_message(message)
-            print("Message sent")
-            time.sleep(self.interval)
+        self.scheduler.add_job('telemetry',self.interval,lambda: self.send_telemetry(client))
+        self.scheduler.run()
     
-    #Create an IoT Hub client
-    def create_client(self):
+    #Create the transport selected by the connection string (an IoT Hub client unless it is a loopback:// hub), or attach the twin handler to the one provided
+    def create_client(self, client=None):
         
-        self.client = IoTHubDeviceClient.create_from_connection_string(self.IOTHUB_DEVICE_CONNECTION_STRING)
+        self.client = client if client is not None else create_transport(self.IOTHUB_DEVICE_CONNECTION_STRING)
 
         # Patch reported properties and update interval
         def twin_patch_handler(twin_patch):
@@ -59,6 +64,8 @@ class SecurityStation:
                             self.client.patch_twin_reported_properties({key:twin_patch[key]})
                             print({key:twin_patch[key]})
                             self.interval=twin_patch[key]
+                            if('telemetry' in self.scheduler.jobs):
+                                self.scheduler.set_period('telemetry',self.interval)
                 
             except Exception:
                 print("error")
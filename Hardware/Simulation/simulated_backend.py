@@ -0,0 +1,347 @@
+import math
+import random
+import threading
+import time
+from collections import namedtuple
+from functools import reduce
+
+# Accelerometer event produced by the simulated evdev device, axis is None for the sync event ending a reading.
+SimulatedAccelerationEvent = namedtuple('SimulatedAccelerationEvent', ['axis', 'value', 'timestamp'])
+
+
+class SimulatedAHT20:
+    """ Simulated AHT20 temperature and humidity sensor. A read blocks for the measurement time of the real sensor. """
+    def __init__(self, latency=0.08, temperature=22.0, humidity=55.0, rng=None):
+        self.latency = latency
+        self.temperature = temperature
+        self.humidity = humidity
+        self.rng = rng or random.Random()
+
+    def read(self):
+        """ Returns the temperature and humidity respectively. """
+        time.sleep(self.latency)
+        self.temperature += self.rng.uniform(-0.05, 0.05)
+        self.humidity = min(100.0, max(0.0, self.humidity + self.rng.uniform(-0.2, 0.2)))
+        return self.temperature, self.humidity
+
+
+class SimulatedADC:
+    """ Simulated Grove Base Hat ADC. Each read is one I2C transaction returning a noisy value around the level of the channel. """
+    def __init__(self, latency=0.002, levels=None, noise=5, rng=None):
+        self.latency = latency
+        # Default levels for moisture (0), noise (2) and water (5)
+        self.levels = levels if levels is not None else {0: 300, 2: 120, 5: 500}
+        self.noise = noise
+        self.rng = rng or random.Random()
+
+    def read(self, channel):
+        time.sleep(self.latency)
+        level = self.levels.get(channel, 0)
+        return max(0, min(999, level + self.rng.randint(-self.noise, self.noise)))
+
+
+class SimulatedOutputDevice:
+    """ Simulated digital output (fan relay). """
+    def __init__(self, pin):
+        self.pin = pin
+        self.is_active = False
+
+    def on(self):
+        self.is_active = True
+
+    def off(self):
+        self.is_active = False
+
+
+class SimulatedGPIO:
+    """ Simulated RPi.GPIO module for the chainable RGB LED driver. Every output call costs the time of a real GPIO call, accumulated and slept in chunks since sleeps of a few microseconds are not possible. Rising clock edges are counted. """
+    BCM = 11
+    OUT = 0
+
+    def __init__(self, call_latency=2e-6, clock_pin=16):
+        self.call_latency = call_latency
+        self.clock_pin = clock_pin
+        self.levels = {}
+        self.calls = 0
+        self.clock_pulses = 0
+        self._owed = 0.0
+
+    def setwarnings(self, flag):
+        pass
+
+    def setmode(self, mode):
+        pass
+
+    def setup(self, channel, direction):
+        self.levels[channel] = 0
+
+    def output(self, channels, values):
+        if not isinstance(channels, (list, tuple)):
+            channels, values = (channels,), (values,)
+        for channel, value in zip(channels, values):
+            if channel == self.clock_pin and value and not self.levels.get(channel):
+                self.clock_pulses += 1
+            self.levels[channel] = value
+        self.calls += 1
+        self._owed += self.call_latency
+        if self._owed >= 0.001:
+            time.sleep(self._owed)
+            self._owed = 0.0
+
+
+class SimulatedButton:
+    """ Simulated digital input (magnetic door sensor). press and release change the state and call when_pressed and when_released like gpiozero, and with an event_interval a daemon thread opens and closes the door. """
+    def __init__(self, pin, is_pressed=True, event_interval=0.0, rng=None):
+        self.pin = pin
+        self.is_pressed = is_pressed
+        self.when_pressed = None
+        self.when_released = None
+        self.event_interval = event_interval
+        self.rng = rng or random.Random()
+        if event_interval:
+            threading.Thread(target=self.__generate_events, daemon=True).start()
+
+    def press(self):
+        self.is_pressed = True
+        if self.when_pressed is not None:
+            self.when_pressed()
+
+    def release(self):
+        self.is_pressed = False
+        if self.when_released is not None:
+            self.when_released()
+
+    def __generate_events(self):
+        while True:
+            time.sleep(self.rng.uniform(0.5, 1.5) * self.event_interval)
+            if self.is_pressed:
+                self.release()
+            else:
+                self.press()
+
+
+class SimulatedMotionSensor:
+    """ Simulated mini PIR motion sensor. A daemon thread toggles the motion state and calls on_event like the grove driver. """
+    def __init__(self, pin, event_interval=5.0, rng=None):
+        self.pin = pin
+        self.on_event = None
+        self.event_interval = event_interval
+        self.rng = rng or random.Random()
+        if event_interval:
+            threading.Thread(target=self.__generate_events, daemon=True).start()
+
+    def __generate_events(self):
+        value = 0
+        while True:
+            time.sleep(self.rng.uniform(0.5, 1.5) * self.event_interval)
+            value = 1 - value
+            if self.on_event is not None:
+                self.on_event(self.pin, value)
+
+
+class SimulatedServo:
+    """ Simulated angular servo (door lock). Moving the servo takes the given latency. """
+    def __init__(self, pin, initial_angle=0, min_angle=-90, max_angle=90, latency=0.0):
+        self.pin = pin
+        self.angle = initial_angle
+        self.min_angle = min_angle
+        self.max_angle = max_angle
+        self.latency = latency
+
+    def min(self):
+        time.sleep(self.latency)
+        self.angle = self.min_angle
+
+    def max(self):
+        time.sleep(self.latency)
+        self.angle = self.max_angle
+
+
+class SimulatedReTerminal:
+    """ Simulated reTerminal core module (buzzer, light sensor and accelerometer). """
+    def __init__(self, backend, illuminance=180.0, rng=None):
+        self.backend = backend
+        self.buzzer = False
+        self._illuminance = illuminance
+        self.rng = rng or random.Random()
+
+    @property
+    def illuminance(self):
+        return max(0.0, self._illuminance + self.rng.uniform(-3.0, 3.0))
+
+    def get_acceleration_device(self):
+        return self.backend.acceleration_device()
+
+
+class SimulatedSerial:
+    """ Simulated GPS serial port. Emits a burst of NMEA sentences once per fix interval, and returns no data when the read times out like pyserial. """
+    def __init__(self, port, baudrate=9600, timeout=1, latitude=4530.1234, longitude=7334.5678, fix_interval=1.0):
+        self.port = port
+        self.baudrate = baudrate
+        self.timeout = timeout
+        self.latitude = latitude
+        self.longitude = longitude
+        self.fix_interval = fix_interval
+        self._buffer = b''
+        self._next_fix = time.monotonic()
+
+    @staticmethod
+    def checksum(body):
+        """ Returns the NMEA checksum (XOR of all characters) of the sentence body. """
+        return '{:02X}'.format(reduce(lambda c, ch: c ^ ord(ch), body, 0))
+
+    def sentence(self, body):
+        return '${}*{}\r\n'.format(body, self.checksum(body))
+
+    def _fix_sentences(self):
+        stamp = time.strftime('%H%M%S.00', time.gmtime())
+        date = time.strftime('%d%m%y', time.gmtime())
+        lat = '{:09.4f}'.format(self.latitude)
+        lon = '{:010.4f}'.format(self.longitude)
+        return [
+            self.sentence('GNGGA,{},{},N,{},W,1,08,0.9,45.0,M,-32.1,M,,'.format(stamp, lat, lon)),
+            self.sentence('GNGSA,A,3,05,12,14,17,19,24,25,32,,,,,1.6,0.9,1.3'),
+            self.sentence('GPGSV,2,1,08,05,45,120,38,12,30,210,35,14,60,045,40,17,15,300,28'),
+            self.sentence('GNRMC,{},A,{},N,{},W,0.00,0.00,{},,,A'.format(stamp, lat, lon, date)),
+            self.sentence('GNVTG,0.00,T,,M,0.00,N,0.00,K,A'),
+        ]
+
+    def _wait_for_data(self):
+        """ Waits for the next burst of sentences, returns False if the read timed out first. """
+        if not self._buffer:
+            wait = self._next_fix - time.monotonic()
+            if wait > self.timeout:
+                time.sleep(self.timeout)
+                return False
+            if wait > 0:
+                time.sleep(wait)
+            self._next_fix += self.fix_interval
+            self._buffer = ''.join(self._fix_sentences()).encode('utf-8')
+        return True
+
+    @property
+    def in_waiting(self):
+        return len(self._buffer)
+
+    def read(self, size=1):
+        if not self._wait_for_data():
+            return b''
+        data, self._buffer = self._buffer[:size], self._buffer[size:]
+        return data
+
+    def readline(self):
+        if not self._wait_for_data():
+            return b''
+        end = self._buffer.find(b'\n') + 1 or len(self._buffer)
+        line, self._buffer = self._buffer[:end], self._buffer[end:]
+        return line
+
+    def reset_input_buffer(self):
+        self._buffer = b''
+
+    def flush(self):
+        pass
+
+
+class SimulatedAccelerometer:
+    """ Simulated evdev accelerometer. Readings (in g, like the events of the hardware backend) are produced at the given sample rate with a little noise and a sinusoidal vibration on the Z axis, each as one event per axis followed by a sync event (axis None). read_batches yields the events produced since the previous batch every batch_interval seconds. """
+    def __init__(self, rate=100.0, gravity=(0.0, 0.0, 1.0), noise=0.01, vibration_frequency=12.0, vibration_amplitude=0.02, batch_interval=0.01, rng=None):
+        self.rate = rate
+        self.gravity = gravity
+        self.noise = noise
+        self.vibration_frequency = vibration_frequency
+        self.vibration_amplitude = vibration_amplitude
+        self.batch_interval = batch_interval
+        self.rng = rng or random.Random()
+
+    def read_batches(self):
+        period = 1.0 / self.rate
+        next_reading = time.monotonic()
+        while True:
+            time.sleep(self.batch_interval)
+            now = time.monotonic()
+            batch = []
+            while next_reading <= now:
+                vibration = self.vibration_amplitude * math.sin(2 * math.pi * self.vibration_frequency * next_reading)
+                for axis, value in zip(('X', 'Y', 'Z'), self.gravity):
+                    if axis == 'Z':
+                        value += vibration
+                    batch.append(SimulatedAccelerationEvent(axis, value + self.rng.gauss(0.0, self.noise), next_reading))
+                batch.append(SimulatedAccelerationEvent(None, None, next_reading))
+                next_reading += period
+            yield batch
+
+
+class SimulatedBackend:
+    """ Hardware backend that returns simulated devices with the same interface as the real drivers, so every subsystem and the Station can run and be profiled without a reTerminal. Latencies approximate the real hardware and can be scaled (0 disables all device delays). """
+    # Approximate time (s) the real drivers take to open each device: the AHT20 is reset and calibrated, the servo connects to the pigpio daemon,
+    # the gpiozero devices set up their pin and the GPS serial port and accelerometer event device are opened. Paid on every open when open_latency_scale is set.
+    OPEN_LATENCIES = {
+        'temperature_humidity_sensor': 0.06,
+        'adc': 0.01,
+        'output_device': 0.02,
+        'led_chain': 0.01,
+        'button': 0.02,
+        'motion_sensor': 0.02,
+        'servo': 0.1,
+        'serial_port': 0.05,
+        'acceleration_device': 0.03,
+    }
+
+    def __init__(self, latency_scale=1.0, seed=None, motion_interval=5.0, door_interval=0.0, open_latency_scale=0.0):
+        # Mean seconds between the transitions of the motion sensor and of the door sensor (0 disables them)
+        self.latency_scale = latency_scale
+        self.motion_interval = motion_interval
+        self.door_interval = door_interval
+        self.open_latency_scale = open_latency_scale
+        self.rng = random.Random(seed)
+        # The reTerminal is shared by the security and geo-location subsystems (buzzer)
+        self._reterminal = SimulatedReTerminal(self, rng=self.rng)
+
+    def _open(self, device):
+        if self.open_latency_scale:
+            time.sleep(self.OPEN_LATENCIES[device] * self.open_latency_scale)
+
+    def temperature_humidity_sensor(self, address, bus):
+        self._open('temperature_humidity_sensor')
+        return SimulatedAHT20(latency=0.08 * self.latency_scale, rng=self.rng)
+
+    def adc(self):
+        self._open('adc')
+        return SimulatedADC(latency=0.002 * self.latency_scale, rng=self.rng)
+
+    def output_device(self, pin):
+        self._open('output_device')
+        return SimulatedOutputDevice(pin)
+
+    def led_chain(self, num_led):
+        self._open('led_chain')
+        # The real driver runs on a simulated GPIO module
+        from PlantSubsystem import chainable_rgb_direct
+        return chainable_rgb_direct.rgb_led(num_led, gpio=SimulatedGPIO(call_latency=2e-6 * self.latency_scale))
+
+    def button(self, pin):
+        self._open('button')
+        return SimulatedButton(pin, event_interval=self.door_interval, rng=self.rng)
+
+    def motion_sensor(self, pin):
+        self._open('motion_sensor')
+        return SimulatedMotionSensor(pin, event_interval=self.motion_interval, rng=self.rng)
+
+    def servo(self, pin, initial_angle, min_angle, max_angle):
+        self._open('servo')
+        return SimulatedServo(pin, initial_angle, min_angle, max_angle, latency=0.02 * self.latency_scale)
+
+    def reterminal(self):
+        return self._reterminal
+
+    def serial_port(self, port, baudrate, timeout):
+        self._open('serial_port')
+        return SimulatedSerial(port, baudrate, timeout=timeout)
+
+    def acceleration_device(self):
+        self._open('acceleration_device')
+        return SimulatedAccelerometer(rng=self.rng)
+
+    def acceleration_batches(self, device):
+        return device.read_batches()
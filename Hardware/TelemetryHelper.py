@@ -1,6 +1,21 @@
 import json
+import threading
+from math import isfinite
+from operator import attrgetter, itemgetter
+from json.encoder import encode_basestring_ascii
 
 class Telemetry:
+    """ Telemetry record of one sample of all subsystems. Fields are stored in slots (no per-instance __dict__) and serialized by TelemetryEncoder. """
+    # Telemetry fields in the order they are serialized (alphabetical, as the payload has always been)
+    FIELDS = ('BuzzerIsActive', 'Door', 'DoorIsLocked', 'FanIsActive', 'Humidity', 'Latitude', 'LightIsActive', 'Longitude', 'Luminosity', 'Moisture', 'Motion', 'Noise', 'Pitch', 'Roll', 'Temperature', 'Vibration', 'WaterLevel')
+    # Fields left out of the payload when they are None.
+    # Stale lists the fields holding a previous value because their sensor missed its deadline (parallel sampling only),
+    # Timestamp is the time the sample was taken (batched samples only),
+    # Keyframe tells if the sample holds every field or only the ones that changed (report by exception only),
+    # Events summarizes the door and motion transitions since the previous message (see events.summarize_events).
+    OPTIONAL_FIELDS = ('Events', 'Keyframe', 'Stale', 'Timestamp')
+    __slots__ = FIELDS + OPTIONAL_FIELDS
+
     def __init__(self, telemetry_data):
         self.__set_values(telemetry_data)
 
@@ -22,11 +37,24 @@ class Telemetry:
         self.Motion = telemetry_data['Motion']
         self.Luminosity = telemetry_data['Luminosity']
         self.Noise = telemetry_data['Noise']
+        self.Stale = telemetry_data.get('Stale')
+        self.Timestamp = telemetry_data.get('Timestamp')
+        self.Keyframe = telemetry_data.get('Keyframe')
+        self.Events = telemetry_data.get('Events')
 
     def toJSON(self):
-        return json.dumps(self, default=lambda o: o.__dict__, sort_keys=True)
-    
+        return _thread_encoder().encode(self)
+
 class Vibration:
+    """ Vibration record of the accelerometer axes, stored in slots. X, Y and Z hold the change between the last two readings, the analysis fields describe the window of readings since the previous record. """
+    FIELDS = ('X', 'Y', 'Z')
+    # Window analysis fields (see VibrationAnalyzer), left out of the payload when they are None.
+    # RMS, Peak and CrestFactor hold one value per axis, BandEnergy one entry per frequency band.
+    ANALYSIS_FIELDS = ('BandEnergy', 'CrestFactor', 'Peak', 'RMS', 'SampleRate', 'Samples')
+    # Analysis fields compared by report by exception, in g like the axes (the crest factor is a ratio)
+    DEADBAND_ANALYSIS_FIELDS = ('Peak', 'RMS')
+    __slots__ = FIELDS + ANALYSIS_FIELDS
+
     def __init__(self, vibration_data):
         self.__set_values(vibration_data)
 
@@ -34,6 +62,184 @@ class Vibration:
         self.X = vibration_data['X']
         self.Y = vibration_data['Y']
         self.Z = vibration_data['Z']
+        self.RMS = vibration_data.get('RMS')
+        self.Peak = vibration_data.get('Peak')
+        self.CrestFactor = vibration_data.get('CrestFactor')
+        self.BandEnergy = vibration_data.get('BandEnergy')
+        self.SampleRate = vibration_data.get('SampleRate')
+        self.Samples = vibration_data.get('Samples')
+
+    def toJSON(self):
+        return _encode_vibration(self)
+
+class Aggregate:
+    """ Statistics of the readings of a numeric field during an upload window, sent in place of the point value of the field. Stored in slots. """
+    FIELDS = ('Count', 'Max', 'Mean', 'Min', 'StdDev')
+    # Fields compared by report by exception, the count changes with every window
+    DEADBAND_FIELDS = ('Max', 'Mean', 'Min')
+    __slots__ = FIELDS
+
+    def __init__(self, aggregate_data):
+        self.Count = aggregate_data['Count']
+        self.Min = aggregate_data['Min']
+        self.Max = aggregate_data['Max']
+        self.Mean = aggregate_data['Mean']
+        self.StdDev = aggregate_data['StdDev']
 
     def toJSON(self):
-        return json.dumps(self, default=lambda o: o.__dict__, sort_keys=True)
\ No newline at end of file
+        return _encode_aggregate(self)
+
+
+def _encode_float(value):
+    # Same output as json.dumps, which spells out NaN and infinities
+    if not isfinite(value):
+        return json.dumps(value)
+    return float.__repr__(value)
+
+def _encode_vibration(vibration):
+    x, y, z = vibration.X, vibration.Y, vibration.Z
+    if type(x) is float and type(y) is float and type(z) is float and isfinite(x + y + z):
+        # Finite floats, the usual axes: repr is their JSON form
+        axes = '"X": %r, "Y": %r, "Z": %r}' % (x, y, z)
+    else:
+        axes = '"X": ' + _encode_value(x) + ', "Y": ' + _encode_value(y) + ', "Z": ' + _encode_value(z) + '}'
+    if vibration.Samples is None:
+        return '{' + axes
+    # Analysis fields sort before the axes
+    return '{' + ''.join('"' + field + '": ' + _encode_value(getattr(vibration, field)) + ', ' for field in Vibration.ANALYSIS_FIELDS) + axes
+
+def _encode_aggregate(aggregate):
+    count, maximum, mean, minimum, deviation = aggregate.Count, aggregate.Max, aggregate.Mean, aggregate.Min, aggregate.StdDev
+    if type(count) is int and type(maximum) is float and type(mean) is float and type(minimum) is float and type(deviation) is float and isfinite(maximum + mean + minimum + deviation):
+        return '{"Count": %r, "Max": %r, "Mean": %r, "Min": %r, "StdDev": %r}' % (count, maximum, mean, minimum, deviation)
+    return ('{"Count": ' + _encode_value(aggregate.Count) + ', "Max": ' + _encode_value(aggregate.Max) + ', "Mean": ' + _encode_value(aggregate.Mean)
+            + ', "Min": ' + _encode_value(aggregate.Min) + ', "StdDev": ' + _encode_value(aggregate.StdDev) + '}')
+
+def _record_fields(record):
+    fields = {field: getattr(record, field) for field in record.FIELDS}
+    for field in getattr(record, 'ANALYSIS_FIELDS', ()):
+        if getattr(record, field) is not None:
+            fields[field] = getattr(record, field)
+    return fields
+
+def _encode_default(value):
+    return json.dumps(value, default=_record_fields, sort_keys=True)
+
+# Encoder of each value type found in a telemetry record, anything else goes through json.dumps
+_VALUE_ENCODERS = {
+    bool: lambda value: 'true' if value else 'false',
+    int: int.__repr__,
+    float: _encode_float,
+    str: encode_basestring_ascii,
+    type(None): lambda value: 'null',
+    Vibration: _encode_vibration,
+    Aggregate: _encode_aggregate,
+}
+
+def _encode_value(value):
+    return _VALUE_ENCODERS.get(type(value), _encode_default)(value)
+
+
+# Encoders of the values a layout template writes with %s, finite ints and floats are written with %r, which gives their JSON form
+_LAYOUT_ENCODERS = {
+    bool: {True: 'true', False: 'false'}.__getitem__,
+    str: encode_basestring_ascii,
+    Vibration: _encode_vibration,
+    Aggregate: _encode_aggregate,
+}
+
+def _getter(indices):
+    """ Returns a callable returning the tuple of the items at the given indices. """
+    if len(indices) == 1:
+        index = indices[0]
+        return lambda values: (values[index],)
+    return itemgetter(*indices) if indices else (lambda values: ())
+
+
+class TelemetryEncoder:
+    """ Serializes Telemetry records over a fixed key order, giving the same JSON as json.dumps(sort_keys=True). Records are serialized through a % template compiled once per layout (the type of every field): the keys, the optional fields left out and the null values are part of the template, numbers are written by the formatting itself, and only the other values go through an encoder. An encoder must only be used by one thread at a time. """
+    # Layouts kept compiled, a record only changes layout when a sensor fails or an option is toggled
+    MAX_LAYOUTS = 64
+
+    def __init__(self):
+        self.fields = tuple(sorted(Telemetry.FIELDS + Telemetry.OPTIONAL_FIELDS))
+        # The first field is never optional, so it always opens the object
+        self.keys = tuple(('{' if i == 0 else ', ') + '"' + field + '": ' for i, field in enumerate(self.fields))
+        self.optional = tuple(field in Telemetry.OPTIONAL_FIELDS for field in self.fields)
+        self.values = attrgetter(*self.fields)
+        # Key fragments at even indices and values at odd indices, followed by the closing brace
+        self.parts = [''] * (2 * len(self.fields)) + ['}']
+        # Tuple of the field types -> compiled layout (see compile_layout)
+        self.layouts = {}
+
+    def compile_layout(self, types):
+        """ Returns (template, getter, conversions, floats) for the records whose fields have the given types: the % template of the payload, the getter of the values it writes, the (position, encoder) of the values encoded before being written, and the getter of the float values (None without floats). """
+        parts = []
+        present = []
+        conversions = []
+        for i, (key, value_type, optional) in enumerate(zip(self.keys, types, self.optional)):
+            if value_type is type(None):
+                if not optional:
+                    parts.append(key.replace('%', '%%') + 'null')
+                continue
+            if value_type is int or value_type is float:
+                parts.append(key.replace('%', '%%') + '%r')
+            else:
+                parts.append(key.replace('%', '%%') + '%s')
+                conversions.append((len(present), _LAYOUT_ENCODERS.get(value_type, _encode_default)))
+            present.append(i)
+        floats = [i for i, value_type in enumerate(types) if value_type is float]
+        return ''.join(parts) + '}', _getter(present), tuple(conversions), _getter(floats) if floats else None
+
+    def encode(self, telemetry, fields=None):
+        """ Returns the JSON payload of a Telemetry record. When fields is given, only those fields (and the optional fields that are set) are written. """
+        if fields is not None:
+            return self.encode_fields(telemetry, fields)
+        values = self.values(telemetry)
+        types = tuple(map(type, values))
+        layout = self.layouts.get(types)
+        if layout is None:
+            if len(self.layouts) >= self.MAX_LAYOUTS:
+                self.layouts.clear()
+            layout = self.layouts[types] = self.compile_layout(types)
+        template, getter, conversions, floats = layout
+        # NaN and infinities are spelled out like json.dumps does, by the generic path
+        if floats is not None and not isfinite(sum(floats(values))):
+            return self.encode_values(values)
+        written = list(getter(values))
+        for position, encoder in conversions:
+            written[position] = encoder(written[position])
+        return template % tuple(written)
+
+    def encode_values(self, values):
+        """ Returns the JSON payload of the values of every field, encoding them one by one. """
+        parts = self.parts
+        encoders = _VALUE_ENCODERS
+        i = 0
+        for value, key, optional in zip(values, self.keys, self.optional):
+            if optional and value is None:
+                parts[i] = ''
+                parts[i + 1] = ''
+            else:
+                parts[i] = key
+                parts[i + 1] = encoders.get(type(value), _encode_default)(value)
+            i += 2
+        return ''.join(parts)
+
+    def encode_fields(self, telemetry, fields):
+        """ Returns the JSON payload of the given fields of a Telemetry record, plus the optional fields that are set. """
+        parts = []
+        for field, value, optional in zip(self.fields, self.values(telemetry), self.optional):
+            if (value is not None) if optional else (field in fields):
+                parts.append(', "' + field + '": ' + _encode_value(value))
+        return '{' + ''.join(parts)[2:] + '}'
+
+
+_local = threading.local()
+
+def _thread_encoder():
+    """ Returns the encoder of the calling thread used by Telemetry.toJSON. """
+    encoder = getattr(_local, 'encoder', None)
+    if encoder is None:
+        encoder = _local.encoder = TelemetryEncoder()
+    return encoder
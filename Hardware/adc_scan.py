@@ -0,0 +1,78 @@
+import threading
+import time
+from statistics import fmean, median
+
+
+class AdcScanner:
+    """ Reads a set of ADC channels in one burst, oversampling each channel and reducing its samples with a mean or median filter. The getters of the subsystems read their channel from the latest scan, and a new scan is started by the first getter asking again for a channel of the latest scan, or once the scan is older than max_age. So reading the moisture, water level and noise sensors one after another costs one scan.
+
+    The Grove Base Hat ADC has one register per channel, a scan reads the channels one after another inside a single bus transaction (see transaction), interleaving the channels on each oversampling pass. """
+    FILTERS = {'mean': fmean, 'median': median}
+
+    def __init__(self, adc, channels, oversampling=1, filter='mean', max_age=1.0, transaction=None):
+        # transaction(function) runs function as one transaction on the bus of the ADC, defaults to calling it
+        self.adc = adc
+        self.channels = tuple(channels)
+        self.max_age = max_age
+        self.transaction = transaction if transaction is not None else lambda function: function()
+        self.values = {}
+        self.scanned_at = None
+        self.scans = 0
+        self.scan_time = 0.0
+        # Channels read from the latest scan
+        self.consumed = set()
+        self._lock = threading.Lock()
+        self.oversampling = 1
+        self.filter = 'mean'
+        self.configure(oversampling, filter)
+
+    def __scan(self):
+        samples = {channel: [] for channel in self.channels}
+        for _ in range(self.oversampling):
+            for channel in self.channels:
+                samples[channel].append(self.adc.read(channel))
+        if self.oversampling == 1:
+            return {channel: values[0] for channel, values in samples.items()}
+        reduce = self.FILTERS[self.filter]
+        return {channel: reduce(values) for channel, values in samples.items()}
+
+    def scan(self):
+        """ Reads every channel and returns the filtered value of each channel, by channel. """
+        with self._lock:
+            return self.__locked_scan()
+
+    def __locked_scan(self):
+        start = time.perf_counter()
+        self.values = self.transaction(self.__scan)
+        self.scanned_at = time.monotonic()
+        self.scans += 1
+        self.scan_time += time.perf_counter() - start
+        self.consumed = set()
+        return self.values
+
+    def read(self, channel):
+        """ Returns the value of the channel from the latest scan, scanning again if the channel was already read from it or it is older than max_age. """
+        if channel not in self.channels:
+            return self.adc.read(channel)
+        with self._lock:
+            if channel in self.consumed or self.scanned_at is None or time.monotonic() - self.scanned_at > self.max_age:
+                self.__locked_scan()
+            self.consumed.add(channel)
+            return self.values[channel]
+
+    def configure(self, oversampling=None, filter=None):
+        """ Changes the oversampling or the filter, the next read starts a new scan. """
+        if filter is not None and filter not in self.FILTERS:
+            raise ValueError(f"Invalid ADC filter {filter}, expected one of {tuple(self.FILTERS)}")
+        if oversampling is not None and int(oversampling) < 1:
+            raise ValueError("The ADC oversampling must be at least 1")
+        with self._lock:
+            if oversampling is not None:
+                self.oversampling = int(oversampling)
+            if filter is not None:
+                self.filter = filter
+            self.scanned_at = None
+
+    def stats(self):
+        """ Returns the number of scans, their mean duration (s), the channels and the oversampling and filter. """
+        return {"scans": self.scans, "meanScanTime": self.scan_time / self.scans if self.scans else 0.0, "channels": list(self.channels), "oversampling": self.oversampling, "filter": self.filter}
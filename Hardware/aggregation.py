@@ -0,0 +1,68 @@
+import threading
+from math import sqrt
+from TelemetryHelper import Aggregate
+
+
+class RunningStatistics:
+    """ Running count, minimum, maximum, mean and standard deviation of a stream of values, in constant memory (Welford's algorithm). """
+    def __init__(self):
+        self.reset()
+
+    def reset(self):
+        self.count = 0
+        self.minimum = None
+        self.maximum = None
+        self.mean = 0.0
+        self._m2 = 0.0
+
+    def add(self, value):
+        self.count += 1
+        if self.count == 1:
+            self.minimum = self.maximum = value
+        else:
+            self.minimum = min(self.minimum, value)
+            self.maximum = max(self.maximum, value)
+        delta = value - self.mean
+        self.mean += delta / self.count
+        self._m2 += delta * (value - self.mean)
+
+    @property
+    def stddev(self):
+        return sqrt(self._m2 / self.count) if self.count > 1 else 0.0
+
+    def aggregate(self):
+        """ Returns the statistics as an Aggregate telemetry record, with a Count of 0 and no statistics when no value was added. """
+        if not self.count:
+            return Aggregate({"Count": 0, "Min": None, "Max": None, "Mean": None, "StdDev": None})
+        return Aggregate({"Count": self.count, "Min": self.minimum, "Max": self.maximum, "Mean": self.mean, "StdDev": self.stddev})
+
+
+class WindowAggregator:
+    """ Reduces every reading of the given numeric fields taken during an upload window into running statistics, so the upload reports the whole window instead of one point sample. Readings are added by the sampling threads while the upload flushes the window, so both hold the lock. """
+    def __init__(self, fields):
+        self.fields = tuple(fields)
+        self.statistics = {field: RunningStatistics() for field in self.fields}
+        self._lock = threading.Lock()
+
+    def add(self, values, exclude=()):
+        """ Adds the readings of the aggregated fields found in values. None values (failed reads) and the excluded fields (stale values) are skipped. """
+        with self._lock:
+            for field, statistics in self.statistics.items():
+                value = values.get(field)
+                if value is not None and field not in exclude:
+                    statistics.add(value)
+
+    def reset(self):
+        with self._lock:
+            self.__reset()
+
+    def __reset(self):
+        for statistics in self.statistics.values():
+            statistics.reset()
+
+    def flush(self):
+        """ Returns the Aggregate of every field, and starts a new window. A field not read during the window gets an Aggregate with a Count of 0, so an aggregated field is always sent as an Aggregate and never falls back to the point reading. """
+        with self._lock:
+            aggregates = {field: statistics.aggregate() for field, statistics in self.statistics.items()}
+            self.__reset()
+        return aggregates
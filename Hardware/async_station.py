@@ -0,0 +1,306 @@
+import asyncio
+import time
+from concurrent.futures import ThreadPoolExecutor
+from scheduler import JobStatistics
+from lanes import ALARM_LANE, BULK_LANE
+from station import Station, get_env_values, get_metrics_port, get_subsystems
+
+class AsyncStation(Station):
+    """ asyncio runtime of the Station on the asyncio IoT Hub client (azure.iot.device.aio). Uploading, the sampling of each sensor with its own sampling interval, the event uploads, the alarm lane, twin handling and queue forwarding run as separate tasks, so a slow send or twin patch no longer delays sampling. Blocking hardware reads run on a bounded executor. run and shutdown are coroutines. """
+    # Threads of the executor running the blocking hardware reads
+    DEFAULT_MAX_WORKERS = 4
+    # Seconds the pending alarms are given to be sent when the station stops
+    ALARM_DRAIN_TIMEOUT = 5
+
+    # The executor running the hardware reads can be shared by several stations (see Gateway), and start_delay delays the first deadline of every job.
+    def __init__(self, iot_device_connection_string, max_workers=DEFAULT_MAX_WORKERS, executor=None, start_delay=0.0, **kwargs):
+        # Set before the Station constructor, which creates the client
+        self.loop = None
+        self.twin_patches = None
+        self.owns_executor = executor is None
+        self.executor = executor if executor is not None else ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='hardware')
+        self.start_delay = start_delay
+        self.tasks = {}
+        self.wakeups = {}
+        self.job_stats = {}
+        super().__init__(iot_device_connection_string, **kwargs)
+
+    def create_client(self, client=None):
+        """ Creates the asyncio transport selected by the connection string, or attaches the twin handler to the one provided. Patches are handed to the twin task, whatever thread or event loop the client delivers them on. """
+        if client is None:
+            from transport import create_transport
+            client = create_transport(self.iot_device_connection_string, asynchronous=True)
+        self.client = client
+
+        def twin_patch_handler(twin_patch):
+            if self.loop is not None:
+                self.loop.call_soon_threadsafe(self.twin_patches.put_nowait, twin_patch)
+
+        self.client.on_twin_desired_properties_patch_received = twin_patch_handler
+        return self.client
+
+    async def run_blocking(self, function, *args):
+        """ Runs a blocking hardware call on the bounded executor. """
+        return await self.loop.run_in_executor(self.executor, function, *args)
+
+    async def periodic(self, name, period, delay=0.0):
+        """ Yields at the fixed-rate deadlines of a job, like the FixedRateScheduler: deadline k is the start plus k periods, and a job that falls behind skips the deadlines it missed. period is called for the current period, and the job ends when it returns None. The first deadline is delay seconds after the start delay of the station. A period change takes effect right away when the wakeup event of the job is set. """
+        stats = self.job_stats[name] = JobStatistics()
+        wakeup = self.wakeups[name] = asyncio.Event()
+        current = period()
+        deadline = self.loop.time() + self.start_delay + delay
+        while True:
+            updated = period()
+            if updated is None:
+                return
+            if updated != current:
+                deadline = max(deadline - current + updated, self.loop.time())
+                current = updated
+            wait = deadline - self.loop.time()
+            if wait > 0:
+                wakeup.clear()
+                try:
+                    await asyncio.wait_for(wakeup.wait(), wait)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+            now = self.loop.time()
+            missed = 0
+            jitter = 0.0
+            if current > 0:
+                missed = int((now - deadline) // current)
+                jitter = now - deadline - missed * current
+                deadline += (missed + 1) * current
+            else:
+                deadline = now
+            stats.add(jitter, missed)
+            if missed:
+                print(f"Scheduler: {name} missed {missed} deadline(s)")
+            yield
+            # A period of 0 runs back to back, but lets the other tasks run in between
+            await asyncio.sleep(0)
+
+    def set_interval(self, interval):
+        self.interval = interval
+        if 'upload' in self.wakeups:
+            self.wakeups['upload'].set()
+
+    def schedule_sampling_jobs(self):
+        """ Starts the sampling task of every sensor with a sampling interval and wakes up the running ones, which end once their sensor has no sampling interval anymore. """
+        for read in self.reads:
+            if read.name in self.wakeups:
+                self.wakeups[read.name].set()
+            task = self.tasks.get(read.name)
+            if read.name in self.sampling_intervals and (task is None or task.done()):
+                self.tasks[read.name] = self.loop.create_task(self.sample_sensor_task(read))
+
+    async def sample_sensor_task(self, read):
+        async for _ in self.periodic(read.name, lambda: self.sampling_intervals.get(read.name)):
+            await self.run_blocking(self.sample_sensor, read)
+        self.wakeups.pop(read.name, None)
+
+    async def twin_task(self):
+        """ Applies the desired properties patches in order and acknowledges each with one reported properties patch, sent by the command worker when the patch holds actuator states. """
+        while True:
+            twin_patch = await self.twin_patches.get()
+            print("Twin patch received:")
+            reported = self.apply_twin_patch(twin_patch)
+            if reported:
+                try:
+                    await self.client.patch_twin_reported_properties(reported)
+                    print(reported)
+                except Exception:
+                    print("An error occurred while reporting the twin properties.")
+
+    async def send_telemetry(self):
+        """ Collects one telemetry sample on the hardware executor and sends its payload. """
+        sampled_at = time.time()
+        payload = self.prepare_payload(await self.run_blocking(self.sample))
+        if payload is not None:
+            await self.send_payload(payload, sampled_at)
+
+    async def send_payload(self, payload, sampled_at=None):
+        """ Sends a telemetry message on the bulk lane once the pending alarms are sent, or queues it in the store-and-forward queue while the link is down or older messages are still queued. """
+        if self.queue is not None and (self.queue.depth or not self.is_connected()):
+            await self.loop.run_in_executor(None, self.enqueue_payload, payload)
+            return
+        print("Sending message: {}".format(payload))
+        await self.alarms.join()
+        start = time.perf_counter() if self.metrics is not None else None
+        try:
+            await self.client.send_message(payload)
+        except Exception:
+            if start is not None:
+                self.send_failures.inc()
+            if self.queue is None:
+                raise
+            print("An error occurred while sending the message.")
+            await self.loop.run_in_executor(None, self.enqueue_payload, payload)
+            return
+        if start is not None:
+            self.send_time.observe(time.perf_counter() - start)
+        if sampled_at is not None:
+            self.lanes[BULK_LANE].add(time.time() - sampled_at)
+        print("Message sent")
+
+    def create_alarm_lane(self):
+        # The alarms are sent by the alarm task, on the event loop
+        return None
+
+    def submit_alarm(self, payload, raised_at=None):
+        # Called from the hardware executor and the event loop, the alarm queue belongs to the event loop
+        if not self.running:
+            return
+        try:
+            self.loop.call_soon_threadsafe(self.alarms.put_nowait, (payload, time.time() if raised_at is None else raised_at))
+        except RuntimeError:
+            # The event loop closed
+            pass
+
+    async def alarm_task(self):
+        """ Sends the alarms one after another as soon as they are submitted, ahead of the routine sends which wait for the alarm queue to be empty. An alarm that fails to send is kept in the store-and-forward queue. """
+        stats = self.lanes[ALARM_LANE]
+        while True:
+            payload, raised_at = await self.alarms.get()
+            try:
+                print("Sending alarm: {}".format(payload))
+                await self.client.send_message(payload)
+                stats.add(time.time() - raised_at)
+            except Exception as e:
+                stats.failure()
+                print(f"An error occurred while sending an alarm: {e}")
+                if self.queue is not None:
+                    await self.loop.run_in_executor(None, self.enqueue_payload, payload)
+            finally:
+                self.alarms.task_done()
+
+    def notify_events(self):
+        # Called from the thread of the device callback, the wakeup event belongs to the event loop
+        if self.upload_events and self.running:
+            try:
+                self.loop.call_soon_threadsafe(self.events_ready.set)
+            except RuntimeError:
+                # The event loop closed
+                pass
+
+    def start_event_upload(self):
+        task = self.tasks.get('events')
+        if self.upload_events and (task is None or task.done()):
+            self.tasks['events'] = self.loop.create_task(self.event_task())
+
+    async def event_task(self):
+        """ Sends the door and motion events on the alarm lane as soon as they happen, at most one message every event_min_interval seconds. """
+        while True:
+            await self.events_ready.wait()
+            self.events_ready.clear()
+            payload, raised_at = self.prepare_events_payload()
+            if payload is not None:
+                self.submit_alarm(payload, raised_at)
+            await asyncio.sleep(self.event_min_interval)
+
+    async def report_metrics_task(self):
+        """ Sends the metrics summary as a reported property every metrics report interval. """
+        async for _ in self.periodic('metrics', lambda: self.metrics_report_interval, delay=self.metrics_report_interval):
+            try:
+                await self.client.patch_twin_reported_properties({'metrics': self.metrics_summary()})
+            except Exception:
+                print("An error occurred while reporting the metrics.")
+
+    def send_queued(self, payload):
+        # Called from the forwarding thread, the client belongs to the event loop
+        asyncio.run_coroutine_threadsafe(self.send_after_alarms(payload), self.loop).result()
+
+    async def send_after_alarms(self, payload):
+        await self.alarms.join()
+        await self.client.send_message(payload)
+
+    def report_properties(self, reported):
+        # Called from the command worker thread, the client belongs to the event loop
+        asyncio.run_coroutine_threadsafe(self.client.patch_twin_reported_properties(reported), self.loop).result()
+
+    async def run(self, ticks=None):
+        """ Collects and sends telemetry data at a fixed rate until cancelled, or for a number of ticks. """
+        self.loop = asyncio.get_running_loop()
+        self.twin_patches = asyncio.Queue()
+        self.events_ready = asyncio.Event()
+        self.alarms = asyncio.Queue()
+        await self.client.connect()
+
+        self.tasks['twin'] = self.loop.create_task(self.twin_task())
+        self.tasks['alarms'] = self.loop.create_task(self.alarm_task())
+        if self.queue is not None and self.forwarder is None:
+            # The forwarder paces the queue with blocking waits, so it keeps its own thread
+            self.forwarder = self.loop.create_task(asyncio.to_thread(self.forward_backlog))
+
+        self.start_metrics_server()
+        if self.metrics is not None and self.metrics_report_interval:
+            self.tasks['metrics'] = self.loop.create_task(self.report_metrics_task())
+
+        self.running = True
+        self.start_event_upload()
+        self.schedule_sampling_jobs()
+        sent = 0
+        try:
+            async for _ in self.periodic('upload', lambda: self.interval):
+                await self.send_telemetry()
+                sent += 1
+                if ticks is not None and sent >= ticks:
+                    break
+        finally:
+            self.running = False
+            try:
+                await asyncio.wait_for(self.alarms.join(), self.ALARM_DRAIN_TIMEOUT)
+            except asyncio.TimeoutError:
+                print(f"{self.alarms.qsize()} alarm(s) left unsent.")
+            tasks = list(self.tasks.values())
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+            self.tasks.clear()
+            self.wakeups.clear()
+
+    def scheduler_stats(self):
+        return {name: stats.as_dict() for name, stats in self.job_stats.items()}
+
+    async def shutdown(self):
+        """ Sends (or queues) the pending batch, stops the sampling and actuator workers and the forwarding thread, and shuts down the IoT Hub client. """
+        payload = self.batcher.flush()
+        if payload is not None:
+            try:
+                await self.send_payload(payload)
+            except Exception:
+                print("An error occurred while sending the pending batch.")
+        if self.sampler is not None:
+            self.sampler.shutdown()
+        # The command worker reports through the event loop, so it is joined off the loop
+        await asyncio.to_thread(self.commands.stop)
+        self.stopping = True
+        if self.queue is not None:
+            self.backlog_event.set()
+            if self.forwarder is not None:
+                await self.forwarder
+            self.queue.close()
+        self.stop_metrics_server()
+        if self.history is not None:
+            self.history.close()
+        if self.owns_executor:
+            self.executor.shutdown(wait=False)
+        await self.client.shutdown()
+
+
+async def run_station():
+    station = AsyncStation(get_env_values(), queue_path=Station.DEFAULT_QUEUE_PATH, history_path=Station.DEFAULT_HISTORY_PATH, upload_events=True, metrics_port=get_metrics_port(), subsystems=get_subsystems())
+    try:
+        await station.run()
+    finally:
+        print("Shutting down IoTHubClient")
+        await station.shutdown()
+
+def main():
+    try:
+        asyncio.run(run_station())
+    except KeyboardInterrupt:
+        print("IoTHubClient / Station interuptted by user")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,69 @@
+import threading
+import time
+
+
+class TelemetryBatcher:
+    """ Collects serialized telemetry records and joins them into one message holding a JSON array. A batch is flushed once it holds max_size records, once its oldest record is max_age seconds old (0 disables the age limit) or before it would exceed the IoT Hub message size limit. """
+    # IoT Hub device-to-cloud messages are limited to 256 KB
+    MAX_MESSAGE_BYTES = 256 * 1024
+
+    def __init__(self, max_size=1, max_age=0):
+        self.max_size = max_size
+        self.max_age = max_age
+        self.records = []
+        self.size = 0
+        self.started = None
+        self._lock = threading.Lock()
+
+    @property
+    def active(self):
+        """ True when records are batched, or a batch is still pending after batching was turned off. """
+        return self.max_size > 1 or bool(self.records)
+
+    def configure(self, max_size=None, max_age=None):
+        """ Changes the batch size and/or the maximum age (s) of a batch. """
+        with self._lock:
+            if max_size is not None:
+                if int(max_size) < 1:
+                    raise ValueError(f"Invalid batch size {max_size}, expected a positive integer")
+                self.max_size = int(max_size)
+            if max_age is not None:
+                if float(max_age) < 0:
+                    raise ValueError(f"Invalid batch maximum age {max_age}, expected a positive number")
+                self.max_age = float(max_age)
+
+    def add(self, record):
+        """ Adds a serialized record and returns the batch payload when it has to be sent, otherwise None. """
+        with self._lock:
+            payload = None
+            # Two bytes for the brackets and one for each separator
+            if self.records and self.size + len(record) + len(self.records) + 2 > self.MAX_MESSAGE_BYTES:
+                payload = self._flush()
+            if not self.records:
+                self.started = time.monotonic()
+            self.records.append(record)
+            self.size += len(record)
+            if payload is None and (len(self.records) >= self.max_size or (self.max_age and time.monotonic() - self.started >= self.max_age)):
+                payload = self._flush()
+            return payload
+
+    def flush_expired(self):
+        """ Returns the payload of the pending batch if its oldest record is max_age seconds old, otherwise None. Called on every upload tick, so the age limit holds when no record is added. """
+        with self._lock:
+            if self.records and self.max_age and time.monotonic() - self.started >= self.max_age:
+                return self._flush()
+            return None
+
+    def flush(self):
+        """ Returns the payload of the pending batch, or None if there is none. """
+        with self._lock:
+            return self._flush()
+
+    def _flush(self):
+        if not self.records:
+            return None
+        payload = "[" + ",".join(self.records) + "]"
+        self.records = []
+        self.size = 0
+        self.started = None
+        return payload
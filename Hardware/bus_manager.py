@@ -0,0 +1,192 @@
+import heapq
+import inspect
+import itertools
+import threading
+import time
+from contextlib import contextmanager
+from adc_scan import AdcScanner
+
+# Bus of the Grove Base Hat ADC (moisture, water level and noise sensors)
+ADC_BUS = 'i2c-1'
+# The reTerminal core (buzzer and light sensor) is driven through its own drivers, its accesses are serialized as one bus
+RETERMINAL_BUS = 'reterminal'
+
+
+class BusArbiter:
+    """ Gives a bus to one transaction at a time. Transactions waiting for the bus are granted it by priority (lowest first), then in arrival order. A thread running a transaction can run nested transactions on the same bus. """
+    def __init__(self, name):
+        self.name = name
+        self.busy = False
+        self.owner = None
+        self.depth = 0
+        self.waiting = []
+        self._sequence = itertools.count()
+        self._lock = threading.Lock()
+        self.created_at = time.perf_counter()
+        self.transactions = 0
+        self.contended = 0
+        self.busy_time = 0.0
+        self.wait_time = 0.0
+        self.max_wait = 0.0
+        self.max_queued = 0
+
+    def acquire(self, priority):
+        """ Waits for the bus and returns the time waited. """
+        thread = threading.get_ident()
+        with self._lock:
+            if self.owner == thread:
+                self.depth += 1
+                return 0.0
+            if not self.busy:
+                self.busy = True
+                self.owner = thread
+                self.depth = 1
+                return 0.0
+            granted = threading.Event()
+            heapq.heappush(self.waiting, (priority, next(self._sequence), granted))
+            self.max_queued = max(self.max_queued, len(self.waiting))
+        start = time.perf_counter()
+        granted.wait()
+        # The releasing thread handed the bus over, it is still busy
+        with self._lock:
+            self.owner = thread
+            self.depth = 1
+        return time.perf_counter() - start
+
+    def release(self):
+        with self._lock:
+            self.depth -= 1
+            if self.depth:
+                return
+            self.owner = None
+            if self.waiting:
+                _, _, granted = heapq.heappop(self.waiting)
+                granted.set()
+            else:
+                self.busy = False
+
+    def run(self, priority, function, *args, **kwargs):
+        """ Runs function(*args, **kwargs) as one transaction on the bus. """
+        nested = self.owner == threading.get_ident()
+        wait = self.acquire(priority)
+        start = time.perf_counter()
+        try:
+            return function(*args, **kwargs)
+        finally:
+            busy = time.perf_counter() - start
+            if not nested:
+                with self._lock:
+                    self.transactions += 1
+                    self.busy_time += busy
+                    if wait:
+                        self.contended += 1
+                        self.wait_time += wait
+                        self.max_wait = max(self.max_wait, wait)
+            self.release()
+
+    def stats(self):
+        """ Returns the transactions, the share of time the bus was busy since it was created (utilization), the transactions that had to wait, their mean and max wait (s) and the most transactions ever waiting at once. """
+        with self._lock:
+            elapsed = time.perf_counter() - self.created_at
+            return {"transactions": self.transactions, "busyTime": self.busy_time, "utilization": self.busy_time / elapsed if elapsed else 0.0,
+                    "contended": self.contended, "waitTime": self.wait_time, "meanWait": self.wait_time / self.contended if self.contended else 0.0,
+                    "maxWait": self.max_wait, "maxQueued": self.max_queued}
+
+
+class SharedDevice:
+    """ Handle of a device owned by the BusManager. Every method call, attribute read and attribute write is one transaction on the bus of the device, at the priority of the calling thread. """
+    def __init__(self, manager, bus, device):
+        object.__setattr__(self, '_manager', manager)
+        object.__setattr__(self, '_bus', bus)
+        object.__setattr__(self, '_device', device)
+
+    def __getattr__(self, name):
+        if callable(inspect.getattr_static(self._device, name, None)):
+            method = getattr(self._device, name)
+            return lambda *args, **kwargs: self._manager.transaction(self._bus, method, *args, **kwargs)
+        return self._manager.transaction(self._bus, getattr, self._device, name)
+
+    def __setattr__(self, name, value):
+        self._manager.transaction(self._bus, setattr, self._device, name, value)
+
+
+class BusManager:
+    """ Hardware backend owning the devices shared by the subsystems. The ADC, the AHT20 sensors and the reTerminal core are opened once and handed out as SharedDevice handles, so every subsystem uses the same device and its transactions are serialized with those of the other subsystems, by priority. Other devices are opened by the wrapped backend.
+
+    The priority of the transactions of a thread is set with the priority context manager, the actuator commands run at HIGH priority so a state change is not stuck behind the sampling reads. """
+    HIGH = 0
+    NORMAL = 1
+    LOW = 2
+
+    def __init__(self, backend):
+        self.backend = backend
+        self.buses = {}
+        self.devices = {}
+        # Lock of every shared device being opened, by key
+        self._opening = {}
+        self._local = threading.local()
+        self._lock = threading.Lock()
+
+    def __getattr__(self, name):
+        # Devices that are not shared are opened by the wrapped backend
+        return getattr(self.backend, name)
+
+    def arbiter(self, bus):
+        with self._lock:
+            arbiter = self.buses.get(bus)
+            if arbiter is None:
+                arbiter = self.buses[bus] = BusArbiter(bus)
+            return arbiter
+
+    @contextmanager
+    def priority(self, priority):
+        """ Runs the transactions of the calling thread at the given priority within the block. """
+        previous = getattr(self._local, 'priority', self.NORMAL)
+        self._local.priority = priority
+        try:
+            yield
+        finally:
+            self._local.priority = previous
+
+    def transaction(self, bus, function, *args, **kwargs):
+        """ Runs function(*args, **kwargs) as one transaction on the bus, at the priority of the calling thread. """
+        return self.arbiter(bus).run(getattr(self._local, 'priority', self.NORMAL), function, *args, **kwargs)
+
+    def shared_device(self, key, bus, open_device):
+        """ Returns the handle of the device identified by key, opened on first use. A device is opened under a lock of its own, so subsystems initialized in parallel open different devices at the same time, and a device asked for twice is opened once. """
+        with self._lock:
+            device = self.devices.get(key)
+            if device is not None:
+                return device
+            opening = self._opening.setdefault(key, threading.Lock())
+        with opening:
+            with self._lock:
+                device = self.devices.get(key)
+            if device is None:
+                device = SharedDevice(self, bus, open_device())
+                with self._lock:
+                    self.devices[key] = device
+            return device
+
+    def temperature_humidity_sensor(self, address, bus):
+        return self.shared_device(('aht20', address, bus), f"i2c-{bus}", lambda: self.backend.temperature_humidity_sensor(address, bus))
+
+    def adc(self):
+        return self.shared_device('adc', ADC_BUS, self.backend.adc)
+
+    def reterminal(self):
+        return self.shared_device('reterminal', RETERMINAL_BUS, self.backend.reterminal)
+
+    def adc_scanner(self, channels, oversampling=1, filter='mean'):
+        """ Returns the scanner of the shared ADC, reading the channels in one transaction per scan. """
+        return AdcScanner(self.adc(), channels, oversampling, filter, transaction=lambda function: self.transaction(ADC_BUS, function))
+
+    def acceleration_device(self):
+        # The accelerometer is read by its own thread from an event device, not a bus transaction
+        return self.backend.acceleration_device()
+
+    def stats(self):
+        """ Returns the statistics of every bus, by bus name. """
+        with self._lock:
+            buses = dict(self.buses)
+        return {name: arbiter.stats() for name, arbiter in sorted(buses.items())}
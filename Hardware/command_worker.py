@@ -0,0 +1,64 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+
+class ActuatorCommandWorker:
+    """ Runs actuator commands on a dedicated worker thread instead of the twin callback thread. Commands received while the worker is busy are coalesced so only the latest desired state of each actuator is applied. Independent actuators run concurrently, and the reported properties of every command of a round are acknowledged with one patch, together with the other properties of the desired patches the commands came with. """
+    def __init__(self, actuators, report):
+        # actuators maps a twin property to the callable applying its value, report sends a reported properties patch
+        self.actuators = actuators
+        self.report = report
+        self.pending = {}
+        # Reported properties of the other keys of the desired patches with pending commands, sent with their acknowledgement
+        self.pending_reported = {}
+        self.superseded = 0
+        self.stopping = False
+        self._condition = threading.Condition()
+        self.executor = ThreadPoolExecutor(max_workers=max(len(actuators), 1), thread_name_prefix='actuator')
+        self.thread = threading.Thread(target=self.__run, daemon=True)
+        self.thread.start()
+
+    def submit(self, commands, reported=None):
+        """ Queues the desired state of actuators ({property: value}), replacing any pending state of the same actuator. reported holds the reported properties of the rest of the desired patch, acknowledged in the same patch as the commands. """
+        with self._condition:
+            for key, value in commands.items():
+                if key not in self.actuators:
+                    raise KeyError(f"Unknown actuator {key}")
+                if key in self.pending:
+                    self.superseded += 1
+                self.pending[key] = value
+            self.pending_reported.update(reported or {})
+            self._condition.notify()
+
+    def __run(self):
+        while True:
+            with self._condition:
+                while not self.pending and not self.stopping:
+                    self._condition.wait()
+                if not self.pending:
+                    return
+                commands, self.pending = self.pending, {}
+                acknowledged, self.pending_reported = self.pending_reported, {}
+
+            futures = {key: self.executor.submit(self.actuators[key], value) for key, value in commands.items()}
+            reported = dict(acknowledged)
+            for key, future in futures.items():
+                try:
+                    future.result()
+                    reported[key] = commands[key]
+                except Exception as e:
+                    print(f"An error occurred while setting {key}: {e}")
+            if reported:
+                try:
+                    self.report(reported)
+                    print(reported)
+                except Exception:
+                    print("An error occurred while reporting the actuator states.")
+
+    def stop(self):
+        """ Applies the pending commands, then stops the worker. """
+        with self._condition:
+            self.stopping = True
+            self._condition.notify()
+        self.thread.join()
+        self.executor.shutdown()
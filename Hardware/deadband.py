@@ -0,0 +1,93 @@
+import time
+
+
+class DeadbandFilter:
+    """ Report-by-exception stage run before serialization. A field is only sent when it moved more than its deadband since the value last sent (any change for fields without a deadband, such as the boolean states). A full keyframe with every field is sent every keyframe_interval seconds so the cloud can rebuild the complete state. """
+    # Deadband of the numeric fields, in the unit of the field
+    DEFAULT_DEADBANDS = {
+        'Temperature': 0.2,
+        'Humidity': 1.0,
+        'WaterLevel': 10,
+        'Moisture': 10,
+        'Longitude': 0.0001,
+        'Latitude': 0.0001,
+        'Pitch': 1.0,
+        'Roll': 1.0,
+        # g, like the accelerometer readings the backends produce (see ReTerminalBackend.ACCELERATION_SCALE), compared with the axes and the window Peak and RMS
+        'Vibration': 0.05,
+        'Luminosity': 10,
+        'Noise': 10,
+    }
+    DEFAULT_KEYFRAME_INTERVAL = 300
+
+    def __init__(self, fields, deadbands=None, keyframe_interval=DEFAULT_KEYFRAME_INTERVAL):
+        self.fields = tuple(fields)
+        self.deadbands = {**self.DEFAULT_DEADBANDS, **(deadbands or {})}
+        self.keyframe_interval = keyframe_interval
+        self.last_sent = {}
+        self.last_keyframe = None
+
+    def set_deadbands(self, deadbands):
+        """ Changes the deadband of the given fields. A deadband of None restores the default of the field. """
+        updated = dict(self.deadbands)
+        for field, deadband in deadbands.items():
+            if deadband is None:
+                updated.pop(field, None)
+                if field in self.DEFAULT_DEADBANDS:
+                    updated[field] = self.DEFAULT_DEADBANDS[field]
+            else:
+                updated[field] = float(deadband)
+        self.deadbands = updated
+
+    def reset(self):
+        """ Forces the next sample to be sent as a keyframe, and forgets the values last sent. """
+        self.last_keyframe = None
+        self.last_sent = {}
+
+    def changed(self, field, value):
+        """ Returns True if the value moved out of the deadband of the field since it was last sent. """
+        if field not in self.last_sent:
+            return True
+        previous = self.last_sent[field]
+        if value is None or previous is None:
+            return value is not previous
+        if type(value) is not type(previous) and not (type(value) in (int, float) and type(previous) in (int, float)):
+            # The value changed type, for example a point reading replaced by an Aggregate when aggregation is turned on
+            return True
+        deadband = self.deadbands.get(field, 0)
+        if hasattr(value, 'FIELDS'):
+            # Records such as Vibration change when any of their values moves out of the deadband, or is set or cleared (an empty Aggregate)
+            values, previous_values = self.record_values(value), self.record_values(previous)
+            return len(values) != len(previous_values) or any(self.moved(a, b, deadband) for a, b in zip(values, previous_values))
+        if deadband and type(value) is not bool:
+            return abs(value - previous) > deadband
+        return value != previous
+
+    @staticmethod
+    def moved(value, previous, deadband):
+        if value is None or previous is None:
+            return value is not previous
+        return abs(value - previous) > deadband
+
+    @staticmethod
+    def record_values(record):
+        """ Returns the numeric values of a record: its fields (or only its DEADBAND_FIELDS), and the per-axis values of its DEADBAND_ANALYSIS_FIELDS that are set. """
+        values = [getattr(record, name) for name in getattr(record, 'DEADBAND_FIELDS', record.FIELDS)]
+        for name in getattr(record, 'DEADBAND_ANALYSIS_FIELDS', ()):
+            value = getattr(record, name)
+            if isinstance(value, dict):
+                values.extend(value.values())
+        return values
+
+    def filter(self, values):
+        """ Returns a (fields, keyframe) tuple with the fields of the sample to send and whether it is a keyframe. fields is empty when nothing changed. """
+        now = time.monotonic()
+        keyframe = self.last_keyframe is None or now - self.last_keyframe >= self.keyframe_interval
+        if keyframe:
+            self.last_keyframe = now
+            fields = self.fields
+        else:
+            fields = tuple(field for field in self.fields if self.changed(field, values[field]))
+        for field in fields:
+            self.last_sent[field] = values[field]
+        return fields, keyframe
@@ -0,0 +1,84 @@
+import itertools
+import time
+from datetime import datetime, timezone
+
+
+class EventRing:
+    """ Fixed-size ring of timestamped events, written by the callbacks of the input devices (PIR sensor, door sensor) the moment a transition happens, so transitions between two samples are not lost.
+
+    The ring takes no lock: a producer claims the next sequence number (itertools.count is atomic) and stores its event as one (sequence, timestamp, kind) tuple in the slot of that number, so producers never wait for each other or for a reader. Each reader keeps its own EventCursor, and tells from the sequence number stored in a slot whether the event is not written yet or was overwritten after the ring wrapped around. """
+    DEFAULT_SIZE = 256
+
+    def __init__(self, size=DEFAULT_SIZE, clock=time.time):
+        self.size = size
+        self.clock = clock
+        self.slots = [None] * size
+        # Sequence number of the next event, best effort when producers race (see EventCursor)
+        self.written = 0
+        self._sequence = itertools.count()
+        # Called after every event, for example to wake up an uploader
+        self.listeners = []
+
+    def record(self, kind, timestamp=None):
+        """ Records an event of the given kind, at the given time (s since the epoch) or now. """
+        sequence = next(self._sequence)
+        self.slots[sequence % self.size] = (sequence, self.clock() if timestamp is None else timestamp, kind)
+        if sequence >= self.written:
+            self.written = sequence + 1
+        for listener in self.listeners:
+            listener()
+
+    def cursor(self):
+        """ Returns a cursor reading the events recorded from now on. """
+        return EventCursor(self)
+
+
+class EventCursor:
+    """ Read position of one reader of an EventRing. """
+    def __init__(self, ring):
+        self.ring = ring
+        self.position = ring.written
+        self.lost = 0
+
+    def read(self):
+        """ Returns the events recorded since the previous read as (sequence, timestamp, kind) tuples, in order, and the number of events overwritten before they could be read. Reading stops at the first event not written yet, which is read next time. """
+        ring = self.ring
+        slots, size = ring.slots, ring.size
+        events = []
+        lost = 0
+        while True:
+            slot = slots[self.position % size]
+            if slot is None or slot[0] < self.position:
+                break
+            if slot[0] > self.position:
+                # The producers wrapped around the ring, skip to the oldest event still in it
+                oldest = slot[0] - size + 1
+                lost += oldest - self.position
+                self.position = oldest
+                continue
+            events.append(slot)
+            self.position += 1
+        self.lost += lost
+        return events, lost
+
+
+def summarize_events(events, lost=0):
+    """ Returns the summary of events sent with the telemetry: the count and the first and last timestamps (ISO 8601, UTC) of every kind of event, plus the number of events Lost when the ring overflowed. Returns None when there is nothing to report. """
+    if not events and not lost:
+        return None
+    summary = {}
+    for _, timestamp, kind in events:
+        entry = summary.get(kind)
+        if entry is None:
+            summary[kind] = [1, timestamp, timestamp]
+        else:
+            entry[0] += 1
+            entry[2] = timestamp
+    summary = {kind: {'Count': count, 'First': iso_timestamp(first), 'Last': iso_timestamp(last)} for kind, (count, first, last) in summary.items()}
+    if lost:
+        summary['Lost'] = lost
+    return summary
+
+
+def iso_timestamp(timestamp):
+    return datetime.fromtimestamp(timestamp, timezone.utc).isoformat()
@@ -0,0 +1,139 @@
+import argparse
+import asyncio
+import time
+from concurrent.futures import ThreadPoolExecutor
+from azure.iot.device import Message
+from async_station import AsyncStation
+from station import get_env_values
+from transport import Transport, create_transport
+
+class StationChannel(Transport):
+    """ Client of one station hosted by a Gateway. It has the interface of the IoT Hub client used by the station, and multiplexes the station traffic over the upstream connection of the gateway: messages carry the station id as a custom property, and the station twin is the stations.<id> section of the gateway twin. """
+    def __init__(self, gateway, station_id):
+        self.gateway = gateway
+        self.station_id = station_id
+        self.on_twin_desired_properties_patch_received = None
+        self.messages = 0
+        self.bytes = 0
+
+    @property
+    def connected(self):
+        return getattr(self.gateway.upstream, 'connected', True)
+
+    async def connect(self):
+        await self.gateway.connect()
+
+    async def shutdown(self):
+        # The upstream connection is shut down by the gateway once every station stopped
+        pass
+
+    async def send_message(self, payload):
+        message = Message(payload, content_encoding='utf-8', content_type='application/json')
+        message.custom_properties['stationId'] = self.station_id
+        await self.gateway.upstream.send_message(message)
+        self.messages += 1
+        self.bytes += len(payload)
+
+    async def patch_twin_reported_properties(self, reported_properties_patch):
+        await self.gateway.upstream.patch_twin_reported_properties({'stations': {self.station_id: reported_properties_patch}})
+
+    def stats(self, elapsed):
+        return {"messages": self.messages, "bytes": self.bytes, "messagesPerSecond": self.messages / elapsed if elapsed else 0.0}
+
+
+class Gateway:
+    """ Site gateway hosting many container farm stations in one process. The stations share one worker pool for their hardware reads and one upstream IoT Hub connection, and their jobs are staggered over the telemetry interval so the reads and uploads of the farms do not all fall on the same instant. """
+    DEFAULT_MAX_WORKERS = 8
+
+    def __init__(self, upstream, max_workers=DEFAULT_MAX_WORKERS, stagger=True):
+        # upstream is an asyncio transport (IoT Hub or loopback client) connected as the gateway device
+        self.upstream = upstream
+        self.staggered = stagger
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='gateway')
+        self.stations = {}
+        self.channels = {}
+        self.started_at = None
+        self.stopped_at = None
+        self._connect_lock = None
+        self.upstream.on_twin_desired_properties_patch_received = self.__route_twin_patch
+
+    def add_station(self, station_id, **station_kwargs):
+        """ Creates a station served by the gateway. station_kwargs are passed to AsyncStation (backend, sampling_intervals...). """
+        if station_id in self.stations:
+            raise ValueError(f"Station {station_id} already exists")
+        channel = StationChannel(self, station_id)
+        station = AsyncStation(None, client=channel, executor=self.executor, **station_kwargs)
+        self.channels[station_id] = channel
+        self.stations[station_id] = station
+        return station
+
+    async def connect(self):
+        """ Connects the upstream client once, whatever the number of stations connecting. """
+        async with self._connect_lock:
+            if not getattr(self.upstream, 'connected', False):
+                await self.upstream.connect()
+
+    def __route_twin_patch(self, twin_patch):
+        """ Delivers the stations.<id> section of a gateway desired properties patch to the twin handler of each station. """
+        for station_id, station_patch in (twin_patch.get('stations') or {}).items():
+            channel = self.channels.get(station_id)
+            if channel is not None and channel.on_twin_desired_properties_patch_received is not None:
+                channel.on_twin_desired_properties_patch_received(station_patch)
+
+    def stagger(self):
+        """ Spreads the first deadline of the stations evenly over their telemetry interval. """
+        count = len(self.stations)
+        for i, station in enumerate(self.stations.values()):
+            station.start_delay = station.interval * i / count
+
+    async def run(self, ticks=None):
+        """ Runs every station until cancelled, or until each sent the given number of ticks. """
+        self._connect_lock = asyncio.Lock()
+        if self.staggered:
+            self.stagger()
+        self.started_at = time.perf_counter()
+        try:
+            await asyncio.gather(*(station.run(ticks) for station in self.stations.values()))
+        finally:
+            self.stopped_at = time.perf_counter()
+
+    async def shutdown(self):
+        await asyncio.gather(*(station.shutdown() for station in self.stations.values()), return_exceptions=True)
+        self.executor.shutdown(wait=False)
+        await self.upstream.shutdown()
+
+    def stats(self):
+        """ Returns the throughput of every station keyed by station id, and of the whole gateway under 'total'. """
+        if self.started_at is None:
+            return {}
+        elapsed = (self.stopped_at or time.perf_counter()) - self.started_at
+        stats = {station_id: channel.stats(elapsed) for station_id, channel in self.channels.items()}
+        messages = sum(channel.messages for channel in self.channels.values())
+        stats['total'] = {"messages": messages, "bytes": sum(channel.bytes for channel in self.channels.values()), "messagesPerSecond": messages / elapsed if elapsed else 0.0}
+        return stats
+
+
+async def run_gateway(stations):
+    # Simulated farms until remote sensor node backends exist
+    from Simulation.simulated_backend import SimulatedBackend
+    gateway = Gateway(create_transport(get_env_values(), asynchronous=True))
+    for i in range(stations):
+        gateway.add_station(f"farm-{i + 1}", backend=SimulatedBackend(), queue_path=f"telemetry_queue_farm-{i + 1}.db")
+    try:
+        await gateway.run()
+    finally:
+        print("Shutting down the gateway")
+        await gateway.shutdown()
+        print(gateway.stats())
+
+def main():
+    parser = argparse.ArgumentParser(description="Runs a gateway hosting several container farm stations over one IoT Hub connection.")
+    parser.add_argument("--stations", type=int, default=10, help="Number of (simulated) farms")
+    args = parser.parse_args()
+    try:
+        asyncio.run(run_gateway(args.stations))
+    except KeyboardInterrupt:
+        print("Gateway interuptted by user")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,71 @@
+class ReTerminalBackend:
+    """ Hardware backend that opens the real devices connected to the reTerminal and the Grove Base Hat. The driver libraries are only imported when a device is requested, so a subsystem can be given a simulated backend instead (see Simulation/simulated_backend.py). """
+    # g per unit of the accelerometer events, the lis3lv02d driver of the reTerminal accelerometer reports milli-g
+    ACCELERATION_SCALE = 0.001
+
+    def temperature_humidity_sensor(self, address, bus):
+        """ Returns the AHT20 temperature and humidity sensor found at the given I2C address and bus. """
+        from grove.grove_temperature_humidity_aht20 import GroveTemperatureHumidityAHT20
+        return GroveTemperatureHumidityAHT20(address, bus)
+
+    def adc(self):
+        """ Returns the ADC device reader of the Grove Base Hat. """
+        from grove.adc import ADC
+        return ADC()
+
+    def output_device(self, pin):
+        """ Returns a digital output (fan relay) on the given pin. """
+        from gpiozero import LED
+        return LED(pin)
+
+    def led_chain(self, num_led):
+        """ Returns the chainable RGB LED driver for the given number of LEDs. """
+        from PlantSubsystem import chainable_rgb_direct
+        return chainable_rgb_direct.rgb_led(num_led)
+
+    def button(self, pin):
+        """ Returns a digital input (magnetic door sensor) on the given pin. """
+        from gpiozero import Button
+        return Button(pin)
+
+    def motion_sensor(self, pin):
+        """ Returns the mini PIR motion sensor on the given pin. """
+        from grove.grove_mini_pir_motion_sensor import GroveMiniPIRMotionSensor
+        return GroveMiniPIRMotionSensor(pin)
+
+    def servo(self, pin, initial_angle, min_angle, max_angle):
+        """ Returns the angular servo (door lock) on the given PWM pin. """
+        from gpiozero import AngularServo
+        from gpiozero.pins.pigpio import PiGPIOFactory
+        return AngularServo(pin, initial_angle, min_angle, max_angle, pin_factory=PiGPIOFactory())
+
+    def reterminal(self):
+        """ Returns the reTerminal core module (buzzer, illuminance and accelerometer access). """
+        import seeed_python_reterminal.core as rt
+        return rt
+
+    def serial_port(self, port, baudrate, timeout):
+        """ Returns the serial port used by the GPS module. """
+        import serial
+        return serial.Serial(port, baudrate, timeout=timeout)
+
+    def acceleration_device(self):
+        """ Returns the evdev device of the reTerminal built-in accelerometer. """
+        return self.reterminal().get_acceleration_device()
+
+    def acceleration_batches(self, device):
+        """ Yields the accelerometer events pending on the device in batches of (axis, value, timestamp) tuples, where axis is 'X', 'Y', 'Z' or None for the sync event ending a reading, value the acceleration in g, and timestamp the time of the event in seconds.
+        Each wake-up drains every pending event at once, and events are decoded from their type and code without creating an AccelerationEvent for each. """
+        import select
+        from evdev import ecodes
+        axes = {ecodes.ABS_X: 'X', ecodes.ABS_Y: 'Y', ecodes.ABS_Z: 'Z'}
+        scale = self.ACCELERATION_SCALE
+        while True:
+            select.select([device.fd], [], [])
+            batch = []
+            for event in device.read():
+                if event.type == ecodes.EV_ABS and event.code in axes:
+                    batch.append((axes[event.code], event.value * scale, event.sec + event.usec * 1e-6))
+                elif event.type == ecodes.EV_SYN:
+                    batch.append((None, None, event.sec + event.usec * 1e-6))
+            yield batch
@@ -0,0 +1,302 @@
+import argparse
+import os
+import shutil
+import struct
+import threading
+import time
+from array import array
+from datetime import datetime
+from math import sqrt
+from TelemetryHelper import Aggregate, Telemetry, Vibration
+
+# Bytes of a value of a column (float64)
+VALUE_SIZE = 8
+
+
+def column_value(value):
+    """ Returns the float stored for a telemetry value: booleans are 0/1, an aggregate is its mean, a vibration is the magnitude of its X, Y, Z change, and missing or non-numeric values are NaN. """
+    if isinstance(value, Aggregate):
+        value = value.Mean
+    elif isinstance(value, Vibration):
+        if value.X is None or value.Y is None or value.Z is None:
+            return float('nan')
+        return sqrt(value.X * value.X + value.Y * value.Y + value.Z * value.Z)
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return float('nan')
+
+
+class HistorySegment:
+    """ Columns of the samples of one time partition: a directory named after the partition start (epoch seconds) holding one file of float64 values per column. Columns are appended to, and read through memory maps of the rows asked for only. The Timestamp column is written last, so the rows of a segment are the values of its Timestamp file. """
+    def __init__(self, path, start, columns):
+        self.path = path
+        self.start = start
+        self.columns = columns
+        self.files = None
+
+    def column_path(self, column):
+        return os.path.join(self.path, column + '.f64')
+
+    @property
+    def rows(self):
+        try:
+            return os.path.getsize(self.column_path('Timestamp')) // VALUE_SIZE
+        except OSError:
+            return 0
+
+    @property
+    def bytes(self):
+        return sum(entry.stat().st_size for entry in os.scandir(self.path) if entry.is_file())
+
+    def open(self):
+        """ Opens the columns for appending. Values written after the last complete row (an interrupted append) are cut off first. """
+        os.makedirs(self.path, exist_ok=True)
+        rows = self.rows
+        self.files = {}
+        for column in self.columns:
+            path = self.column_path(column)
+            with open(path, 'ab') as file:
+                file.truncate(rows * VALUE_SIZE)
+            self.files[column] = open(path, 'ab')
+
+    def append(self, values):
+        """ Appends one row, values maps every column to a float. """
+        for column, file in self.files.items():
+            if column != 'Timestamp':
+                file.write(array('d', (values[column],)).tobytes())
+                file.flush()
+        timestamp = self.files['Timestamp']
+        timestamp.write(array('d', (values['Timestamp'],)).tobytes())
+        timestamp.flush()
+
+    def close(self):
+        if self.files is not None:
+            for file in self.files.values():
+                file.close()
+            self.files = None
+
+    def column(self, column, rows):
+        """ Returns the first rows of a column as a read-only memory map, or None if the segment has no such column. """
+        # numpy is only imported by the queries, recording the samples does not need it
+        import numpy as np
+        path = self.column_path(column)
+        if not rows or not os.path.exists(path) or os.path.getsize(path) < rows * VALUE_SIZE:
+            return None
+        return np.memmap(path, dtype='<f8', mode='r', shape=(rows,))
+
+    def last_timestamp(self):
+        """ Returns the timestamp of the last complete row, or None if the segment is empty. Read with plain file IO, so starting a store on an existing history does not import numpy. """
+        rows = self.rows
+        if not rows:
+            return None
+        with open(self.column_path('Timestamp'), 'rb') as file:
+            file.seek((rows - 1) * VALUE_SIZE)
+            return struct.unpack('<d', file.read(VALUE_SIZE))[0]
+
+    def range(self, start, end):
+        """ Returns (rows, first, last) where rows[first:last] are the rows with a timestamp in [start, end). """
+        import numpy as np
+        rows = self.rows
+        timestamps = self.column('Timestamp', rows)
+        if timestamps is None:
+            return rows, 0, 0
+        first = 0 if start is None else int(np.searchsorted(timestamps, start, 'left'))
+        last = rows if end is None else int(np.searchsorted(timestamps, end, 'left'))
+        return rows, first, last
+
+
+class HistoryStore:
+    """ On-device history of the telemetry samples, one append-only column per Telemetry field, partitioned into segments of segment_duration seconds. The oldest segments are deleted once the history is over max_bytes or older than max_age seconds (None disables a limit). Queries read the rows of the time range asked for only, through memory maps, so the history does not have to fit in memory. """
+    COLUMNS = ('Timestamp',) + Telemetry.FIELDS
+    DEFAULT_SEGMENT_DURATION = 3600
+    DEFAULT_MAX_BYTES = 64 * 1024 * 1024
+    DEFAULT_MAX_AGE = 30 * 24 * 3600
+
+    def __init__(self, path, segment_duration=DEFAULT_SEGMENT_DURATION, max_bytes=DEFAULT_MAX_BYTES, max_age=DEFAULT_MAX_AGE):
+        self.path = path
+        self.segment_duration = segment_duration
+        self.max_bytes = max_bytes
+        self.max_age = max_age
+        self.current = None
+        self.last_timestamp = None
+        self.appended = 0
+        self._lock = threading.Lock()
+        os.makedirs(path, exist_ok=True)
+        # Carry on after the newest sample already stored
+        for segment in reversed(self.segments()):
+            self.last_timestamp = segment.last_timestamp()
+            if self.last_timestamp is not None:
+                break
+
+    def segments(self):
+        """ Returns the segments oldest first. """
+        starts = sorted(int(entry.name) for entry in os.scandir(self.path) if entry.is_dir() and entry.name.isdigit())
+        return [HistorySegment(os.path.join(self.path, str(start)), start, self.COLUMNS) for start in starts]
+
+    def append(self, values, timestamp=None, exclude=()):
+        """ Appends a sample (telemetry values by field) taken at timestamp (epoch seconds, defaults to now). The excluded fields (stale values) are stored as NaN. Timestamps never go back, a sample older than the previous one is stored at the time of the previous one. """
+        if timestamp is None:
+            timestamp = time.time()
+        row = {field: column_value(values.get(field)) if field not in exclude else float('nan') for field in Telemetry.FIELDS}
+        with self._lock:
+            if self.last_timestamp is not None and timestamp < self.last_timestamp:
+                timestamp = self.last_timestamp
+            row['Timestamp'] = timestamp
+            start = int(timestamp // self.segment_duration * self.segment_duration)
+            if self.current is None or self.current.start != start:
+                self.__roll(start)
+            self.current.append(row)
+            self.last_timestamp = timestamp
+            self.appended += 1
+
+    def __roll(self, start):
+        if self.current is not None:
+            self.current.close()
+        self.current = HistorySegment(os.path.join(self.path, str(start)), start, self.COLUMNS)
+        self.current.open()
+        self.__apply_retention()
+
+    def __apply_retention(self):
+        segments = [segment for segment in self.segments() if segment.start != self.current.start]
+        if self.max_age is not None:
+            oldest = time.time() - self.max_age
+            while segments and segments[0].start + self.segment_duration < oldest:
+                shutil.rmtree(segments.pop(0).path, ignore_errors=True)
+        if self.max_bytes is not None:
+            total = self.current.bytes + sum(segment.bytes for segment in segments)
+            while segments and total > self.max_bytes:
+                segment = segments.pop(0)
+                total -= segment.bytes
+                shutil.rmtree(segment.path, ignore_errors=True)
+
+    def close(self):
+        with self._lock:
+            if self.current is not None:
+                self.current.close()
+                self.current = None
+
+    def __slices(self, fields, start, end):
+        """ Yields ({column: memory map slice}) of every segment overlapping [start, end). """
+        import numpy as np
+        unknown = [field for field in fields if field not in Telemetry.FIELDS]
+        if unknown:
+            raise ValueError(f"Unknown history fields {unknown}, expected some of {Telemetry.FIELDS}")
+        for segment in self.segments():
+            if end is not None and segment.start >= end:
+                break
+            if start is not None and segment.start + self.segment_duration <= start:
+                continue
+            rows, first, last = segment.range(start, end)
+            if first >= last:
+                continue
+            columns = {}
+            for column in ('Timestamp',) + tuple(fields):
+                values = segment.column(column, rows)
+                columns[column] = values[first:last] if values is not None else np.full(last - first, np.nan)
+            yield columns
+
+    def query(self, fields=None, start=None, end=None):
+        """ Returns the samples with a timestamp in [start, end) (epoch seconds, None leaves a side open) as {column: numpy array}, with the Timestamp column and the given fields (defaults to every field). """
+        import numpy as np
+        fields = tuple(fields or Telemetry.FIELDS)
+        parts = list(self.__slices(fields, start, end))
+        return {column: np.concatenate([part[column] for part in parts]) if parts else np.empty(0) for column in ('Timestamp',) + fields}
+
+    def downsample(self, fields, bucket, start=None, end=None):
+        """ Returns the samples in [start, end) reduced to one row per bucket of bucket seconds, as {column: numpy array}: Timestamp is the start of every bucket holding samples, and each field gives <field>.mean, <field>.min, <field>.max and <field>.count over the values of the bucket that are not NaN. Only the rows of the range are read, one segment at a time. """
+        import numpy as np
+        fields = tuple(fields)
+        buckets, partials = [], []
+        for columns in self.__slices(fields, start, end):
+            ids = np.floor(columns['Timestamp'] / bucket).astype(np.int64)
+            edges = np.concatenate(([0], np.flatnonzero(np.diff(ids)) + 1))
+            buckets.append(ids[edges])
+            partial = {}
+            for field in fields:
+                values = np.asarray(columns[field])
+                valid = ~np.isnan(values)
+                partial[field] = (np.add.reduceat(np.where(valid, values, 0.0), edges), np.add.reduceat(valid.astype(np.int64), edges),
+                                  np.fmin.reduceat(values, edges), np.fmax.reduceat(values, edges))
+            partials.append(partial)
+        result = {'Timestamp': np.empty(0)}
+        for field in fields:
+            for statistic in ('mean', 'min', 'max', 'count'):
+                result[f"{field}.{statistic}"] = np.empty(0)
+        if not buckets:
+            return result
+
+        # A bucket can span two segments, its partial results are merged
+        ids = np.concatenate(buckets)
+        edges = np.concatenate(([0], np.flatnonzero(np.diff(ids)) + 1))
+        result['Timestamp'] = ids[edges].astype(np.float64) * bucket
+        for field in fields:
+            sums, counts, minimums, maximums = (np.concatenate([partial[field][i] for partial in partials]) for i in range(4))
+            sums, counts = np.add.reduceat(sums, edges), np.add.reduceat(counts, edges)
+            with np.errstate(invalid='ignore', divide='ignore'):
+                result[f"{field}.mean"] = np.where(counts > 0, sums / np.maximum(counts, 1), np.nan)
+            result[f"{field}.min"] = np.fmin.reduceat(minimums, edges)
+            result[f"{field}.max"] = np.fmax.reduceat(maximums, edges)
+            result[f"{field}.count"] = counts
+        return result
+
+    def latest(self, fields=None):
+        """ Returns the newest sample as {column: value}, or None if the history is empty. """
+        fields = tuple(fields or Telemetry.FIELDS)
+        for segment in reversed(self.segments()):
+            rows = segment.rows
+            if rows:
+                latest = {}
+                for column in ('Timestamp',) + fields:
+                    values = segment.column(column, rows)
+                    latest[column] = float(values[-1]) if values is not None else float('nan')
+                return latest
+        return None
+
+    def stats(self):
+        """ Returns the number of segments, rows and bytes of the history, and the time of its oldest and newest sample. """
+        segments = self.segments()
+        rows = [segment.rows for segment in segments]
+        oldest = newest = None
+        for segment, count in zip(segments, rows):
+            if count:
+                timestamps = segment.column('Timestamp', count)
+                oldest = float(timestamps[0]) if oldest is None else oldest
+                newest = float(timestamps[-1])
+        return {"segments": len(segments), "rows": sum(rows), "bytes": sum(segment.bytes for segment in segments), "oldest": oldest, "newest": newest}
+
+
+def _format_time(timestamp):
+    return datetime.fromtimestamp(timestamp).isoformat(sep=' ', timespec='seconds')
+
+def _format_value(value):
+    return '-' if value != value else f"{value:.2f}"
+
+def main():
+    parser = argparse.ArgumentParser(description="Shows the telemetry history kept on the device.")
+    parser.add_argument("--path", default='history', help="Directory of the history")
+    parser.add_argument("--fields", nargs='+', default=['Temperature', 'Humidity', 'Moisture', 'WaterLevel'], help=f"Fields to show, among {', '.join(Telemetry.FIELDS)}")
+    parser.add_argument("--since", type=float, default=3600, help="Seconds of history to show")
+    parser.add_argument("--bucket", type=float, default=None, help="Downsample to the mean, min and max of every bucket of this many seconds")
+    parser.add_argument("--stats", const=True, default=False, nargs='?', help="Show the size of the history")
+    args = parser.parse_args()
+
+    history = HistoryStore(args.path)
+    if args.stats:
+        stats = history.stats()
+        print(f"{stats['rows']} samples in {stats['segments']} segment(s), {stats['bytes']} bytes" + (f", from {_format_time(stats['oldest'])} to {_format_time(stats['newest'])}" if stats['rows'] else ""))
+        return
+    start = time.time() - args.since
+    if args.bucket:
+        series = history.downsample(args.fields, args.bucket, start)
+        print('\t'.join(['Time'] + [f"{field} mean/min/max" for field in args.fields]))
+        for i, timestamp in enumerate(series['Timestamp']):
+            print('\t'.join([_format_time(timestamp)] + ['/'.join(_format_value(series[f"{field}.{statistic}"][i]) for statistic in ('mean', 'min', 'max')) for field in args.fields]))
+    else:
+        series = history.query(args.fields, start)
+        print('\t'.join(['Time'] + args.fields))
+        for i, timestamp in enumerate(series['Timestamp']):
+            print('\t'.join([_format_time(timestamp)] + [_format_value(series[field][i]) for field in args.fields]))
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,98 @@
+import threading
+import time
+from collections import deque
+from metrics import Histogram
+
+# Lanes of the messages sent by the station: alarms (door and motion events, vibration and tilt alarms) and routine telemetry
+ALARM_LANE = 'alarm'
+BULK_LANE = 'bulk'
+LANES = (ALARM_LANE, BULK_LANE)
+
+
+class LaneStatistics:
+    """ Messages sent and failed on a lane, and the latency (s) from the moment their data was taken (the sample or the alarm) to the end of their send. """
+    def __init__(self, latency=None):
+        # latency is the histogram of the latencies, one of the metrics registry when instrumented
+        self.latency = latency if latency is not None else Histogram()
+        self.sent = 0
+        self.failed = 0
+        self.max_latency = 0.0
+        self._lock = threading.Lock()
+
+    def add(self, latency):
+        self.latency.observe(latency)
+        with self._lock:
+            self.sent += 1
+            self.max_latency = max(self.max_latency, latency)
+
+    def failure(self):
+        with self._lock:
+            self.failed += 1
+
+    def quantile(self, q):
+        """ Returns the estimated q quantile (0-1) of the latencies, at most the max latency, or None without messages. """
+        value = self.latency.quantile(q)
+        return min(value, self.max_latency) if value is not None else None
+
+    def as_dict(self):
+        return {"sent": self.sent, "failed": self.failed, "p50": self.quantile(0.5), "p99": self.quantile(0.99), "maxLatency": self.max_latency}
+
+
+class AlarmLane:
+    """ Low-latency lane of the alarm messages. Alarms are sent one after another by the thread of the lane as soon as they are submitted, without batching and ahead of the store-and-forward backlog, and the routine sends wait for the lane to be idle before using the link (see wait_idle), so an alarm never waits behind more than the send already in progress. An alarm that fails to send is handed to on_failure, which keeps it in the store-and-forward queue. """
+    def __init__(self, send, on_failure=None, stats=None):
+        self.send = send
+        self.on_failure = on_failure
+        self.stats = stats if stats is not None else LaneStatistics()
+        # (payload, raised_at) of the alarms waiting for the lane, raised_at in seconds since the epoch
+        self.pending = deque()
+        self.sending = False
+        self.max_pending = 0
+        self.stopping = False
+        self._condition = threading.Condition()
+        self.thread = threading.Thread(target=self.__run, daemon=True)
+        self.thread.start()
+
+    def submit(self, payload, raised_at=None):
+        """ Queues an alarm message for the lane. raised_at is the time the alarm was raised (s since the epoch), now by default. """
+        with self._condition:
+            self.pending.append((payload, time.time() if raised_at is None else raised_at))
+            self.max_pending = max(self.max_pending, len(self.pending))
+            self._condition.notify_all()
+
+    def wait_idle(self, timeout=None):
+        """ Waits until no alarm is pending or being sent. Returns False if the timeout (s) expired first. """
+        with self._condition:
+            return self._condition.wait_for(lambda: not self.pending and not self.sending, timeout)
+
+    def __run(self):
+        while True:
+            with self._condition:
+                while not self.pending and not self.stopping:
+                    self._condition.wait()
+                if not self.pending:
+                    return
+                payload, raised_at = self.pending.popleft()
+                self.sending = True
+            try:
+                self.send(payload)
+                self.stats.add(time.time() - raised_at)
+            except Exception as e:
+                self.stats.failure()
+                print(f"An error occurred while sending an alarm: {e}")
+                if self.on_failure is not None:
+                    try:
+                        self.on_failure(payload)
+                    except Exception:
+                        print("An error occurred while queuing an alarm.")
+            finally:
+                with self._condition:
+                    self.sending = False
+                    self._condition.notify_all()
+
+    def stop(self):
+        """ Sends the pending alarms, then stops the lane. """
+        with self._condition:
+            self.stopping = True
+            self._condition.notify_all()
+        self.thread.join()
@@ -0,0 +1,192 @@
+import threading
+import time
+from bisect import bisect_left
+
+# Upper bounds (s) of the latency histogram buckets, from the serialization (tens of microseconds) to multi-second sends
+DEFAULT_BUCKETS = (0.000025, 0.00005, 0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+
+
+class Histogram:
+    """ Cumulative histogram of observed values with fixed bucket bounds, as exposed by Prometheus. """
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.buckets = tuple(buckets)
+        # Count of each bucket (not cumulative), the last one counts the values above every bound
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+        self._lock = threading.Lock()
+
+    def observe(self, value):
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            self.counts[index] += 1
+            self.sum += value
+            self.count += 1
+
+    def time(self, function):
+        """ Returns a callable running the function and observing its duration. """
+        def timed(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return function(*args, **kwargs)
+            finally:
+                self.observe(time.perf_counter() - start)
+        return timed
+
+    def snapshot(self):
+        """ Returns (cumulative bucket counts, sum, count). """
+        with self._lock:
+            counts, total, count = list(self.counts), self.sum, self.count
+        cumulative = []
+        running = 0
+        for bucket_count in counts:
+            running += bucket_count
+            cumulative.append(running)
+        return cumulative, total, count
+
+    def quantile(self, q):
+        """ Returns the estimated q quantile (0-1), interpolated inside its bucket like Prometheus histogram_quantile, or None without observations. """
+        cumulative, _, count = self.snapshot()
+        if not count:
+            return None
+        rank = q * count
+        lower = 0.0
+        previous = 0
+        for bound, running in zip(self.buckets, cumulative):
+            if running >= rank:
+                return lower + (bound - lower) * (rank - previous) / (running - previous)
+            lower, previous = bound, running
+        # Above the last bound, the last bound is the best estimate
+        return self.buckets[-1]
+
+
+class Counter:
+    """ Monotonic counter. """
+    def __init__(self):
+        self.value = 0
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1):
+        with self._lock:
+            self.value += amount
+
+
+class MetricFamily:
+    """ Metrics sharing a name, type and help text, one per set of label values. Collected families get their samples from a callback at scrape time instead. """
+    def __init__(self, name, kind, help, collect=None):
+        self.name = name
+        self.kind = kind
+        self.help = help
+        self.collect = collect
+        self.children = {}
+
+
+def _format_labels(labels, extra=()):
+    pairs = list(labels) + list(extra)
+    if not pairs:
+        return ''
+    return '{' + ','.join('{}="{}"'.format(key, str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')) for key, value in pairs) + '}'
+
+def _format_value(value):
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class MetricsRegistry:
+    """ Registry of the station metrics, rendered in the Prometheus text exposition format. """
+    def __init__(self, prefix='station'):
+        self.prefix = prefix
+        self.families = {}
+        self._lock = threading.Lock()
+
+    def __child(self, name, kind, help, labels, factory):
+        with self._lock:
+            family = self.families.get(name)
+            if family is None:
+                family = self.families[name] = MetricFamily(f"{self.prefix}_{name}", kind, help)
+            key = tuple(sorted(labels.items()))
+            child = family.children.get(key)
+            if child is None:
+                child = family.children[key] = factory()
+            return child
+
+    def histogram(self, name, help, buckets=DEFAULT_BUCKETS, **labels):
+        """ Returns the histogram of the given name and labels, created on first use. """
+        return self.__child(name, 'histogram', help, labels, lambda: Histogram(buckets))
+
+    def counter(self, name, help, **labels):
+        """ Returns the counter of the given name and labels, created on first use. """
+        return self.__child(name, 'counter', help, labels, Counter)
+
+    def collector(self, name, kind, help, collect):
+        """ Adds a family whose samples are returned by collect() at scrape time, as a list of (labels dict, value). Costs nothing between scrapes. """
+        with self._lock:
+            self.families[name] = MetricFamily(f"{self.prefix}_{name}", kind, help, collect)
+
+    def render(self):
+        """ Returns every metric in the Prometheus text exposition format. """
+        with self._lock:
+            families = list(self.families.values())
+        lines = []
+        for family in families:
+            lines.append(f"# HELP {family.name} {family.help}")
+            lines.append(f"# TYPE {family.name} {family.kind}")
+            if family.collect is not None:
+                try:
+                    samples = family.collect()
+                except Exception:
+                    samples = []
+                for labels, value in samples:
+                    if value is not None:
+                        lines.append(f"{family.name}{_format_labels(sorted(labels.items()))} {_format_value(value)}")
+                continue
+            for labels, child in list(family.children.items()):
+                if isinstance(child, Histogram):
+                    cumulative, total, count = child.snapshot()
+                    for bound, running in zip(child.buckets + (float('inf'),), cumulative):
+                        lines.append(f"{family.name}_bucket{_format_labels(labels, [('le', _format_value(bound))])} {running}")
+                    lines.append(f"{family.name}_sum{_format_labels(labels)} {_format_value(total)}")
+                    lines.append(f"{family.name}_count{_format_labels(labels)} {count}")
+                else:
+                    lines.append(f"{family.name}{_format_labels(labels)} {_format_value(child.value)}")
+        return '\n'.join(lines) + '\n'
+
+
+class MetricsServer:
+    """ Local HTTP endpoint serving the registry at /metrics in a daemon thread. """
+    def __init__(self, registry, port, host='127.0.0.1'):
+        # Only imported when serving, the station imports the registry on every start
+        from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+        self.registry = registry
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(handler):
+                if handler.path.split('?')[0] != '/metrics':
+                    handler.send_error(404)
+                    return
+                body = registry.render().encode('utf-8')
+                handler.send_response(200)
+                handler.send_header('Content-Type', 'text/plain; version=0.0.4; charset=utf-8')
+                handler.send_header('Content-Length', str(len(body)))
+                handler.end_headers()
+                handler.wfile.write(body)
+
+            def log_message(handler, format, *args):
+                # Scrapes are not worth a line on the console
+                pass
+
+        self.server = ThreadingHTTPServer((host, port), Handler)
+        self.server.daemon_threads = True
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+
+    @property
+    def port(self):
+        return self.server.server_address[1]
+
+    def start(self):
+        self.thread.start()
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
@@ -0,0 +1,178 @@
+import threading
+import time
+from TelemetryHelper import Telemetry
+
+# Telemetry fields a rule condition can test, the Vibration record has no single value to compare
+RULE_FIELDS = tuple(field for field in Telemetry.FIELDS if field != 'Vibration')
+
+
+def parse_time_of_day(value):
+    """ Returns the seconds since midnight of a 'HH:MM' or 'HH:MM:SS' time. """
+    parts = [int(part) for part in str(value).split(':')]
+    if not 2 <= len(parts) <= 3 or not 0 <= parts[0] <= 24 or not all(0 <= part < 60 for part in parts[1:]):
+        raise ValueError(f"Invalid time of day {value}, expected HH:MM or HH:MM:SS")
+    seconds = parts[0] * 3600 + parts[1] * 60 + (parts[2] if len(parts) == 3 else 0)
+    if seconds > 86400:
+        raise ValueError(f"Invalid time of day {value}, expected HH:MM or HH:MM:SS")
+    return seconds
+
+
+def compile_condition(name, rule):
+    """ Returns (field, test) of the condition of a rule, test(value, active) returning whether the condition holds given the value and whether it held before, or None if the rule has no condition.
+
+    With 'above', the condition starts holding once the value is over the threshold and stops once it is back at or under the threshold minus the hysteresis. 'below' is the mirror image, and 'equals' holds while the value is equal. """
+    tests = [key for key in ('above', 'below', 'equals') if key in rule]
+    if 'field' not in rule:
+        if tests:
+            raise ValueError(f"Rule {name} has a condition but no field")
+        return None
+    field = rule['field']
+    if field not in RULE_FIELDS:
+        raise ValueError(f"Rule {name} tests an unknown field {field}, expected one of {RULE_FIELDS}")
+    if len(tests) != 1:
+        raise ValueError(f"Rule {name} needs exactly one of above, below or equals")
+    hysteresis = float(rule.get('hysteresis', 0))
+    if hysteresis < 0:
+        raise ValueError(f"Rule {name} has a negative hysteresis")
+    if 'equals' in rule:
+        expected = rule['equals']
+        return field, lambda value, active: value == expected
+    if 'above' in rule:
+        on, off = float(rule['above']), float(rule['above']) - hysteresis
+        return field, lambda value, active: value > off if active else value > on
+    on, off = float(rule['below']), float(rule['below']) + hysteresis
+    return field, lambda value, active: value < off if active else value < on
+
+
+def compile_schedule(name, schedule):
+    """ Returns in_window(seconds, weekday) telling if a time of day (seconds since midnight) and weekday (Monday is 0) are inside the schedule of a rule, or None if the rule has no schedule.
+
+    The window runs from start (included) to end (excluded) and wraps around midnight when end is before start, an equal start and end covers the whole day. days restricts the window to some weekdays, the weekday of the current time. """
+    if schedule is None:
+        return None
+    start = parse_time_of_day(schedule.get('start', '00:00'))
+    end = parse_time_of_day(schedule.get('end', '00:00'))
+    days = schedule.get('days')
+    if days is not None:
+        days = frozenset(int(day) for day in days)
+        if not days <= frozenset(range(7)):
+            raise ValueError(f"Rule {name} has invalid schedule days {sorted(days)}, expected weekdays 0 (Monday) to 6")
+    if start == end:
+        in_time = lambda seconds: True
+    elif start < end:
+        in_time = lambda seconds: start <= seconds < end
+    else:
+        in_time = lambda seconds: seconds >= start or seconds < end
+    if days is None:
+        return lambda seconds, weekday: in_time(seconds)
+    return lambda seconds, weekday: weekday in days and in_time(seconds)
+
+
+class RulesEngine:
+    """ Closed-loop control of the actuators on the device. Each rule drives one actuator from a threshold on a telemetry field (with hysteresis), a daily schedule, or both, and the engine is evaluated against every fresh sample so the actuators react within a sampling tick instead of a cloud round trip.
+
+    A rule is a dictionary such as {'field': 'Temperature', 'above': 28, 'hysteresis': 1, 'actuator': 'fanState'}, see compile_condition and compile_schedule. A rule is active while its condition holds and it is inside its schedule, and sets its actuator to its 'active' state ('on' by default), else to its 'inactive' state ('off' by default, None leaves the actuator alone). Both must be states the actuator accepts, e.g. 'close' and 'open' for the door lock. When several rules drive the same actuator, the first active one by name wins, and the actuator only goes to the inactive state of the first rule once none is active.
+
+    The rules are compiled once when they are set: the conditions and schedules become closures over their thresholds, grouped by field, so an evaluation only tests the rules of the fields in the sample. Commands are only issued when the state of an actuator changes, so a state set from the cloud stays until the rules change their mind. """
+    def __init__(self, actuators, rules=None, clock=time.time):
+        # actuators maps the twin properties of the actuators the rules can drive to the states each accepts, clock returns the time the schedules are evaluated at
+        self.actuators = {actuator: tuple(states) for actuator, states in actuators.items()}
+        self.clock = clock
+        self.rules = {}
+        # actuator -> state last commanded by the rules
+        self.outputs = {}
+        self.evaluations = 0
+        self.evaluation_time = 0.0
+        self.actuations = {}
+        self._lock = threading.Lock()
+        self.set_rules(rules)
+
+    def compile(self, rules):
+        """ Returns the compiled form of the rules: the conditions grouped by field, the schedules, and the rules of every actuator. Raises ValueError for an invalid rule, so a rule set is applied completely or not at all. """
+        names = sorted(rules)
+        by_field = {}
+        schedules = []
+        by_actuator = {}
+        for index, name in enumerate(names):
+            rule = rules[name]
+            actuator = rule.get('actuator')
+            if actuator not in self.actuators:
+                raise ValueError(f"Rule {name} drives an unknown actuator {actuator}, expected one of {tuple(self.actuators)}")
+            active, inactive = rule.get('active', 'on'), rule.get('inactive', 'off')
+            for key, state in (('active', active), ('inactive', inactive)):
+                if state not in self.actuators[actuator] and not (key == 'inactive' and state is None):
+                    raise ValueError(f"Rule {name} sets {actuator} to an unknown {key} state {state}, expected one of {self.actuators[actuator]}")
+            condition = compile_condition(name, rule)
+            schedule = compile_schedule(name, rule.get('schedule'))
+            if condition is None and schedule is None:
+                raise ValueError(f"Rule {name} needs a condition or a schedule")
+            if condition is not None:
+                field, test = condition
+                by_field.setdefault(field, []).append((index, test))
+            if schedule is not None:
+                schedules.append((index, schedule))
+            by_actuator.setdefault(actuator, []).append((index, active, inactive))
+        return (names, tuple((field, tuple(tests)) for field, tests in by_field.items()), tuple(schedules),
+                tuple((actuator, tuple(states)) for actuator, states in by_actuator.items()))
+
+    def set_rules(self, rules):
+        """ Replaces the rules, rules left out (or set to None) are removed. The conditions of new and changed rules start from not holding, and the actuators are commanded again on the next evaluation if the new rules want them in another state. """
+        for name, rule in (rules or {}).items():
+            if rule is not None and not isinstance(rule, dict):
+                raise ValueError(f"Rule {name} must be an object, got {rule!r}")
+        rules = {name: dict(rule) for name, rule in (rules or {}).items() if rule is not None}
+        names, fields, schedules, actuators = self.compile(rules)
+        conditioned = {index for _, tests in fields for index, _ in tests}
+        with self._lock:
+            # Rules without a condition only depend on their schedule, and rules without a schedule on their condition.
+            # Unchanged rules keep the state of their condition, so changing one rule does not toggle the actuators of the others.
+            previous = {name: self._conditions[index] for index, name in enumerate(self._names) if self.rules.get(name) == rules.get(name)} if self.rules else {}
+            self._conditions = [previous.get(name, index not in conditioned) for index, name in enumerate(names)]
+            self.rules = rules
+            self._names, self._fields, self._schedules, self._actuators = names, fields, schedules, actuators
+            self._scheduled = [True] * len(names)
+            self.outputs = {actuator: state for actuator, state in self.outputs.items() if actuator in dict(actuators)}
+
+    def evaluate(self, values, exclude=()):
+        """ Updates the rules with the values of a sample ({field: value}), and returns the commands ({actuator: state}) of the actuators whose state changed. Fields missing from the sample, None or listed in exclude (stale readings) leave the conditions testing them as they were. """
+        start = time.perf_counter()
+        with self._lock:
+            conditions = self._conditions
+            for field, tests in self._fields:
+                value = values.get(field)
+                if value is None or field in exclude:
+                    continue
+                for index, test in tests:
+                    conditions[index] = test(value, conditions[index])
+            if self._schedules:
+                now = time.localtime(self.clock())
+                seconds = now.tm_hour * 3600 + now.tm_min * 60 + now.tm_sec
+                scheduled = self._scheduled
+                for index, in_window in self._schedules:
+                    scheduled[index] = in_window(seconds, now.tm_wday)
+            commands = {}
+            for actuator, states in self._actuators:
+                state = states[0][2]
+                for index, active, _ in states:
+                    if conditions[index] and self._scheduled[index]:
+                        state = active
+                        break
+                if state is not None and self.outputs.get(actuator) != state:
+                    self.outputs[actuator] = state
+                    commands[actuator] = state
+                    self.actuations[actuator] = self.actuations.get(actuator, 0) + 1
+            self.evaluations += 1
+            self.evaluation_time += time.perf_counter() - start
+        return commands
+
+    def active(self):
+        """ Returns the names of the active rules. """
+        with self._lock:
+            return [name for index, name in enumerate(self._names) if self._conditions[index] and self._scheduled[index]]
+
+    def stats(self):
+        """ Returns the number of rules, the evaluations and their mean duration (s), the commands issued per actuator and the active rules. """
+        active = self.active()
+        with self._lock:
+            return {"rules": len(self.rules), "evaluations": self.evaluations, "meanEvaluationTime": self.evaluation_time / self.evaluations if self.evaluations else 0.0,
+                    "actuations": dict(self.actuations), "active": active}
@@ -0,0 +1,52 @@
+import time
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor, TimeoutError
+
+# A sensor read of the station. read returns a tuple with one value per field, and deadline is the time (s) the read has to complete in.
+SensorRead = namedtuple('SensorRead', ['name', 'fields', 'read', 'deadline'])
+
+
+class ParallelSampler:
+    """ Reads every sensor concurrently on a worker pool. A read that misses its deadline is left running and the last good values of its fields are used and flagged stale, so a sample takes as long as the slowest deadline rather than the sum of all reads. """
+    def __init__(self, reads, max_workers=None):
+        self.reads = list(reads)
+        self.executor = ThreadPoolExecutor(max_workers=max_workers or len(self.reads), thread_name_prefix='sampler')
+        self.last_values = {}
+        # Reads that missed their deadline on a previous sample and are still running
+        self.pending = {}
+
+    def sample(self):
+        """ Returns a (values, stale) tuple where values maps every field to its value and stale lists the fields holding a previous value. """
+        start = time.monotonic()
+        futures = {}
+        for read in self.reads:
+            # Never queue a second read of a sensor that is still busy
+            future = self.pending.pop(read.name, None)
+            futures[read.name] = future if future is not None else self.executor.submit(read.read)
+
+        values = {}
+        stale = []
+        for read in self.reads:
+            future = futures[read.name]
+            try:
+                result = future.result(timeout=max(0.0, start + read.deadline - time.monotonic()))
+            except TimeoutError:
+                self.pending[read.name] = future
+                result = None
+            except Exception as e:
+                print(f"An error occurred while reading {read.name}: {e}")
+                result = None
+
+            if result is None:
+                stale.extend(read.fields)
+                for field in read.fields:
+                    values[field] = self.last_values.get(field)
+            else:
+                for field, value in zip(read.fields, result):
+                    values[field] = value
+                    self.last_values[field] = value
+        return values, stale
+
+    def shutdown(self):
+        """ Stops the worker pool without waiting for reads that are still running. """
+        self.executor.shutdown(wait=False)
@@ -0,0 +1,121 @@
+import threading
+import time
+from math import sqrt
+
+
+class JobStatistics:
+    """ Running statistics of the start jitter (s) and missed deadlines of a periodic job. """
+    def __init__(self):
+        self.runs = 0
+        self.missed = 0
+        self.mean_jitter = 0.0
+        self.max_jitter = 0.0
+        self._m2 = 0.0
+
+    def add(self, jitter, missed=0):
+        """ Records one run that started jitter seconds after its deadline, after skipping the given number of deadlines. """
+        self.runs += 1
+        self.missed += missed
+        delta = jitter - self.mean_jitter
+        self.mean_jitter += delta / self.runs
+        self._m2 += delta * (jitter - self.mean_jitter)
+        self.max_jitter = max(self.max_jitter, jitter)
+
+    @property
+    def stddev_jitter(self):
+        return sqrt(self._m2 / self.runs) if self.runs > 1 else 0.0
+
+    def as_dict(self):
+        return {
+            "runs": self.runs,
+            "missed": self.missed,
+            "meanJitter": self.mean_jitter,
+            "stddevJitter": self.stddev_jitter,
+            "maxJitter": self.max_jitter,
+        }
+
+
+class PeriodicJob:
+    """ A job run by the FixedRateScheduler every period seconds. A period of 0 runs the job as often as possible. """
+    def __init__(self, name, period, action, start):
+        self.name = name
+        self.period = period
+        self.action = action
+        self.next_deadline = start
+        self.stats = JobStatistics()
+
+
+class FixedRateScheduler:
+    """ Runs periodic jobs at exact deadlines of the monotonic clock. Deadline k of a job is its start plus k periods, so the time spent running jobs never accumulates into drift. A job that falls behind skips the deadlines it missed instead of running in a burst to catch up, and the missed deadlines and start jitter of every job are recorded. """
+    def __init__(self):
+        self.jobs = {}
+        self._condition = threading.Condition()
+        self._running = False
+
+    def add_job(self, name, period, action, start=None):
+        """ Adds (or replaces) a job whose first deadline is start (monotonic time, defaults to now). """
+        with self._condition:
+            self.jobs[name] = PeriodicJob(name, period, action, time.monotonic() if start is None else start)
+            self._condition.notify()
+
+    def remove_job(self, name):
+        with self._condition:
+            self.jobs.pop(name, None)
+            self._condition.notify()
+
+    def set_period(self, name, period):
+        """ Changes the period of a job. The next deadline becomes the last deadline plus the new period, or now if that has already passed. """
+        with self._condition:
+            job = self.jobs[name]
+            job.next_deadline = max(job.next_deadline - job.period + period, time.monotonic())
+            job.period = period
+            self._condition.notify()
+
+    def stats(self):
+        """ Returns the statistics of every job keyed by job name. """
+        with self._condition:
+            return {name: job.stats.as_dict() for name, job in self.jobs.items()}
+
+    def stop(self):
+        """ Stops the scheduler once the job currently running returns. """
+        with self._condition:
+            self._running = False
+            self._condition.notify()
+
+    def _next_due_job(self):
+        """ Waits until the earliest deadline and returns its job, or None once stopped. Must be called holding the condition. """
+        while self._running:
+            if not self.jobs:
+                self._condition.wait()
+                continue
+            job = min(self.jobs.values(), key=lambda j: j.next_deadline)
+            wait = job.next_deadline - time.monotonic()
+            if wait <= 0:
+                return job
+            # Woken up early when jobs change so a shorter period takes effect right away
+            self._condition.wait(wait)
+        return None
+
+    def run(self):
+        """ Runs the due jobs in the calling thread until stop is called. """
+        with self._condition:
+            self._running = True
+        while True:
+            with self._condition:
+                job = self._next_due_job()
+                if job is None:
+                    return
+                now = time.monotonic()
+                deadline = job.next_deadline
+                missed = 0
+                jitter = 0.0
+                if job.period > 0:
+                    missed = int((now - deadline) // job.period)
+                    jitter = now - deadline - missed * job.period
+                    job.next_deadline = deadline + (missed + 1) * job.period
+                else:
+                    job.next_deadline = now
+                job.stats.add(jitter, missed)
+            if missed:
+                print(f"Scheduler: {job.name} missed {missed} deadline(s)")
+            job.action()
@@ -0,0 +1,92 @@
+import threading
+import time
+from concurrent.futures import Future
+
+
+class SensorCache:
+    """ Read-through cache of the sensor reads, keyed by sensor name. A reading is reused while it is younger than the maximum age of its sensor (or the one asked by the caller), and callers asking for a sensor while it is being read wait for that read instead of starting another bus transaction. A failed read is not cached, its exception is raised to every caller waiting for it.
+
+    The age of a reading is counted from the start of its read, the earliest the measurement could have been taken. Invalidating a sensor bumps its generation, and a read that was in flight meanwhile is not cached, as it may hold the state from before the change that invalidated it. """
+    def __init__(self, max_ages=None, default_max_age=0.0):
+        # max_ages maps a sensor name to the maximum age (s) of its cached reading, 0 always reads the sensor
+        self.default_max_age = default_max_age
+        self.max_ages = {}
+        self.set_max_ages(max_ages)
+        # name -> (value, read_at) of the last successful read
+        self.values = {}
+        # name -> Future of the read in progress
+        self.in_flight = {}
+        self.hits = {}
+        self.misses = {}
+        self.shared = {}
+        # name -> generation of the sensor, bumped by invalidate, and the generation of every sensor at once
+        self.generations = {}
+        self.generation = 0
+        self._lock = threading.Lock()
+
+    def set_max_ages(self, max_ages):
+        """ Replaces the maximum age of the sensors, those left out (or set to None) use the default one. """
+        self.max_ages = {name: float(max_age) for name, max_age in (max_ages or {}).items() if max_age is not None and float(max_age) >= 0}
+
+    def max_age(self, name):
+        return self.max_ages.get(name, self.default_max_age)
+
+    def read(self, name, read, max_age=None):
+        """ Returns the value of the sensor: the cached one if younger than max_age (defaults to the maximum age of the sensor), the result of the read in progress if any, else the result of calling read. """
+        if max_age is None:
+            max_age = self.max_age(name)
+        owner = None
+        with self._lock:
+            cached = self.values.get(name)
+            if cached is not None and time.monotonic() - cached[1] < max_age:
+                self.hits[name] = self.hits.get(name, 0) + 1
+                return cached[0]
+            future = self.in_flight.get(name)
+            if future is not None:
+                self.shared[name] = self.shared.get(name, 0) + 1
+            else:
+                self.misses[name] = self.misses.get(name, 0) + 1
+                future = self.in_flight[name] = Future()
+                owner = future
+                generation = (self.generation, self.generations.get(name, 0))
+        if future is not owner:
+            return future.result()
+
+        read_at = time.monotonic()
+        try:
+            value = read()
+        except BaseException as e:
+            with self._lock:
+                if self.in_flight.get(name) is future:
+                    del self.in_flight[name]
+            future.set_exception(e)
+            raise
+        with self._lock:
+            if generation == (self.generation, self.generations.get(name, 0)):
+                self.values[name] = (value, read_at)
+            if self.in_flight.get(name) is future:
+                del self.in_flight[name]
+        future.set_result(value)
+        return value
+
+    def reader(self, name, read):
+        """ Returns a callable reading the sensor through the cache, to use in place of read. """
+        return lambda: self.read(name, read)
+
+    def invalidate(self, name=None):
+        """ Forgets the cached reading of a sensor (or of every sensor), so the next caller reads it again. A read in progress is left to its current callers but not cached, and later callers start a new one. """
+        with self._lock:
+            if name is None:
+                self.values.clear()
+                self.in_flight.clear()
+                self.generation += 1
+            else:
+                self.values.pop(name, None)
+                self.in_flight.pop(name, None)
+                self.generations[name] = self.generations.get(name, 0) + 1
+
+    def stats(self):
+        """ Returns the hits, misses (reads of the sensor) and shared reads (callers that waited for a read in progress) of every sensor. """
+        with self._lock:
+            names = set(self.hits) | set(self.misses) | set(self.shared)
+            return {name: {"hits": self.hits.get(name, 0), "misses": self.misses.get(name, 0), "shared": self.shared.get(name, 0)} for name in sorted(names)}
@@ -1,113 +1,800 @@
-from dotenv import dotenv_values
-from azure.iot.device import IoTHubDeviceClient
+import importlib
+import json
+import threading
 import time
-from PlantSubsystem import plant_subsystem
-from SecuritySubsystem import security_subsystem
-from GeoLocationSubsystem import geo_location_subsystem
-from TelemetryHelper import Telemetry
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from TelemetryHelper import Telemetry, TelemetryEncoder, Vibration
+from sampling import ParallelSampler, SensorRead
+from scheduler import FixedRateScheduler
+from batching import TelemetryBatcher
+from store_forward import StoreAndForwardQueue
+from deadband import DeadbandFilter
+from command_worker import ActuatorCommandWorker
+from aggregation import WindowAggregator
+from metrics import MetricsRegistry, MetricsServer
+from sensor_cache import SensorCache
+from bus_manager import BusManager
+from hardware_backend import ReTerminalBackend
+from history import HistoryStore, column_value
+from rules import RulesEngine
+from events import EventRing, summarize_events
+from lanes import ALARM_LANE, BULK_LANE, LANES, AlarmLane, LaneStatistics
 
 class Station:
     """ This class is used to send telemetry data to the IoT Hub based off of all the subsystems and is also meant to handle Device Twins. """
     DEFAULT_INTERVAL = 10
+    SAMPLING_MODES = ('sequential', 'parallel')
+    DEFAULT_QUEUE_PATH = 'telemetry_queue.db'
+    DEFAULT_QUEUE_MAX_BYTES = 64 * 1024 * 1024
+    DEFAULT_HISTORY_PATH = 'history'
+    # Messages per second replayed from the store-and-forward queue once the link is back
+    DEFAULT_DRAIN_RATE = 10
+    # Minimum seconds between two messages uploading the door and motion events as they happen
+    DEFAULT_EVENT_MIN_INTERVAL = 1.0
+    # Seconds between attempts to replay the queue while the link is down
+    FORWARD_RETRY_INTERVAL = 5
+    # Absolute values over which a field raises an alarm: vibration (g, largest peak of the axes over the readings since the previous sample) and tilt (degrees)
+    DEFAULT_ALARM_LIMITS = {'Vibration': 0.5, 'Pitch': 30, 'Roll': 30}
+    # Subsystems of the station, with the module and class implementing each. The module of a subsystem is only imported when the subsystem is enabled.
+    SUBSYSTEMS = {
+        'plant': ('PlantSubsystem.plant_subsystem', 'PlantSubsystem'),
+        'security': ('SecuritySubsystem.security_subsystem', 'SecuritySubSystem'),
+        'geoLocation': ('GeoLocationSubsystem.geo_location_subsystem', 'GeoLocationSubSystem'),
+    }
+    # Twin properties of the actuators, applied by the command worker
+    ACTUATOR_PROPERTIES = ('buzzerState', 'lightState', 'fanState', 'doorLockState')
+    # States each actuator understands
+    ACTUATOR_STATES = {'buzzerState': ('on', 'off'), 'lightState': ('on', 'off'), 'fanState': ('on', 'off'), 'doorLockState': ('open', 'close')}
+    # Subsystem driving each actuator
+    ACTUATOR_SUBSYSTEMS = {'buzzerState': 'geoLocation', 'lightState': 'plant', 'fanState': 'plant', 'doorLockState': 'security'}
+    # Subsystems each sensor read takes its fields from, a read is left out when none of them is enabled
+    READ_SUBSYSTEMS = {
+        'temperatureHumidity': ('plant',),
+        'waterLevel': ('plant',),
+        'moisture': ('plant',),
+        'noise': ('security',),
+        'luminosity': ('security',),
+        'actuators': ('plant', 'security'),
+        'doorMotion': ('security',),
+        'geoLocation': ('geoLocation',),
+        'vibration': ('geoLocation',),
+    }
+    # Numeric fields uploaded as window aggregates when aggregating
+    AGGREGATED_FIELDS = ('Temperature', 'Humidity', 'WaterLevel', 'Moisture', 'Luminosity', 'Noise', 'Pitch', 'Roll')
+    # Sensor reads whose cached values an actuator changes
+    ACTUATOR_READS = {'buzzerState': 'geoLocation', 'lightState': 'actuators', 'fanState': 'actuators', 'doorLockState': 'actuators'}
+    # Time (s) each sensor read has to complete in when sampling in parallel
+    DEFAULT_SENSOR_DEADLINES = {
+        'temperatureHumidity': 0.15,
+        'waterLevel': 0.05,
+        'moisture': 0.05,
+        'noise': 0.05,
+        'luminosity': 0.05,
+        'actuators': 0.05,
+        'doorMotion': 0.05,
+        'geoLocation': 0.05,
+        'vibration': 0.05,
+    }
 
     # Constructor initializes and stores telemetry data interval and all subsystems.
-    def __init__(self, iot_device_connection_string):
+    # The hardware backend (defaults to the reTerminal) and the IoT Hub client can be provided to run the station without real devices.
+    # The subsystems open their devices through a BusManager wrapping the backend, which shares the ADC and the reTerminal between them and serializes their transactions.
+    # The sampling mode is either 'sequential' or 'parallel', and sensor_deadlines overrides the default deadline of any sensor read.
+    # sampling_intervals gives sensors their own sampling interval (s), for example {'geoLocation': 0.1, 'temperatureHumidity': 60}.
+    # Samples are sent in batches of batch_size, or once the oldest one is batch_max_age seconds old (0 disables the age limit).
+    # Messages are kept in a store-and-forward queue at queue_path while the link is down (None disables the queue), and replayed at drain_rate messages/s.
+    # With report_by_exception, only fields that moved out of their deadband are sent, with a full keyframe every keyframe_interval seconds.
+    # With aggregate, the numeric fields are uploaded as the statistics of every reading taken since the previous upload (see sampling_intervals for the reading rate).
+    # With metrics (implied by metrics_port or metrics_report_interval), the hot path is instrumented. The metrics are served in the Prometheus text format
+    # at http://127.0.0.1:<metrics_port>/metrics, and summarized into the 'metrics' reported property every metrics_report_interval seconds (0 disables the summary).
+    # Every sensor read goes through a read-through cache: cache_max_ages gives sensors a maximum age (s) under which their last reading is reused,
+    # for example {'temperatureHumidity': 30}. Sensors without one are read every time, but concurrent callers still share one read.
+    # With adc_scan, the moisture, water level and noise sensors are read from scans of their ADC channels, each channel oversampled
+    # adc_oversampling times and reduced with the adc_filter ('mean' or 'median').
+    # Every sample is kept in the on-device history at history_path (None disables it), until it is over history_max_bytes or older than history_max_age seconds.
+    # rules drive the actuators from the samples on the device (see RulesEngine), for example {'coolDown': {'field': 'Temperature', 'above': 28, 'hysteresis': 1, 'actuator': 'fanState'}}.
+    # Every message carries the door and motion events since the previous message. With upload_events, the events are also uploaded as they happen,
+    # in messages of their own sent at most every event_min_interval seconds.
+    # Alarms (the door and motion events and the fields over their alarm_limits) are sent on their own lane, ahead of the routine telemetry.
+    # subsystems lists the subsystems to run (see SUBSYSTEMS, defaults to all of them). The others are never imported, and their fields are sent as None.
+    # With parallel_init, the IoT Hub client and the subsystems are created at the same time, each on a thread of its own, as opening their devices mostly waits on the hardware.
+    def __init__(self, iot_device_connection_string, backend=None, client=None, sampling_mode='sequential', sensor_deadlines=None, sampling_intervals=None, batch_size=1, batch_max_age=0, queue_path=None, queue_max_bytes=DEFAULT_QUEUE_MAX_BYTES, drain_rate=DEFAULT_DRAIN_RATE, report_by_exception=False, deadbands=None, keyframe_interval=DeadbandFilter.DEFAULT_KEYFRAME_INTERVAL, aggregate=False, metrics=False, metrics_port=None, metrics_report_interval=0, cache_max_ages=None, adc_scan=False, adc_oversampling=1, adc_filter='mean', history_path=None, history_max_bytes=HistoryStore.DEFAULT_MAX_BYTES, history_max_age=HistoryStore.DEFAULT_MAX_AGE, rules=None, upload_events=False, event_min_interval=DEFAULT_EVENT_MIN_INTERVAL, alarm_limits=None, subsystems=None, parallel_init=True):
+        if sampling_mode not in self.SAMPLING_MODES:
+            raise ValueError(f"Invalid sampling mode {sampling_mode}, expected one of {self.SAMPLING_MODES}")
+        unknown = [name for name in subsystems or () if name not in self.SUBSYSTEMS]
+        if unknown:
+            raise ValueError(f"Unknown subsystems {unknown}, expected some of {tuple(self.SUBSYSTEMS)}")
+        self.subsystems = tuple(name for name in self.SUBSYSTEMS if subsystems is None or name in subsystems)
         self.interval=self.DEFAULT_INTERVAL
+        self.sampling_mode = sampling_mode
+        self.sensor_deadlines = {**self.DEFAULT_SENSOR_DEADLINES, **(sensor_deadlines or {})}
+        self.sampler = None
+        self.encoder = TelemetryEncoder()
+        self.report_by_exception = report_by_exception
+        self.deadband = DeadbandFilter(Telemetry.FIELDS, deadbands, keyframe_interval)
+        self.batcher = TelemetryBatcher(batch_size, batch_max_age)
+        self.aggregate = aggregate
+        self.queue = StoreAndForwardQueue(queue_path, queue_max_bytes) if queue_path is not None else None
+        self.drain_rate = drain_rate
+        self.history = HistoryStore(history_path, max_bytes=history_max_bytes, max_age=history_max_age) if history_path is not None else None
+        self.backlog_event = threading.Event()
+        self.forwarder = None
+        self.stopping = False
         self.iot_device_connection_string = iot_device_connection_string
-        self.client = self.create_client()
-        self.plant=plant_subsystem.PlantSubsystem()
-        self.geoLocation=geo_location_subsystem.GeoLocationSubSystem()
-        self.security=security_subsystem.SecuritySubSystem()
+        self.bus = BusManager(backend if backend is not None else ReTerminalBackend())
+        modules = {name: importlib.import_module(self.SUBSYSTEMS[name][0]) for name in self.subsystems}
+        # ADC channels scanned, in the order of the scan, of the enabled subsystems
+        plant, security = modules.get('plant'), modules.get('security')
+        channels = [channel for channel in (plant and plant.PlantSubsystem.MOISTURE_CHANNEL, security and security.NOISE_PIN, plant and plant.PlantSubsystem.WATER_LEVEL_CHANNEL) if channel is not None]
+        self.adc_scanner = self.bus.adc_scanner(channels, adc_oversampling, adc_filter) if adc_scan and channels else None
+        # Seconds the client and each subsystem took to create
+        self.startup_times = {}
+        self.plant = self.security = self.geoLocation = None
+        self.initialize(client, {name: getattr(module, self.SUBSYSTEMS[name][1]) for name, module in modules.items()}, parallel_init)
+        self.reads = self.sensor_reads()
+        # Fields of the disabled subsystems, sent as None
+        fields = {field for read in self.reads for field in read.fields}
+        self.missing_values = {field: None for field in Telemetry.FIELDS if field not in fields}
+        # The fields of the disabled subsystems are not aggregated, they stay None
+        self.aggregator = WindowAggregator([field for field in self.AGGREGATED_FIELDS if field not in self.missing_values])
+        self.cache = SensorCache(cache_max_ages)
+        # Left as None when disabled, so the hot path only pays for an 'is not None' test
+        self.metrics = MetricsRegistry() if metrics or metrics_port is not None or metrics_report_interval else None
+        self.metrics_port = metrics_port
+        self.metrics_report_interval = metrics_report_interval
+        self.metrics_server = None
+        if self.metrics is not None:
+            self.instrument()
+        # Cached after the instrumentation, so the read latency histograms only time the reads of the devices
+        self.device_reads = {read.name: read for read in self.reads}
+        self.reads = [read._replace(read=self.cache.reader(read.name, read.read)) for read in self.reads]
+        self.commands = ActuatorCommandWorker(self.actuators(), self.report_properties)
+        self.rules = RulesEngine({actuator: self.ACTUATOR_STATES[actuator] for actuator in self.commands.actuators}, rules)
+        # The telemetry and the event uploads read the event ring of the security subsystem with cursors of their own, the ring stays empty without the subsystem
+        self.events = self.security.events if self.security is not None else EventRing()
+        self.telemetry_events = self.events.cursor()
+        self.event_cursor = self.events.cursor()
+        self.upload_events = upload_events
+        self.event_min_interval = event_min_interval
+        self.events_ready = threading.Event()
+        self.events_stop = threading.Event()
+        self.event_uploader = None
+        self.events.listeners.append(self.notify_events)
+        self.alarm_limits = {}
+        self.set_alarm_limits({**self.DEFAULT_ALARM_LIMITS, **(alarm_limits or {})})
+        # Fields over their alarm limit, an alarm is raised when a field goes over it
+        self.alarms_raised = {}
+        self.alarm_lock = threading.Lock()
+        self.lanes = {lane: LaneStatistics(self.metrics.histogram('lane_latency_seconds', "Time from the sample or alarm to the end of the send of its message", lane=lane) if self.metrics is not None else None) for lane in LANES}
+        self.alarm_lane = self.create_alarm_lane()
+        self.latest_values = {}
+        self.scheduler = FixedRateScheduler()
+        self.running = False
+        self.set_sampling_intervals(sampling_intervals)
 
-    def read_geo_location_values(self):
+    def initialize(self, client, subsystems, parallel=True):
+        """ Method used to create the IoT Hub client and the given subsystems ({name: class}). When parallel, every subsystem is created on a thread of its own while the client is created on the calling thread (the asyncio client belongs to its event loop). The time each took is recorded in startup_times. """
+        def timed(name, create):
+            start = time.perf_counter()
+            created = create()
+            self.startup_times[name] = time.perf_counter() - start
+            return created
+
+        tasks = {}
+        for name, subsystem in subsystems.items():
+            if name == 'geoLocation':
+                tasks[name] = lambda subsystem=subsystem: subsystem(self.bus)
+            else:
+                tasks[name] = lambda subsystem=subsystem: subsystem(self.bus, self.adc_scanner)
+        start = time.perf_counter()
+        if parallel and tasks:
+            with ThreadPoolExecutor(max_workers=len(tasks), thread_name_prefix='startup') as executor:
+                futures = {name: executor.submit(timed, name, create) for name, create in tasks.items()}
+                timed('client', lambda: self.create_client(client))
+                created = {name: future.result() for name, future in futures.items()}
+        else:
+            timed('client', lambda: self.create_client(client))
+            created = {name: timed(name, create) for name, create in tasks.items()}
+        self.startup_times['total'] = time.perf_counter() - start
+        self.plant = created.get('plant')
+        self.security = created.get('security')
+        self.geoLocation = created.get('geoLocation')
+
+    def actuators(self):
+        """ Method used to return the callable setting the state of each actuator of the enabled subsystems, keyed by its twin property. States are set with a high bus priority, ahead of the sampling reads waiting for the bus, and setting a state invalidates the cached reading of the actuator, so it is read again afterwards. """
+        def set_buzzer_state(state):
+            self.geoLocation.buzzer=state
+
+        def invalidating(key, set_state):
+            def set_and_invalidate(state):
+                try:
+                    with self.bus.priority(BusManager.HIGH):
+                        set_state(state)
+                finally:
+                    self.cache.invalidate(self.ACTUATOR_READS[key])
+            return set_and_invalidate
+
+        return {key: invalidating(key, set_state) for key, set_state in {
+            'buzzerState': set_buzzer_state,
+            'lightState': lambda state: self.plant.set_light_state(state),
+            'fanState': lambda state: self.plant.set_fan_state(state),
+            'doorLockState': lambda state: self.security.set_door_lock_state(state),
+        }.items() if self.ACTUATOR_SUBSYSTEMS[key] in self.subsystems}
+
+    def read_sensors(self, names, max_age=None):
+        """ Method used to return the telemetry values of the named sensor reads through the cache. max_age (s) overrides the maximum age of the cached readings, 0 asks for fresh readings. Reads of the disabled subsystems are skipped, their fields are in missing_values. """
+        values = {}
+        for name in names:
+            read = self.device_reads.get(name)
+            if read is None:
+                continue
+            values.update(zip(read.fields, self.cache.read(name, read.read, max_age)))
+        return values
+
+    def read_geo_location_values(self, max_age=None):
         """ Method used to return the current values of the geo-location subsystem. """
-        return self.geoLocation.longitude, self.geoLocation.latitude, self.geoLocation.pitch, self.geoLocation.roll, self.geoLocation.vibration, self.geoLocation.buzzer
+        values = {**self.missing_values, **self.read_sensors(('geoLocation', 'vibration'), max_age)}
+        return values["Longitude"], values["Latitude"], values["Pitch"], values["Roll"], values["Vibration"], values["BuzzerIsActive"]
 
-    def read_plant_values(self):
+    def read_plant_values(self, max_age=None):
         """ Method used to return the current values of the plant subsystem. """
-        temp,humi=self.plant.read_temp_and_humi()
-        return temp,humi,self.plant.read_water_level(),self.plant.read_moisture_level(),self.plant.read_fan_state(),self.plant.read_light_state()
+        values = {**self.missing_values, **self.read_sensors(('temperatureHumidity', 'waterLevel', 'moisture', 'actuators'), max_age)}
+        return values["Temperature"], values["Humidity"], values["WaterLevel"], values["Moisture"], values["FanIsActive"], values["LightIsActive"]
 
-    def read_security_values(self):
+    def read_security_values(self, max_age=None):
         """ Method used to return the current values of the security subsystem. """
-        return self.security.read_door_lock_state(),self.security.read_door_state(),self.security.read_motion_state(),self.security.read_luminosity_level(),self.security.read_noise_level()
+        values = {**self.missing_values, **self.read_sensors(('actuators', 'doorMotion', 'luminosity', 'noise'), max_age)}
+        return values["DoorIsLocked"], values["Door"], values["Motion"], values["Luminosity"], values["Noise"]
 
-    def run(self):
-        """ Method used to collect and send telemetry data from all subsystems to the IoT Hub. """
-        self.client.connect()
+    def read_values(self, reads):
+        """ Method used to read the given sensors one after another and return their telemetry values. """
+        values = {}
+        for read in reads:
+            values.update(zip(read.fields, read.read()))
+        return values
+
+    def read_actuator_states(self):
+        """ Method used to read the states of the fan, lights and door lock, None for the actuators of a disabled subsystem. """
+        plant, security = self.plant, self.security
+        if plant is not None:
+            fan, light = plant.read_fan_state(), plant.read_light_state()
+        else:
+            fan = light = None
+        return fan, light, security.read_door_lock_state() if security is not None else None
+
+    def sensor_reads(self):
+        """ Method used to return every sensor read of the enabled subsystems with the telemetry fields it produces and its deadline. """
+        deadlines = self.sensor_deadlines
+        # The moisture, water and noise sensors share the ADC, whose transactions are serialized by the bus manager
+        reads = [
+            SensorRead('temperatureHumidity', ("Temperature", "Humidity"), lambda: self.plant.read_temp_and_humi(), deadlines['temperatureHumidity']),
+            SensorRead('waterLevel', ("WaterLevel",), lambda: (self.plant.read_water_level(),), deadlines['waterLevel']),
+            SensorRead('moisture', ("Moisture",), lambda: (self.plant.read_moisture_level(),), deadlines['moisture']),
+            SensorRead('noise', ("Noise",), lambda: (self.security.read_noise_level(),), deadlines['noise']),
+            SensorRead('luminosity', ("Luminosity",), lambda: (self.security.read_luminosity_level(),), deadlines['luminosity']),
+            SensorRead('actuators', ("FanIsActive", "LightIsActive", "DoorIsLocked"), self.read_actuator_states, deadlines['actuators']),
+            SensorRead('doorMotion', ("Door", "Motion"), lambda: (self.security.read_door_state(), self.security.read_motion_state()), deadlines['doorMotion']),
+            SensorRead('geoLocation', ("Longitude", "Latitude", "Pitch", "Roll", "BuzzerIsActive"), lambda: (self.geoLocation.longitude, self.geoLocation.latitude, self.geoLocation.pitch, self.geoLocation.roll, self.geoLocation.buzzer), deadlines['geoLocation']),
+            # Each vibration read analyzes the accelerometer readings since the previous one, so it has its own read and sampling interval
+            SensorRead('vibration', ("Vibration",), lambda: (self.geoLocation.vibration,), deadlines['vibration']),
+        ]
+        return [read for read in reads if any(name in self.subsystems for name in self.READ_SUBSYSTEMS[read.name])]
+
+    def read_values_parallel(self, reads):
+        """ Method used to read the given sensors concurrently and return their telemetry values. Fields of reads that missed their deadline hold the last good value and are listed under Stale. """
+        if self.sampler is None or self.sampler.reads != reads:
+            if self.sampler is not None:
+                self.sampler.shutdown()
+            self.sampler = ParallelSampler(reads)
+        values, stale = self.sampler.sample()
+        values["Stale"] = stale
+        return values
+
+    def sample_sensor(self, read):
+        """ Method used by the sampling job of a sensor with its own sampling interval to store its latest values. """
+        try:
+            values = dict(zip(read.fields, read.read()))
+            self.latest_values.update(values)
+            self.apply_rules(values)
+            self.check_alarms(values)
+            if self.aggregate:
+                self.aggregator.add(values)
+        except Exception as e:
+            print(f"An error occurred while reading {read.name}: {e}")
+
+    def sample(self):
+        """ Method used to read the telemetry values using the configured sampling mode. Sensors with their own sampling interval report their latest values. The fresh readings are evaluated by the rules, and the sample is recorded in the history. """
+        reads = [read for read in self.reads if read.name not in self.sampling_intervals]
+        if self.sampling_mode == 'parallel':
+            values = self.read_values_parallel(reads)
+        else:
+            values = self.read_values(reads)
+        values.update(self.missing_values)
+        self.apply_rules(values, exclude=values.get("Stale") or ())
+        self.check_alarms(values, exclude=values.get("Stale") or ())
+        if self.aggregate:
+            self.aggregator.add(values, exclude=values.get("Stale") or ())
+        for read in self.reads:
+            if read.name in self.sampling_intervals:
+                values.update((field, self.latest_values.get(field)) for field in read.fields)
+        if self.history is not None:
+            try:
+                self.history.append(values, exclude=values.get("Stale") or ())
+            except Exception as e:
+                print(f"An error occurred while recording the history: {e}")
+        return values
+
+    def apply_rules(self, values, exclude=()):
+        """ Method used to evaluate the rules against fresh readings and submit the actuator states they change to the command worker, which applies and reports them like the states set from the cloud. """
+        if not self.rules.rules:
+            return
+        try:
+            commands = self.rules.evaluate(values, exclude)
+        except Exception as e:
+            print(f"An error occurred while evaluating the rules: {e}")
+            return
+        if commands:
+            print(f"Rules: {commands}")
+            self.commands.submit(commands)
+
+    def set_alarm_limits(self, alarm_limits):
+        """ Method used to replace the alarm limits of the fields, a limit of None disables the alarm of its field. """
+        limits = {field: float(limit) for field, limit in alarm_limits.items() if limit is not None}
+        unknown = [field for field in limits if field not in Telemetry.FIELDS]
+        if unknown:
+            raise ValueError(f"Unknown alarm fields {unknown}, expected telemetry fields")
+        self.alarm_limits = limits
+
+    def check_alarms(self, values, exclude=()):
+        """ Method used to raise an alarm for the fresh readings whose absolute value went over their alarm limit. The alarm is sent on the alarm lane, and raised again once the field went back under its limit. """
+        alarms = {}
+        with self.alarm_lock:
+            for field, limit in self.alarm_limits.items():
+                if field not in values or field in exclude:
+                    continue
+                value = self.alarm_value(values[field])
+                if value != value:
+                    continue
+                raised = value > limit
+                if raised and not self.alarms_raised.get(field):
+                    alarms[field] = {"Limit": limit, "Value": value}
+                self.alarms_raised[field] = raised
+        if alarms:
+            print(f"Alarms: {alarms}")
+            self.submit_alarm(json.dumps({"Alarms": alarms, "Timestamp": datetime.now(timezone.utc).isoformat()}, sort_keys=True))
+
+    @staticmethod
+    def alarm_value(value):
+        """ Method used to return the value compared with the alarm limit of a field: the largest per-axis Peak of the window analysis for the vibration, so a shock between two samples raises the alarm, and the absolute value of the field otherwise (NaN when there is none). """
+        if isinstance(value, Vibration) and value.Peak:
+            return max(abs(peak) for peak in value.Peak.values())
+        return abs(column_value(value))
 
-        while True:
-            # Get plant data
-            temperature,humidity,water,moisture,fan,light=self.read_plant_values() 
-
-            # Get security data
-            doorLocked,door,motion,luminosity,noise = self.read_security_values()
-
-            # Get geo location data
-            longitude, latitude, pitch, roll, vibration, buzzer = self.read_geo_location_values()
-
-            # Creates a serializable telemetry object taking in the values from all subsystems.
-            telemetryData = Telemetry({
-                "Temperature": temperature,
-                "Humidity": humidity,
-                "WaterLevel": water,
-                "Moisture": moisture,
-                "Longitude": longitude,
-                "Latitude": latitude,
-                "Pitch": pitch,
-                "Roll": roll,
-                "Vibration": vibration,
-                "BuzzerIsActive": buzzer,
-                "FanIsActive": fan,
-                "LightIsActive": light,
-                "DoorIsLocked": doorLocked,
-                "Door": door,
-                "Motion": motion,
-                "Luminosity": luminosity,
-                "Noise": noise
-            })
-
-            # Create the payload using the serialized telemetry object.
-            payload = str(telemetryData.toJSON())
-
-            print("Sending message: {}".format(payload))
+    def create_alarm_lane(self):
+        """ Method used to create the alarm lane, whose failed sends are kept in the store-and-forward queue when it is enabled. """
+        return AlarmLane(self.send_alarm, self.enqueue_payload if self.queue is not None else None, self.lanes[ALARM_LANE])
+
+    def submit_alarm(self, payload, raised_at=None):
+        """ Method used to send an alarm message on the alarm lane. raised_at is the time (s since the epoch) the alarm was raised, now by default. """
+        self.alarm_lane.submit(payload, raised_at)
+
+    def send_alarm(self, payload):
+        """ Method used by the alarm lane to send an alarm message, straight to the IoT Hub whatever the store-and-forward queue holds. """
+        print("Sending alarm: {}".format(payload))
+        self.client.send_message(payload)
+
+    def wait_for_alarms(self):
+        """ Method used by the routine sends to let the pending alarms go first. """
+        self.alarm_lane.wait_idle()
+
+    def send_telemetry(self):
+        """ Method used to collect and send one telemetry sample from all subsystems to the IoT Hub. """
+        sampled_at = time.time()
+        payload = self.prepare_payload(self.sample())
+        if payload is not None:
+            self.send_payload(payload, sampled_at)
+
+    def prepare_payload(self, values):
+        """ Method used to turn a sample into the payload of the message to send, or None if there is nothing to send yet. When aggregating, the numeric fields hold the statistics of the window instead of the last reading. When batching, the sample is added to the pending batch which is only sent once full or old enough. When reporting by exception, only the fields that changed are sent and a sample where nothing changed (and no event happened) is skipped, the pending batch is still sent once old enough. The door and motion events since the previous message are summarized under Events. """
+        if self.aggregate:
+            values.update(self.aggregator.flush())
+        values["Events"] = summarize_events(*self.telemetry_events.read())
+        fields = None
+        if self.report_by_exception:
+            fields, keyframe = self.deadband.filter(values)
+            if not fields and values["Events"] is None:
+                # Nothing to add, but the pending batch may be old enough to send
+                return self.batcher.flush_expired()
+            values["Keyframe"] = keyframe
+        batching = self.batcher.active
+        if batching:
+            values["Timestamp"] = datetime.now(timezone.utc).isoformat()
+
+        # Creates a serializable telemetry object taking in the values from all subsystems.
+        telemetryData = Telemetry(values)
+
+        # Create the payload using the serialized telemetry object.
+        if self.metrics is not None:
+            start = time.perf_counter()
+            payload = self.encoder.encode(telemetryData, None if fields is self.deadband.fields else fields)
+            self.serialization_time.observe(time.perf_counter() - start)
+        else:
+            payload = self.encoder.encode(telemetryData, None if fields is self.deadband.fields else fields)
+        if batching:
+            return self.batcher.add(payload)
+        return payload
+
+    def is_connected(self):
+        """ Method used to check if the IoT Hub client is connected (assumed connected if the client does not say). """
+        return getattr(self.client, 'connected', True)
+
+    def send_payload(self, payload, sampled_at=None):
+        """ Method used to send a telemetry message to the IoT Hub on the bulk lane, once the pending alarms are sent. With the store-and-forward queue enabled, the message is queued instead while the link is down or older messages are still queued. sampled_at is the time (s since the epoch) the sample of the message was taken, for the latency of the lane. """
+        if self.queue is not None and (self.queue.depth or not self.is_connected()):
+            self.enqueue_payload(payload)
+            return
+        print("Sending message: {}".format(payload))
+        self.wait_for_alarms()
+        start = time.perf_counter() if self.metrics is not None else None
+        try:
             self.client.send_message(payload)
-            print("Message sent")
-            time.sleep(self.interval)
+        except Exception:
+            if start is not None:
+                self.send_failures.inc()
+            if self.queue is None:
+                raise
+            print("An error occurred while sending the message.")
+            self.enqueue_payload(payload)
+            return
+        if start is not None:
+            self.send_time.observe(time.perf_counter() - start)
+        if sampled_at is not None:
+            self.lanes[BULK_LANE].add(time.time() - sampled_at)
+        print("Message sent")
 
-    # Method used to create an IoT Hub client
-    def create_client(self):
-        self.client = IoTHubDeviceClient.create_from_connection_string(self.iot_device_connection_string)
+    def enqueue_payload(self, payload):
+        """ Method used to store a message in the store-and-forward queue and wake up the forwarding thread. """
+        self.queue.put(payload)
+        print(f"Message queued ({self.queue.depth} queued)")
+        self.backlog_event.set()
 
-        # Patch repoted properties and update interval
-        def twin_patch_handler(twin_patch):
-            print("Twin patch received:")
+    def forward_backlog(self):
+        """ Method run by the forwarding thread to replay the queued messages, rate limited, whenever the link is up. """
+        while not self.stopping:
+            self.backlog_event.wait(self.FORWARD_RETRY_INTERVAL)
+            self.backlog_event.clear()
+            if self.stopping or not self.queue.depth or not self.is_connected():
+                continue
+            try:
+                sent = self.queue.drain(self.send_queued, self.drain_rate, should_stop=lambda: self.stopping)
+                print(f"Forwarded {sent} queued message(s) at {self.queue.drain_rate:.1f} msg/s")
+            except Exception:
+                print(f"An error occurred while forwarding queued messages ({self.queue.depth} still queued).")
+
+    def notify_events(self):
+        """ Method called by the event ring after every door or motion event, from the thread of the device callback. """
+        if self.upload_events:
+            self.events_ready.set()
+
+    def set_upload_events(self, upload_events):
+        """ Method used to turn the upload of the events as they happen on or off. Events recorded while it was off are left to the telemetry messages. """
+        if upload_events and not self.upload_events:
+            self.event_cursor = self.events.cursor()
+        self.upload_events = bool(upload_events)
+        if self.running:
+            self.start_event_upload()
+
+    def start_event_upload(self):
+        """ Method used to start the event thread, if uploading the events as they happen. """
+        if self.upload_events and self.event_uploader is None:
+            self.event_uploader = threading.Thread(target=self.forward_events, daemon=True)
+            self.event_uploader.start()
+
+    def prepare_events_payload(self):
+        """ Method used to return the payload of a message with the door and motion events not uploaded yet and the current door and motion states, and the time of the first event, or (None, None) if there is none. """
+        events, lost = self.event_cursor.read()
+        summary = summarize_events(events, lost)
+        if summary is None:
+            return None, None
+        return json.dumps({"Door": self.security.read_door_state(), "Events": summary, "Motion": self.security.read_motion_state(), "Timestamp": datetime.now(timezone.utc).isoformat()}, sort_keys=True), events[0][1] if events else None
+
+    def forward_events(self):
+        """ Method run by the event thread to send the door and motion events on the alarm lane as soon as they happen. Events arriving within event_min_interval of a message are sent together in the next one. """
+        while not self.stopping:
+            self.events_ready.wait()
+            self.events_ready.clear()
+            if self.stopping:
+                return
+            payload, raised_at = self.prepare_events_payload()
+            if payload is not None:
+                self.submit_alarm(payload, raised_at)
+            self.events_stop.wait(self.event_min_interval)
+
+    def send_queued(self, payload):
+        """ Method used by the forwarding thread to send a queued message, once the pending alarms are sent. """
+        self.wait_for_alarms()
+        self.client.send_message(payload)
+
+    def report_properties(self, reported):
+        """ Method used to send a reported properties patch of the device twin. """
+        self.client.patch_twin_reported_properties(reported)
+
+    def bus_stats(self):
+        """ Method used to return the transactions, utilization and waits of every shared bus. """
+        return self.bus.stats()
+
+    def cache_stats(self):
+        """ Method used to return the hits, misses and shared reads of the sensor cache, by sensor. """
+        return self.cache.stats()
+
+    def rules_stats(self):
+        """ Method used to return the number of rules, their evaluations and mean evaluation time, the commands they issued per actuator and the active rules. """
+        return self.rules.stats()
+
+    def lane_stats(self):
+        """ Method used to return the messages sent and failed and the latency percentiles and max (s) of every lane, and the most alarms ever waiting for the alarm lane. """
+        stats = {lane: self.lanes[lane].as_dict() for lane in LANES}
+        stats[ALARM_LANE]["maxPending"] = self.alarm_lane.max_pending if self.alarm_lane is not None else 0
+        return stats
+
+    def queue_stats(self):
+        """ Method used to return the depth, bytes, bytes on disk and drain rate of the store-and-forward queue, or None if it is disabled. """
+        return self.queue.stats() if self.queue is not None else None
+
+    def instrument(self):
+        """ Method used to register the station metrics and wrap every sensor read with its latency histogram. Metrics kept elsewhere (scheduler, GPS and accelerometer threads) are only collected when scraped. """
+        metrics = self.metrics
+        self.reads = [read._replace(read=metrics.histogram('sensor_read_seconds', "Duration of the sensor reads", sensor=read.name).time(read.read)) for read in self.reads]
+        self.serialization_time = metrics.histogram('serialization_seconds', "Duration of the telemetry serialization")
+        self.send_time = metrics.histogram('send_seconds', "Duration of the messages sent to the IoT Hub")
+        self.send_failures = metrics.counter('send_failures_total', "Messages that failed to send")
+
+        def scheduler_samples(stat):
+            return lambda: [({'job': name}, stats[stat]) for name, stats in self.scheduler_stats().items()]
+        metrics.collector('scheduler_runs_total', 'counter', "Runs of the scheduler jobs", scheduler_samples('runs'))
+        metrics.collector('scheduler_missed_deadlines_total', 'counter', "Deadlines missed by the scheduler jobs", scheduler_samples('missed'))
+        metrics.collector('scheduler_mean_jitter_seconds', 'gauge', "Mean start jitter of the scheduler jobs", scheduler_samples('meanJitter'))
+        metrics.collector('scheduler_max_jitter_seconds', 'gauge', "Max start jitter of the scheduler jobs", scheduler_samples('maxJitter'))
+        if self.geoLocation is not None:
+            metrics.collector('gps_sentences_total', 'counter', "NMEA sentences received by the GPS thread",
+                              lambda: [({'result': result}, count) for result, count in self.geoLocation.gps_parser.stats().items() if result != 'sentences'])
+            metrics.collector('accelerometer_readings_total', 'counter', "Readings received by the accelerometer thread",
+                              lambda: [({}, self.geoLocation.acceleration_buffer.count)])
+        def bus_samples(stat):
+            return lambda: [({'bus': name}, stats[stat]) for name, stats in self.bus_stats().items()]
+        metrics.collector('bus_transactions_total', 'counter', "Transactions run on the shared buses", bus_samples('transactions'))
+        metrics.collector('bus_busy_seconds_total', 'counter', "Time the shared buses were running a transaction", bus_samples('busyTime'))
+        metrics.collector('bus_utilization_ratio', 'gauge', "Share of the time the shared buses were busy since the station started", bus_samples('utilization'))
+        metrics.collector('bus_contended_transactions_total', 'counter', "Transactions that waited for a shared bus", bus_samples('contended'))
+        metrics.collector('bus_wait_seconds_total', 'counter', "Time transactions waited for a shared bus", bus_samples('waitTime'))
+        metrics.collector('bus_max_wait_seconds', 'gauge', "Longest wait of a transaction for a shared bus", bus_samples('maxWait'))
+        if self.adc_scanner is not None:
+            metrics.collector('adc_scans_total', 'counter', "Scans of the ADC channels", lambda: [({}, self.adc_scanner.scans)])
+        metrics.collector('lane_messages_total', 'counter', "Messages sent on each lane", lambda: [({'lane': lane}, self.lanes[lane].sent) for lane in LANES])
+        metrics.collector('lane_failures_total', 'counter', "Messages that failed to send on each lane", lambda: [({'lane': lane}, self.lanes[lane].failed) for lane in LANES])
+        metrics.collector('security_events_total', 'counter', "Door and motion events recorded", lambda: [({}, self.events.written)])
+        metrics.collector('rule_evaluations_total', 'counter', "Evaluations of the rules against a sample", lambda: [({}, self.rules.evaluations)])
+        metrics.collector('rule_actuations_total', 'counter', "Actuator states set by the rules",
+                          lambda: [({'actuator': actuator}, count) for actuator, count in self.rules_stats()['actuations'].items()])
+        metrics.collector('sensor_cache_requests_total', 'counter', "Sensor reads answered from the cache (hits), by the read in progress (shared) or by reading the sensor (misses)",
+                          lambda: [({'sensor': name, 'result': result}, count) for name, stats in self.cache.stats().items() for result, count in stats.items()])
+
+    def metrics_summary(self):
+        """ Method used to summarize the metrics for the 'metrics' reported property: p50 and p99 (ms) of every sensor read, of the serialization and of the sends, the send failures, the latency of each lane (ms), the sensor cache counts, the utilization and waits (ms) of the shared buses and the max jitter (ms) and missed deadlines of every job. """
+        def percentiles(histogram):
+            return {q: round(value * 1000, 3) for q, value in (('p50', histogram.quantile(0.5)), ('p99', histogram.quantile(0.99))) if value is not None}
+        family = self.metrics.families['sensor_read_seconds']
+        return {
+            'reads': {dict(labels)['sensor']: percentiles(histogram) for labels, histogram in family.children.items()},
+            'serialization': percentiles(self.serialization_time),
+            'send': percentiles(self.send_time),
+            'sendFailures': self.send_failures.value,
+            'lanes': {lane: {name: round(value * 1000, 3) for name, value in stats.items() if name in ('p50', 'p99', 'maxLatency') and value is not None} for lane, stats in self.lane_stats().items()},
+            'cache': self.cache_stats(),
+            'buses': {name: {'utilization': round(stats['utilization'], 4), 'meanWait': round(stats['meanWait'] * 1000, 3), 'maxWait': round(stats['maxWait'] * 1000, 3)} for name, stats in self.bus_stats().items()},
+            'jobs': {name: {'maxJitter': round(stats['maxJitter'] * 1000, 3), 'missed': stats['missed']} for name, stats in self.scheduler_stats().items()},
+        }
+
+    def report_metrics(self):
+        """ Method used by the metrics job to send the metrics summary as a reported property. """
+        try:
+            self.report_properties({'metrics': self.metrics_summary()})
+        except Exception:
+            print("An error occurred while reporting the metrics.")
+
+    def start_metrics_server(self):
+        """ Method used to start serving the metrics, if a metrics port is configured. """
+        if self.metrics_port is not None and self.metrics_server is None:
+            self.metrics_server = MetricsServer(self.metrics, self.metrics_port)
+            self.metrics_server.start()
+            print(f"Serving metrics on http://127.0.0.1:{self.metrics_server.port}/metrics")
+
+    def stop_metrics_server(self):
+        if self.metrics_server is not None:
+            self.metrics_server.stop()
+            self.metrics_server = None
+
+    def set_interval(self, interval):
+        """ Method used to change the telemetry (upload) interval. """
+        self.interval = interval
+        if 'upload' in self.scheduler.jobs:
+            self.scheduler.set_period('upload', interval)
+
+    def set_sampling_intervals(self, sampling_intervals):
+        """ Method used to give sensors their own sampling interval (s), separate from the telemetry interval. Sensors without one (or set to None) are read when the telemetry is sent. """
+        names = [read.name for read in self.reads]
+        self.sampling_intervals = {name: float(interval) for name, interval in (sampling_intervals or {}).items() if name in names and interval is not None and float(interval) > 0}
+        if self.running:
+            self.schedule_sampling_jobs()
+
+    def schedule_sampling_jobs(self):
+        """ Method used to add, update or remove the sampling job of every sensor to match its sampling interval. """
+        for read in self.reads:
+            interval = self.sampling_intervals.get(read.name)
+            if interval is None:
+                self.scheduler.remove_job(read.name)
+            elif read.name in self.scheduler.jobs:
+                self.scheduler.set_period(read.name, interval)
+            else:
+                self.scheduler.add_job(read.name, interval, lambda read=read: self.sample_sensor(read))
+
+    def run(self, ticks=None):
+        """ Method used to collect and send telemetry data from all subsystems to the IoT Hub at a fixed rate. Runs forever unless a number of ticks is given. """
+        self.client.connect()
+
+        sent = 0
+        def upload():
+            nonlocal sent
+            self.send_telemetry()
+            sent += 1
+            if ticks is not None and sent >= ticks:
+                self.scheduler.stop()
+
+        if self.queue is not None and self.forwarder is None:
+            self.forwarder = threading.Thread(target=self.forward_backlog, daemon=True)
+            self.forwarder.start()
+
+        # Sampling jobs are added first so sensors are read before the first upload
+        self.start_metrics_server()
+        if self.metrics is not None and self.metrics_report_interval:
+            self.scheduler.add_job('metrics', self.metrics_report_interval, self.report_metrics, start=time.monotonic() + self.metrics_report_interval)
+
+        self.running = True
+        self.start_event_upload()
+        self.schedule_sampling_jobs()
+        self.scheduler.add_job('upload', self.interval, upload)
+        try:
+            self.scheduler.run()
+        finally:
+            self.running = False
+
+    def scheduler_stats(self):
+        """ Method used to return the missed deadlines and jitter statistics of the upload and sampling jobs. """
+        return self.scheduler.stats()
+
+    def shutdown(self):
+        """ Method used to send (or queue) the pending batch, stop the sampling and actuator workers, the event thread, the alarm lane and the forwarding thread, and shut down the IoT Hub client. """
+        payload = self.batcher.flush()
+        if payload is not None:
             try:
-                for key in twin_patch:
-                    if(str(key)[0]!='$'):
-                        if(key=='telemetryInterval'):
-                            self.interval=twin_patch[key]
-                            self.client.patch_twin_reported_properties({key:twin_patch[key]})
-                            print({key:twin_patch[key]})
-                        elif(key=='buzzerState'):
-                            self.geoLocation.buzzer=twin_patch[key]
-                            self.client.patch_twin_reported_properties({key:twin_patch[key]})
-                            print({key:twin_patch[key]})
-                        elif(key=='lightState'):
-                            self.plant.set_light_state(twin_patch[key])
-                            self.client.patch_twin_reported_properties({key:twin_patch[key]})
-                            print({key:twin_patch[key]})
-                        elif(key=='fanState'):
-                            self.plant.set_fan_state(twin_patch[key])
-                            self.client.patch_twin_reported_properties({key:twin_patch[key]})
-                            print({key:twin_patch[key]})
-                        elif(key=='doorLockState'):
-                            self.security.set_door_lock_state(twin_patch[key])
-                            self.client.patch_twin_reported_properties({key:twin_patch[key]})
-                            print({key:twin_patch[key]})
-                
+                self.send_payload(payload)
             except Exception:
-                print("An error occurred while patching the twin.")
+                print("An error occurred while sending the pending batch.")
+        if self.sampler is not None:
+            self.sampler.shutdown()
+        self.commands.stop()
+        self.stopping = True
+        self.events_stop.set()
+        self.events_ready.set()
+        if self.event_uploader is not None:
+            self.event_uploader.join()
+        self.alarm_lane.stop()
+        if self.queue is not None:
+            self.backlog_event.set()
+            if self.forwarder is not None:
+                self.forwarder.join()
+            self.queue.close()
+        self.stop_metrics_server()
+        if self.history is not None:
+            self.history.close()
+        self.client.shutdown()
+
+    def apply_twin_patch(self, twin_patch):
+        """ Method used to apply a desired properties patch and return the reported properties acknowledging it. Actuator states are submitted to the command worker with the other reported properties, and the worker acknowledges the whole patch once the actuators are applied, so the cloud never sees a partly applied patch. Nothing is returned then. """
+        reported = {}
+        commands = {}
+        try:
+            for key in twin_patch:
+                if(str(key)[0]!='$'):
+                    if(key=='telemetryInterval'):
+                        self.set_interval(twin_patch[key])
+                        reported[key]=twin_patch[key]
+                    elif(key=='samplingIntervals'):
+                        # Patches only contain the sensors that changed, and a null interval puts the sensor back on the telemetry interval
+                        self.set_sampling_intervals({**self.sampling_intervals, **twin_patch[key]})
+                        reported[key]=self.sampling_intervals
+                    elif(key=='batchSize'):
+                        self.batcher.configure(max_size=twin_patch[key])
+                        reported[key]=twin_patch[key]
+                    elif(key=='batchMaxAge'):
+                        self.batcher.configure(max_age=twin_patch[key])
+                        reported[key]=twin_patch[key]
+                    elif(key=='reportByException'):
+                        self.report_by_exception=bool(twin_patch[key])
+                        # The cloud state may be out of date, so start again from a keyframe
+                        self.deadband.reset()
+                        reported[key]=twin_patch[key]
+                    elif(key=='deadbands'):
+                        self.deadband.set_deadbands(twin_patch[key])
+                        reported[key]=self.deadband.deadbands
+                    elif(key=='aggregate'):
+                        self.aggregate=bool(twin_patch[key])
+                        self.aggregator.reset()
+                        # The fields change from point readings to aggregates (or back), so start again from a keyframe
+                        self.deadband.reset()
+                        reported[key]=twin_patch[key]
+                    elif(key=='cacheMaxAges'):
+                        # Like the sampling intervals, patches only contain the sensors that changed and null restores the default
+                        self.cache.set_max_ages({**self.cache.max_ages, **twin_patch[key]})
+                        reported[key]=self.cache.max_ages
+                    elif(key in ('adcOversampling', 'adcFilter') and self.adc_scanner is not None):
+                        if(key=='adcOversampling'):
+                            self.adc_scanner.configure(oversampling=twin_patch[key])
+                        else:
+                            self.adc_scanner.configure(filter=twin_patch[key])
+                        reported[key]=twin_patch[key]
+                    elif(key=='rules'):
+                        # Patches only contain the rules that changed, and a null rule removes it. An invalid rule set is rejected as a whole, and the other keys of the patch are still applied.
+                        try:
+                            if not isinstance(twin_patch[key], dict):
+                                raise ValueError(f"expected the rules by name, got {twin_patch[key]!r}")
+                            self.rules.set_rules({**self.rules.rules, **twin_patch[key]})
+                        except ValueError as e:
+                            print(f"Rejected the rules: {e}")
+                        reported[key]=self.rules.rules
+                    elif(key=='uploadEvents'):
+                        self.set_upload_events(twin_patch[key])
+                        reported[key]=twin_patch[key]
+                    elif(key=='eventMinInterval'):
+                        self.event_min_interval=float(twin_patch[key])
+                        reported[key]=twin_patch[key]
+                    elif(key=='alarmLimits'):
+                        # Patches only contain the fields that changed, and a null limit disables the alarm of the field
+                        self.set_alarm_limits({**self.alarm_limits, **twin_patch[key]})
+                        reported[key]=self.alarm_limits
+                    elif(key=='keyframeInterval'):
+                        self.deadband.keyframe_interval=float(twin_patch[key])
+                        reported[key]=twin_patch[key]
+                    elif(key in self.commands.actuators):
+                        commands[key]=twin_patch[key]
+            
+        except Exception:
+            print("An error occurred while patching the twin.")
+
+        if commands:
+            self.commands.submit(commands, reported)
+            return {}
+        return reported
+
+    # Method used to create the transport selected by the connection string (see transport.create_transport), or to attach the twin handler to the one provided.
+    # The transport module (and the IoT Hub SDK it imports) is only loaded when the station creates its own client.
+    def create_client(self, client=None):
+        if client is None:
+            from transport import create_transport
+            client = create_transport(self.iot_device_connection_string)
+        self.client = client
+
+        # Patch repoted properties and update interval, a patch is acknowledged with one reported properties patch (sent by the command worker when it holds actuator states).
+        def twin_patch_handler(twin_patch):
+            print("Twin patch received:")
+            reported = self.apply_twin_patch(twin_patch)
+            if reported:
+                try:
+                    self.report_properties(reported)
+                    print(reported)
+                except Exception:
+                    print("An error occurred while reporting the twin properties.")
         
         try:
             # Attach the twin patch handler
@@ -119,25 +806,37 @@ class Station:
 
         return self.client
 
-
 def main():
     iot_device_connection_string = get_env_values() 
-    station = Station(iot_device_connection_string)
+    station = Station(iot_device_connection_string, queue_path=Station.DEFAULT_QUEUE_PATH, history_path=Station.DEFAULT_HISTORY_PATH, upload_events=True, metrics_port=get_metrics_port(), subsystems=get_subsystems())
     try:
         station.run()
     except KeyboardInterrupt:
         print("IoTHubClient / Station interuptted by user")
     finally:
         print("Shutting down IoTHubClient")
-        station.client.shutdown()
+        station.shutdown()
         
 def get_env_values():
     """ Method used to verify the .env file contains the correct information. """
+    from dotenv import dotenv_values
     config = dotenv_values(".env")
     IOTHUB_DEVICE_CONNECTION_STRING = config.get('IOTHUB_DEVICE_CONNECTION_STRING')
     if (IOTHUB_DEVICE_CONNECTION_STRING is None):
         raise KeyError("Missing IOTHUB_DEVICE_CONNECTION_STRING. Please see file .env.example.")
     return IOTHUB_DEVICE_CONNECTION_STRING        
 
+def get_metrics_port():
+    """ Method used to read the optional port of the metrics endpoint from the .env file (None disables the endpoint). """
+    from dotenv import dotenv_values
+    port = dotenv_values(".env").get('METRICS_PORT')
+    return int(port) if port else None
+
+def get_subsystems():
+    """ Method used to read the optional comma-separated list of the subsystems to run from the .env file (None runs all of them). """
+    from dotenv import dotenv_values
+    subsystems = dotenv_values(".env").get('SUBSYSTEMS')
+    return [name.strip() for name in subsystems.split(',') if name.strip()] if subsystems else None
+
 if __name__ == '__main__':
     main()
\ No newline at end of file
@@ -0,0 +1,103 @@
+import os
+import sqlite3
+import threading
+import time
+
+
+class StoreAndForwardQueue:
+    """ Persistent, size-bounded FIFO of telemetry payloads kept in SQLite with a write-ahead log, so messages queued while the link is down survive a crash or power cycle. When the queue holds more than max_bytes of payloads the oldest messages are dropped. """
+    def __init__(self, path, max_bytes=64 * 1024 * 1024):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.dropped = 0
+        self.drain_rate = 0.0
+        self._lock = threading.Lock()
+        self.connection = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        # auto_vacuum only applies to a new database, it must be set before the table is created
+        self.connection.execute("PRAGMA auto_vacuum=INCREMENTAL")
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.execute("PRAGMA synchronous=FULL")
+        self.connection.execute("CREATE TABLE IF NOT EXISTS messages (id INTEGER PRIMARY KEY AUTOINCREMENT, payload TEXT NOT NULL, size INTEGER NOT NULL, enqueued_at REAL NOT NULL)")
+        self.depth, self.bytes = self.connection.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM messages").fetchone()
+
+    def put(self, payload):
+        """ Appends a payload to the queue, dropping the oldest messages if the queue is over its size limit. """
+        size = len(payload.encode('utf-8'))
+        with self._lock:
+            with self.connection:
+                self.connection.execute("BEGIN IMMEDIATE")
+                self.connection.execute("INSERT INTO messages (payload, size, enqueued_at) VALUES (?, ?, ?)", (payload, size, time.time()))
+                self.depth += 1
+                self.bytes += size
+                while self.bytes > self.max_bytes and self.depth > 1:
+                    id, oldest_size = self.connection.execute("SELECT id, size FROM messages ORDER BY id LIMIT 1").fetchone()
+                    self.connection.execute("DELETE FROM messages WHERE id = ?", (id,))
+                    self.depth -= 1
+                    self.bytes -= oldest_size
+                    self.dropped += 1
+
+    def peek(self, limit):
+        """ Returns up to limit of the oldest (id, payload) tuples without removing them. """
+        with self._lock:
+            return self.connection.execute("SELECT id, payload FROM messages ORDER BY id LIMIT ?", (limit,)).fetchall()
+
+    def remove_through(self, last_id):
+        """ Removes every message up to and including the given id. """
+        with self._lock:
+            with self.connection:
+                self.connection.execute("BEGIN IMMEDIATE")
+                self.connection.execute("DELETE FROM messages WHERE id <= ?", (last_id,))
+                self.depth, self.bytes = self.connection.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM messages").fetchone()
+            if self.depth == 0:
+                # Give the space of the drained backlog back to the file system. The pragma frees one page per step and the sqlite3 module
+                # only steps it once through execute (fetching returns no rows), executescript runs it to completion.
+                self.connection.executescript("PRAGMA incremental_vacuum")
+                self.connection.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+
+    def drain(self, send, max_rate=None, chunk_size=50, should_stop=None):
+        """ Sends the backlog oldest first, reading and removing it in chunks, at no more than max_rate messages per second. A message is only removed once send returns, so an error from send stops the drain and leaves the rest queued. Returns the number of messages sent. """
+        sent = 0
+        start = time.monotonic()
+        try:
+            while True:
+                rows = self.peek(chunk_size)
+                if not rows:
+                    break
+                last_id = None
+                try:
+                    for id, payload in rows:
+                        if should_stop is not None and should_stop():
+                            return sent
+                        if max_rate:
+                            wait = start + sent / max_rate - time.monotonic()
+                            if wait > 0:
+                                time.sleep(wait)
+                        send(payload)
+                        last_id = id
+                        sent += 1
+                finally:
+                    if last_id is not None:
+                        self.remove_through(last_id)
+        finally:
+            elapsed = time.monotonic() - start
+            if sent and elapsed > 0:
+                self.drain_rate = sent / elapsed
+        return sent
+
+    def disk_bytes(self):
+        """ Returns the size on disk of the database and its write-ahead log. """
+        return sum(os.path.getsize(path) for path in (self.path, self.path + "-wal") if os.path.exists(path))
+
+    def stats(self):
+        """ Returns the queue depth, queued payload bytes, bytes on disk, dropped messages and the rate (messages/s) of the last drain. """
+        return {
+            "depth": self.depth,
+            "bytes": self.bytes,
+            "diskBytes": self.disk_bytes(),
+            "dropped": self.dropped,
+            "drainRate": self.drain_rate,
+        }
+
+    def close(self):
+        with self._lock:
+            self.connection.close()
@@ -0,0 +1,5 @@
+# The station modules import each other from the Hardware directory, like the subsystems do with sys.path
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
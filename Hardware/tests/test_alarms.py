@@ -0,0 +1,29 @@
+import contextlib
+import io
+import json
+from station import Station
+from Simulation.simulated_backend import SimulatedBackend
+from TelemetryHelper import Vibration
+from transport import LoopbackHub
+
+
+def test_shock_between_two_samples_raises_the_vibration_alarm():
+    hub = LoopbackHub()
+    client = hub.client()
+    station = Station(None, backend=SimulatedBackend(latency_scale=0, motion_interval=0), client=client)
+    client.connect()
+    try:
+        # The last two readings barely moved, but the window held a shock
+        shock = Vibration({"X": 0.01, "Y": 0.0, "Z": 0.0, "Peak": {"X": 0.1, "Y": 1.2, "Z": 0.2}, "RMS": {"X": 0.02, "Y": 0.3, "Z": 0.05}})
+        with contextlib.redirect_stdout(io.StringIO()):
+            station.check_alarms({"Vibration": shock})
+            station.wait_for_alarms()
+    finally:
+        station.shutdown()
+    alarms = [json.loads(message.payload)["Alarms"] for message in hub.messages if "Alarms" in message.payload]
+    assert alarms == [{"Vibration": {"Limit": 0.5, "Value": 1.2}}]
+
+
+def test_vibration_without_analysis_uses_the_change_between_readings():
+    assert Station.alarm_value(Vibration({"X": 0.3, "Y": 0.4, "Z": 0.0})) == 0.5
+    assert Station.alarm_value(-31.0) == 31.0
@@ -0,0 +1,35 @@
+import contextlib
+import io
+import json
+import time
+from batching import TelemetryBatcher
+from station import Station
+from Simulation.simulated_backend import SimulatedBackend
+from transport import LoopbackHub
+
+
+def test_expired_batch_is_flushed_without_a_new_record():
+    batcher = TelemetryBatcher(max_size=10, max_age=0.05)
+    assert batcher.add('{"a": 1}') is None
+    assert batcher.flush_expired() is None
+    time.sleep(0.06)
+    assert batcher.flush_expired() == '[{"a": 1}]'
+    assert batcher.flush_expired() is None
+
+
+def test_batch_max_age_holds_while_reporting_by_exception():
+    # Huge deadbands and no events: after the first keyframe, every sample is skipped
+    deadbands = {field: 1e9 for field in ('Temperature', 'Humidity', 'WaterLevel', 'Moisture', 'Longitude', 'Latitude', 'Pitch', 'Roll', 'Vibration', 'Luminosity', 'Noise')}
+    hub = LoopbackHub()
+    station = Station(None, backend=SimulatedBackend(latency_scale=0, motion_interval=0), client=hub.client(), batch_size=100, batch_max_age=0.25,
+                      report_by_exception=True, deadbands=deadbands, sampling_intervals={'actuators': 60, 'doorMotion': 60, 'geoLocation': 60, 'vibration': 60})
+    station.interval = 0.05
+    try:
+        with contextlib.redirect_stdout(io.StringIO()):
+            station.run(ticks=10)
+        # The keyframe is sent in a batch of its own once the batch is 0.25 s old, before the run ends and the station flushes its batch
+        sent = list(hub.messages)
+    finally:
+        station.shutdown()
+    assert len(sent) == 1
+    assert len(json.loads(sent[0].payload)) == 1
@@ -0,0 +1,25 @@
+import contextlib
+import io
+import time
+from station import Station
+from Simulation.simulated_backend import SimulatedBackend
+from transport import LoopbackHub
+
+
+def test_patch_mixing_actuators_and_settings_is_acknowledged_once():
+    hub = LoopbackHub()
+    client = hub.client()
+    station = Station(None, backend=SimulatedBackend(latency_scale=0, motion_interval=0), client=client)
+    client.connect()
+    try:
+        with contextlib.redirect_stdout(io.StringIO()):
+            hub.push_desired_properties({'fanState': 'on', 'telemetryInterval': 7, '$version': 2})
+            # The worker reports once the fan is set (about a second on the simulated relay)
+            deadline = time.monotonic() + 5
+            while not [traffic for traffic in hub.twin_traffic if traffic.direction == 'reported'] and time.monotonic() < deadline:
+                time.sleep(0.01)
+            time.sleep(0.1)
+    finally:
+        station.shutdown()
+    reported = [traffic.patch for traffic in hub.twin_traffic if traffic.direction == 'reported']
+    assert reported == [{'fanState': 'on', 'telemetryInterval': 7}]
@@ -0,0 +1,20 @@
+import os
+import subprocess
+import sys
+import time
+from history import HistoryStore
+
+
+def test_reopening_the_history_carries_on_without_numpy(tmp_path):
+    now = time.time()
+    store = HistoryStore(str(tmp_path), segment_duration=60)
+    for i in range(3):
+        store.append({'Temperature': 20.0 + i}, timestamp=now - 120 + i * 60)
+    store.close()
+
+    # A fresh interpreter, as pytest or the other tests may already have loaded numpy
+    script = ("import sys; from history import HistoryStore; store = HistoryStore(sys.argv[1], segment_duration=60); "
+              "print(repr(store.last_timestamp), 'numpy' in sys.modules)")
+    output = subprocess.run([sys.executable, '-c', script, str(tmp_path)], capture_output=True, text=True, check=True,
+                            cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__)))).stdout.split()
+    assert output == [repr(now), 'False']
@@ -0,0 +1,116 @@
+import contextlib
+import io
+import json
+import threading
+from aggregation import WindowAggregator
+from deadband import DeadbandFilter
+from station import Station
+from Simulation.simulated_backend import SimulatedBackend
+from TelemetryHelper import Aggregate, Vibration
+from transport import LoopbackHub
+
+
+def aggregate(mean):
+    return Aggregate({"Count": 2, "Min": mean - 1, "Max": mean + 1, "Mean": mean, "StdDev": 1.0})
+
+
+def create_station(**kwargs):
+    hub = LoopbackHub()
+    station = Station(None, backend=SimulatedBackend(latency_scale=0, motion_interval=0), client=hub.client(), **kwargs)
+    station.interval = 0.1
+    return station, hub
+
+
+def run(station, ticks):
+    with contextlib.redirect_stdout(io.StringIO()):
+        station.run(ticks=ticks)
+
+
+def test_empty_window_is_sent_as_an_aggregate():
+    aggregator = WindowAggregator(('Temperature',))
+    aggregator.add({'Temperature': 21.5})
+    assert aggregator.flush()['Temperature'].Count == 1
+    empty = aggregator.flush()['Temperature']
+    assert isinstance(empty, Aggregate)
+    assert (empty.Count, empty.Min, empty.Max, empty.Mean, empty.StdDev) == (0, None, None, None, None)
+
+
+def test_change_of_type_is_a_change():
+    deadband = DeadbandFilter(('Temperature',))
+    deadband.last_sent = {'Temperature': aggregate(21.0)}
+    assert deadband.changed('Temperature', 21.0)
+    deadband.last_sent = {'Temperature': 21.0}
+    assert deadband.changed('Temperature', aggregate(21.0))
+    assert not deadband.changed('Temperature', 21)
+
+
+def test_empty_aggregate_against_a_full_one():
+    deadband = DeadbandFilter(('Temperature',))
+    empty = Aggregate({"Count": 0, "Min": None, "Max": None, "Mean": None, "StdDev": None})
+    deadband.last_sent = {'Temperature': aggregate(21.0)}
+    assert deadband.changed('Temperature', empty)
+    deadband.last_sent = {'Temperature': empty}
+    assert not deadband.changed('Temperature', empty)
+    assert deadband.changed('Temperature', aggregate(21.0))
+
+
+def test_aggregated_reports_by_exception_with_empty_windows():
+    # The temperature is read every 0.5 s and uploaded every 0.1 s, so most windows hold no reading
+    station, hub = create_station(report_by_exception=True, aggregate=True, sampling_intervals={'temperatureHumidity': 0.5})
+    try:
+        run(station, 10)
+    finally:
+        station.shutdown()
+    assert station.scheduler.stats()['upload']['runs'] == 10
+    temperatures = [json.loads(message.payload)['Temperature'] for message in hub.messages if 'Temperature' in json.loads(message.payload)]
+    assert temperatures and all(isinstance(temperature, dict) for temperature in temperatures)
+
+
+def test_aggregation_turned_on_while_reporting_by_exception():
+    station, hub = create_station(report_by_exception=True)
+    try:
+        run(station, 2)
+        with contextlib.redirect_stdout(io.StringIO()):
+            station.apply_twin_patch({'aggregate': True})
+        sent = len(hub.messages)
+        run(station, 2)
+    finally:
+        station.shutdown()
+    # The first upload after the patch is a keyframe holding the aggregates
+    first = json.loads(hub.messages[sent].payload)
+    assert first['Keyframe'] is True
+    assert isinstance(first['Temperature'], dict)
+
+
+def vibration(x, peak_y, crest_factor_y):
+    return Vibration({"X": x, "Y": 0.0, "Z": 0.02, "Peak": {"X": 0.1, "Y": peak_y, "Z": 0.1}, "RMS": {"X": 0.03, "Y": 0.03, "Z": 0.03}, "CrestFactor": {"X": 3.3, "Y": crest_factor_y, "Z": 3.3}})
+
+
+def test_vibration_deadband_is_in_g_and_ignores_the_crest_factor():
+    deadband = DeadbandFilter(('Vibration',))
+    deadband.filter({'Vibration': vibration(0.01, 0.1, 3.3)})
+    # The crest factor is a ratio, its change is not a move of the acceleration
+    assert not deadband.changed('Vibration', vibration(0.02, 0.12, 1.0))
+    assert deadband.changed('Vibration', vibration(0.01, 0.2, 3.3))
+
+
+def test_window_aggregator_keeps_every_reading_added_while_flushing():
+    aggregator = WindowAggregator(('Temperature',))
+    stop = threading.Event()
+    counts = []
+
+    def flush():
+        while not stop.is_set():
+            counts.append(aggregator.flush()['Temperature'].Count)
+
+    threads = [threading.Thread(target=flush) for _ in range(2)]
+    for thread in threads:
+        thread.start()
+    try:
+        for _ in range(20000):
+            aggregator.add({'Temperature': 20.0})
+    finally:
+        stop.set()
+        for thread in threads:
+            thread.join()
+    assert sum(counts) + aggregator.flush()['Temperature'].Count == 20000
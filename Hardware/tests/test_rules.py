@@ -0,0 +1,39 @@
+import contextlib
+import io
+import pytest
+from rules import RulesEngine
+from station import Station
+from Simulation.simulated_backend import SimulatedBackend
+from transport import LoopbackHub
+
+
+def test_rules_with_states_the_actuator_does_not_understand_are_rejected():
+    engine = RulesEngine(Station.ACTUATOR_STATES)
+    # The door lock understands 'close' and 'open', not the default 'on' and 'off'
+    with pytest.raises(ValueError, match="doorLockState"):
+        engine.set_rules({'nightLock': {'schedule': {'start': '22:00', 'end': '06:00'}, 'actuator': 'doorLockState'}})
+    with pytest.raises(ValueError, match="inactive state"):
+        engine.set_rules({'nightLock': {'schedule': {'start': '22:00', 'end': '06:00'}, 'actuator': 'doorLockState', 'active': 'close', 'inactive': 'off'}})
+    with pytest.raises(ValueError, match="active state"):
+        engine.set_rules({'coolDown': {'field': 'Temperature', 'above': 28, 'actuator': 'fanState', 'active': 'close'}})
+    assert engine.rules == {}
+
+
+def test_rules_with_the_states_of_their_actuator_are_applied():
+    engine = RulesEngine(Station.ACTUATOR_STATES)
+    engine.set_rules({'nightLock': {'field': 'Motion', 'equals': True, 'actuator': 'doorLockState', 'active': 'close', 'inactive': None},
+                      'coolDown': {'field': 'Temperature', 'above': 28, 'actuator': 'fanState'}})
+    assert engine.evaluate({'Motion': True, 'Temperature': 30}) == {'doorLockState': 'close', 'fanState': 'on'}
+
+
+def test_invalid_rules_patch_leaves_the_other_keys_applied():
+    hub = LoopbackHub()
+    station = Station(None, backend=SimulatedBackend(latency_scale=0, motion_interval=0), client=hub.client())
+    try:
+        for rules in (None, ['coolDown'], {'coolDown': 'fanState'}):
+            with contextlib.redirect_stdout(io.StringIO()):
+                reported = station.apply_twin_patch({'rules': rules, 'telemetryInterval': 7})
+            assert reported == {'rules': {}, 'telemetryInterval': 7}
+            assert station.interval == 7
+    finally:
+        station.shutdown()
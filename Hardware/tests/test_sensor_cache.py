@@ -0,0 +1,26 @@
+import threading
+from sensor_cache import SensorCache
+
+
+def test_read_in_flight_during_an_invalidation_is_not_cached():
+    cache = SensorCache({'actuators': 60})
+    started = threading.Event()
+    release = threading.Event()
+    states = ['off', 'on']
+
+    def slow_read():
+        # Reads the state from before the actuation, which completes while the read is in flight
+        state = states[0]
+        started.set()
+        release.wait()
+        return state
+
+    thread = threading.Thread(target=lambda: cache.read('actuators', slow_read))
+    thread.start()
+    started.wait()
+    states.pop(0)
+    cache.invalidate('actuators')
+    release.set()
+    thread.join()
+    assert cache.read('actuators', lambda: states[0]) == 'on'
+    assert cache.read('actuators', lambda: 'unexpected') == 'on'
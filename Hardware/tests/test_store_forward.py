@@ -0,0 +1,18 @@
+import os
+from store_forward import StoreAndForwardQueue
+
+
+def test_draining_the_queue_shrinks_the_file(tmp_path):
+    queue = StoreAndForwardQueue(os.path.join(str(tmp_path), 'queue.db'))
+    try:
+        for i in range(5000):
+            queue.put('{"Temperature": %d.5, "Humidity": 55.27, "Padding": "%s"}' % (i, 'x' * 100))
+        queue.connection.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+        full = queue.disk_bytes()
+        sent = []
+        assert queue.drain(sent.append) == 5000
+        assert queue.stats()['depth'] == 0
+        assert queue.connection.execute("PRAGMA freelist_count").fetchone()[0] == 0
+        assert queue.disk_bytes() < full / 10
+    finally:
+        queue.close()
@@ -0,0 +1,222 @@
+import asyncio
+import random
+from abc import ABC, abstractmethod
+import threading
+import time
+from collections import namedtuple
+from urllib.parse import parse_qsl, urlsplit
+
+# Connection strings starting with this scheme select a loopback hub instead of the IoT Hub, e.g. loopback://bench/farm-1?latency=0.05&drop_rate=0.01
+LOOPBACK_SCHEME = 'loopback://'
+
+# Message received by a loopback hub. sent_at and received_at are perf_counter times, so received_at - sent_at is the latency of the send.
+HubMessage = namedtuple('HubMessage', ['device_id', 'sent_at', 'received_at', 'payload'])
+# Twin traffic seen by a loopback hub, direction is 'reported' (device to cloud) or 'desired' (cloud to device).
+TwinTraffic = namedtuple('TwinTraffic', ['device_id', 'direction', 'timestamp', 'patch'])
+
+
+class Transport(ABC):
+    """ Interface of the link between a station and its hub, the subset of IoTHubDeviceClient used by the stations. The IoT Hub clients (azure.iot.device and azure.iot.device.aio) implement it as is, so they are used directly; the asyncio implementations have coroutine methods.
+
+    connected tells whether messages can be sent, and on_twin_desired_properties_patch_received is called with every desired properties patch. """
+    on_twin_desired_properties_patch_received = None
+
+    @property
+    @abstractmethod
+    def connected(self):
+        """ True while messages can be sent. """
+
+    @abstractmethod
+    def connect(self):
+        """ Opens the link, raises an exception if the hub cannot be reached. """
+
+    @abstractmethod
+    def shutdown(self):
+        """ Closes the link. """
+
+    @abstractmethod
+    def send_message(self, message):
+        """ Sends a telemetry message, raises an exception if it was not delivered. """
+
+    @abstractmethod
+    def patch_twin_reported_properties(self, reported_properties_patch):
+        """ Sends a reported properties patch of the device twin, raises an exception if it was not delivered. """
+
+
+def create_transport(connection_string, asynchronous=False):
+    """ Returns the transport selected by the connection string: a client of the named loopback hub for loopback:// strings, the IoT Hub device client otherwise (the asyncio one if asynchronous). """
+    if connection_string.startswith(LOOPBACK_SCHEME):
+        return LoopbackHub.from_url(connection_string).client(urlsplit(connection_string).path.strip('/') or 'device', asynchronous)
+    if asynchronous:
+        from azure.iot.device.aio import IoTHubDeviceClient
+    else:
+        from azure.iot.device import IoTHubDeviceClient
+    return IoTHubDeviceClient.create_from_connection_string(connection_string)
+
+
+def _payload_size(message):
+    data = getattr(message, 'data', message)
+    return len(data.encode('utf-8') if isinstance(data, str) else data)
+
+
+class LoopbackHub:
+    """ In-process stand-in for the IoT Hub, to measure the send path offline. Every message and twin patch is recorded with its send and receive times, and the link can be made slow (latency plus uniform jitter), lossy (a drop_rate fraction of the sends fail after their latency, like a send that times out waiting for its acknowledgement) or down (outage).
+
+    Several devices can share one hub, each through its own client. """
+    # Hubs created from loopback:// connection strings, by name
+    named_hubs = {}
+    _named_lock = threading.Lock()
+
+    def __init__(self, latency=0.0, jitter=0.0, drop_rate=0.0, seed=None):
+        self.latency = latency
+        self.jitter = jitter
+        self.drop_rate = drop_rate
+        self.random = random.Random(seed)
+        self.clients = {}
+        self.messages = []
+        self.twin_traffic = []
+        self.dropped = 0
+        self.rejected = 0
+        self.outages = 0
+        self.down_until = 0.0
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_url(cls, url):
+        """ Returns the hub named by a loopback://<name>[/<device id>]?latency=&jitter=&drop_rate=&seed= url, created on first use. """
+        parts = urlsplit(url)
+        with cls._named_lock:
+            hub = cls.named_hubs.get(parts.netloc)
+            if hub is None:
+                options = dict(parse_qsl(parts.query))
+                hub = cls.named_hubs[parts.netloc] = cls(float(options.get('latency', 0.0)), float(options.get('jitter', 0.0)), float(options.get('drop_rate', 0.0)), int(options['seed']) if 'seed' in options else None)
+        return hub
+
+    def client(self, device_id='device', asynchronous=False):
+        """ Returns a new client connecting the device to the hub (with coroutine methods if asynchronous). """
+        client = (AsyncLoopbackClient if asynchronous else LoopbackClient)(self, device_id)
+        self.clients[device_id] = client
+        return client
+
+    @property
+    def down(self):
+        return time.perf_counter() < self.down_until
+
+    def outage(self, duration=float('inf')):
+        """ Drops the link of every client for duration seconds (until restore without a duration). Sends and connects fail meanwhile, and the clients come back on their own afterwards, like the IoT Hub client reconnecting. """
+        with self._lock:
+            self.down_until = time.perf_counter() + duration
+            self.outages += 1
+
+    def restore(self):
+        """ Ends the current outage. """
+        with self._lock:
+            self.down_until = 0.0
+
+    def delay(self):
+        """ Returns the latency of one send. """
+        return self.latency + (self.random.uniform(0.0, self.jitter) if self.jitter else 0.0)
+
+    def receive(self, device_id, message, sent_at):
+        """ Records a message sent at sent_at, unless the link is down or drops it, in which case ConnectionError is raised. """
+        with self._lock:
+            if self.down:
+                self.rejected += 1
+                raise ConnectionError("Link is down")
+            if self.drop_rate and self.random.random() < self.drop_rate:
+                self.dropped += 1
+                raise ConnectionError("Message dropped")
+            self.messages.append(HubMessage(device_id, sent_at, time.perf_counter(), message))
+
+    def receive_reported_properties(self, device_id, reported_properties_patch):
+        with self._lock:
+            if self.down:
+                self.rejected += 1
+                raise ConnectionError("Link is down")
+            self.twin_traffic.append(TwinTraffic(device_id, 'reported', time.perf_counter(), reported_properties_patch))
+
+    def push_desired_properties(self, twin_patch, device_id=None):
+        """ Delivers a desired properties patch to the twin handler of a device, or of every device. """
+        for client_id, client in list(self.clients.items()):
+            if device_id is None or client_id == device_id:
+                with self._lock:
+                    self.twin_traffic.append(TwinTraffic(client_id, 'desired', time.perf_counter(), twin_patch))
+                if client.on_twin_desired_properties_patch_received is not None:
+                    client.on_twin_desired_properties_patch_received(twin_patch)
+
+    def latencies(self, device_id=None):
+        """ Returns the latency (s) of every message received, from one device or all of them. """
+        return [message.received_at - message.sent_at for message in list(self.messages) if device_id is None or message.device_id == device_id]
+
+    def stats(self):
+        """ Returns the number of messages received, their bytes, the failed sends (dropped, or rejected while the link was down) and the outages. """
+        messages = list(self.messages)
+        return {"messages": len(messages), "bytes": sum(_payload_size(message.payload) for message in messages), "dropped": self.dropped, "rejected": self.rejected, "outages": self.outages, "twinPatches": len(self.twin_traffic)}
+
+
+class LoopbackClient(Transport):
+    """ Blocking client of a LoopbackHub, with the interface of IoTHubDeviceClient. """
+    def __init__(self, hub, device_id):
+        self.hub = hub
+        self.device_id = device_id
+        self.on_twin_desired_properties_patch_received = None
+        self.opened = False
+        # perf_counter time of the first connect
+        self.connected_at = None
+
+    @property
+    def connected(self):
+        return self.opened and not self.hub.down
+
+    def connect(self):
+        if self.hub.down:
+            raise ConnectionError("Link is down")
+        self.opened = True
+        if self.connected_at is None:
+            self.connected_at = time.perf_counter()
+
+    def shutdown(self):
+        self.opened = False
+
+    def check_connected(self):
+        if not self.opened:
+            raise ConnectionError("Client is not connected")
+
+    def send_message(self, message):
+        self.check_connected()
+        sent_at = time.perf_counter()
+        delay = self.hub.delay()
+        if delay:
+            time.sleep(delay)
+        self.hub.receive(self.device_id, message, sent_at)
+
+    def patch_twin_reported_properties(self, reported_properties_patch):
+        self.check_connected()
+        delay = self.hub.delay()
+        if delay:
+            time.sleep(delay)
+        self.hub.receive_reported_properties(self.device_id, reported_properties_patch)
+
+
+class AsyncLoopbackClient(LoopbackClient):
+    """ Client of a LoopbackHub with the interface of the asyncio IoTHubDeviceClient (azure.iot.device.aio): the latency is awaited instead of blocking. """
+    async def connect(self):
+        super().connect()
+
+    async def shutdown(self):
+        super().shutdown()
+
+    async def send_message(self, message):
+        self.check_connected()
+        sent_at = time.perf_counter()
+        delay = self.hub.delay()
+        if delay:
+            await asyncio.sleep(delay)
+        self.hub.receive(self.device_id, message, sent_at)
+
+    async def patch_twin_reported_properties(self, reported_properties_patch):
+        self.check_connected()
+        delay = self.hub.delay()
+        if delay:
+            await asyncio.sleep(delay)
+        self.hub.receive_reported_properties(self.device_id, reported_properties_patch)